@@ -1,5 +1,9 @@
+import logging
 import os
 from celery import Celery
+from celery.signals import celeryd_after_setup, worker_init, worker_process_init, worker_ready
+
+logger = logging.getLogger(__name__)
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'file_parser.settings')
@@ -17,3 +21,38 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+@worker_init.connect
+def preload_parser_dependencies(**kwargs):
+    """Import heavy parser dependencies once in the parent so forked children share them"""
+    from django.conf import settings
+    if settings.PARSER_PRELOAD_IN_WORKER:
+        from files.parsers import registry
+        registry.preload()
+
+
+@celeryd_after_setup.connect
+def consume_node_queue(sender, instance, **kwargs):
+    """Also consume this node's queue, where parses of the files stored on this node are routed"""
+    from django.conf import settings
+    from files.nodes import node_queue
+    instance.app.amqp.queues.select_add(node_queue(settings.NODE_NAME))
+
+
+@worker_process_init.connect
+def reset_connection_pools(**kwargs):
+    """Give each forked pool process its own Postgres, MongoDB and Redis pools"""
+    from files.connections import connection_manager
+    connection_manager.reset()
+
+
+@worker_ready.connect
+def check_connections(sender=None, **kwargs):
+    """Log the health of every backend once the worker is up"""
+    from files.connections import connection_manager
+    for name, result in connection_manager.check().items():
+        if result['healthy']:
+            logger.info('%s: healthy (%s ms)', name, result['latency_ms'])
+        else:
+            logger.error('%s: UNHEALTHY - %s', name, result['error'])
@@ -0,0 +1,51 @@
+"""
+PostgreSQL backend that borrows connections from a process-wide pool.
+
+Django 4.2 has no built-in pool, and persistent connections (CONN_MAX_AGE)
+are per thread, which ASGI creates per request. Here Django still "opens"
+and "closes" a connection around each request, but those calls check a
+connection out of and back into files.connections.ConnectionManager.
+"""
+
+from django.db.backends.postgresql import base, creation
+from django.db.backends.postgresql.base import Database
+
+from files.connections import connection_manager
+
+
+class PooledDatabase:
+    """psycopg2 stand-in whose connect() checks a connection out of the pool"""
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+
+    def connect(self, **conn_params):
+        return self.wrapper.pool.acquire()
+
+    def __getattr__(self, name):
+        return getattr(Database, name)
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would otherwise block DROP DATABASE
+        connection_manager.close_postgres_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.Database = PooledDatabase(self)
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        self.pool = connection_manager.postgres_pool(self.alias, conn_params)
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
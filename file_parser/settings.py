@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 import os
+import socket
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'files.middleware.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -82,14 +84,21 @@ WSGI_APPLICATION = 'file_parser.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections are pooled per process (see files/connections.py); set POSTGRES_POOL_SIZE=0
+# to fall back to Django's persistent per-thread connections instead.
+POSTGRES_POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', 20))
+POSTGRES_POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'file_parser.db.pooled_postgresql' if POSTGRES_POOL_SIZE else 'django.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'file_parser_db'),
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres123'),
         'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
         'PORT': os.getenv('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if POSTGRES_POOL_SIZE else int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -104,6 +113,15 @@ MONGO_PORT = os.getenv('MONGO_PORT', '27017')
 REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT = os.getenv('REDIS_PORT', '6379')
 
+# Shared connection pools
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+CONNECTION_TIMEOUT = float(os.getenv('CONNECTION_TIMEOUT', 2))  # seconds
+CONNECTION_HEALTH_CHECK_INTERVAL = int(os.getenv('CONNECTION_HEALTH_CHECK_INTERVAL', 30))  # seconds idle before a ping
+
+# Serve the progress, detail, list and health endpoints with native async views (set by asgi.py)
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
 # Celery Configuration
 CELERY_BROKER_URL = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
 CELERY_RESULT_BACKEND = f'redis://{REDIS_HOST}:{REDIS_PORT}/0'
@@ -111,12 +129,151 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+# Recycle a pool process once a task leaves its resident memory above this many KiB
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = int(os.getenv('CELERY_WORKER_MAX_MEMORY_PER_CHILD', 1536 * 1024))
+# Tasks are acknowledged after they finish (acks_late), so take one at a time and give Redis
+# longer than any parse before it redelivers an unacknowledged task
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': int(os.getenv('CELERY_VISIBILITY_TIMEOUT', 7200))}
+CELERY_BEAT_SCHEDULE = {
+    'reap-expired-leases': {
+        'task': 'files.tasks.reap_expired_leases',
+        'schedule': float(os.getenv('FILE_REAPER_INTERVAL', 60)),
+    },
+    'apply-storage-lifecycle': {
+        'task': 'files.tasks.apply_storage_lifecycle',
+        'schedule': float(os.getenv('STORAGE_LIFECYCLE_INTERVAL', 3600)),
+    },
+    'deliver-webhooks': {
+        'task': 'files.tasks.deliver_webhooks',
+        'schedule': float(os.getenv('WEBHOOK_SWEEP_INTERVAL', 15)),  # picks up retries as they fall due
+    },
+}
+
+# Completion webhooks: a signed POST to an upload's callback_url once it is ready or failed
+WEBHOOK_QUEUE = os.getenv('WEBHOOK_QUEUE', 'webhooks')  # consumed by a dedicated worker, away from parses
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')  # HMAC key shared with receivers; empty disables callback_url
+# Hosts webhooks may be sent to even though they resolve to a loopback, private or link-local address
+WEBHOOK_ALLOWED_HOSTS = [host for host in os.getenv('WEBHOOK_ALLOWED_HOSTS', '').split(',') if host]
+WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', 10))  # seconds per request
+WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', 50))  # events per request to one URL
+WEBHOOK_BATCH_DELAY = float(os.getenv('WEBHOOK_BATCH_DELAY', 1))  # seconds to gather events before sending
+WEBHOOK_CLAIM_SIZE = int(os.getenv('WEBHOOK_CLAIM_SIZE', 500))  # deliveries sent per task run
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', 8))
+WEBHOOK_RETRY_BACKOFF = int(os.getenv('WEBHOOK_RETRY_BACKOFF', 30))  # seconds, doubled per attempt with full jitter
+WEBHOOK_RETRY_BACKOFF_MAX = int(os.getenv('WEBHOOK_RETRY_BACKOFF_MAX', 3600))
+WEBHOOK_SIGNATURE_TOLERANCE = int(os.getenv('WEBHOOK_SIGNATURE_TOLERANCE', 300))  # seconds, for files.webhooks.verify
+CELERY_TASK_ROUTES = {'files.tasks.deliver_webhooks': {'queue': WEBHOOK_QUEUE}}
 
 # File Upload Settings
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 104857600))  # 100MB default
 UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'media/uploads/')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Compressed CSV/TXT uploads (.gz/.zst names, or Content-Encoding: gzip|zstd on raw uploads) are stored
+# compressed; MAX_FILE_SIZE applies to the bytes sent, these limits to what they expand to
+UPLOAD_MAX_DECOMPRESSED_SIZE = int(os.getenv('UPLOAD_MAX_DECOMPRESSED_SIZE', 10 * MAX_FILE_SIZE))
+UPLOAD_MAX_COMPRESSION_RATIO = float(os.getenv('UPLOAD_MAX_COMPRESSION_RATIO', 100))  # past MAX_FILE_SIZE; 0 = none
+UPLOAD_ZSTD_LEVEL = int(os.getenv('UPLOAD_ZSTD_LEVEL', 3))  # recompression level while the upload is received
+
+# Node affinity: an upload stays in the MEDIA_ROOT of the node that received it, and its parse task
+# goes to that node's queue (<NODE_QUEUE_PREFIX><NODE_NAME>), which the node's workers also consume
+NODE_NAME = os.getenv('NODE_NAME', socket.gethostname())
+FILE_NODE_AFFINITY = os.getenv('FILE_NODE_AFFINITY', 'True').lower() == 'true'
+NODE_QUEUE_PREFIX = os.getenv('NODE_QUEUE_PREFIX', 'files.node.')
+# A worker without the file streams it from the storage node's internal raw endpoint
+NODE_TRANSFER_URL = os.getenv('NODE_TRANSFER_URL', 'http://{node}:8000')  # base URL of a node's web process
+NODE_TRANSFER_TOKEN = os.getenv('NODE_TRANSFER_TOKEN', '')  # shared secret; empty disables the raw endpoint
+NODE_TRANSFER_TIMEOUT = float(os.getenv('NODE_TRANSFER_TIMEOUT', 30))  # seconds without data before giving up
+NODE_TRANSFER_CHUNK_SIZE = int(os.getenv('NODE_TRANSFER_CHUNK_SIZE', 1024 * 1024))  # bytes per streamed chunk
+NODE_TRANSFER_DIR = os.getenv('NODE_TRANSFER_DIR', os.path.join(MEDIA_ROOT, 'transfers'))  # local copies while parsing
+
+# Storage tiers: finished uploads untouched for N days are zstd-compressed, later moved to cold storage
+STORAGE_COMPRESS_AFTER_DAYS = float(os.getenv('STORAGE_COMPRESS_AFTER_DAYS', 30))  # 0 = never compress
+STORAGE_COLD_AFTER_DAYS = float(os.getenv('STORAGE_COLD_AFTER_DAYS', 0))  # 0 = never move to cold storage
+COLD_STORAGE_DIR = os.getenv('COLD_STORAGE_DIR', '')  # required for the cold tier
+STORAGE_ZSTD_LEVEL = int(os.getenv('STORAGE_ZSTD_LEVEL', 9))
+STORAGE_FRAME_SIZE = int(os.getenv('STORAGE_FRAME_SIZE', 4 * 1024 * 1024))  # bytes per independently readable frame
+STORAGE_LIFECYCLE_BATCH = int(os.getenv('STORAGE_LIFECYCLE_BATCH', 1000))  # files tiered per node per run
+# Decompressed copies of compressed/cold uploads for readers that need a path, least recently used evicted first
+REHYDRATION_CACHE_DIR = os.getenv('REHYDRATION_CACHE_DIR', os.path.join(MEDIA_ROOT, 'rehydrated'))
+REHYDRATION_CACHE_BYTES = int(os.getenv('REHYDRATION_CACHE_BYTES', 2 * 1024 ** 3))
+
+# Upload admission control (0 disables a limit)
+UPLOAD_MAX_QUEUED_FILES = int(os.getenv('UPLOAD_MAX_QUEUED_FILES', 200))  # files waiting for a worker
+UPLOAD_MAX_INFLIGHT_BYTES = int(os.getenv('UPLOAD_MAX_INFLIGHT_BYTES', 5 * 1024 ** 3))  # uploading + processing
+UPLOAD_MIN_FREE_DISK = int(os.getenv('UPLOAD_MIN_FREE_DISK', 1024 ** 3))  # bytes left free under MEDIA_ROOT
+UPLOAD_MAX_PER_CLIENT = int(os.getenv('UPLOAD_MAX_PER_CLIENT', 10))  # files in flight per client
+UPLOAD_DRAIN_WINDOW = int(os.getenv('UPLOAD_DRAIN_WINDOW', 300))  # seconds of finished files behind the drain rate
+UPLOAD_RETRY_AFTER_DEFAULT = int(os.getenv('UPLOAD_RETRY_AFTER_DEFAULT', 30))  # seconds, when no rate is known
+UPLOAD_RETRY_AFTER_MAX = int(os.getenv('UPLOAD_RETRY_AFTER_MAX', 600))
+
+# Parser Settings
+PARSER_PLUGINS = [p for p in os.getenv('PARSER_PLUGINS', '').split(',') if p]  # extra plugin modules
+PARSER_PRELOAD_IN_WORKER = os.getenv('PARSER_PRELOAD_IN_WORKER', 'True').lower() == 'true'
+# 'zstd' stores the bulky parts of parsed_content compressed; 'none' keeps it all as JSON
+PARSED_CONTENT_COMPRESSION = os.getenv('PARSED_CONTENT_COMPRESSION', 'zstd')
+PARSED_CONTENT_ZSTD_LEVEL = int(os.getenv('PARSED_CONTENT_ZSTD_LEVEL', 3))
+PROGRESS_BATCH_MAX_IDS = int(os.getenv('PROGRESS_BATCH_MAX_IDS', 1000))  # ids per batch progress request
+PROGRESS_BATCH_SINCE_SLACK = float(os.getenv('PROGRESS_BATCH_SINCE_SLACK', 2))  # seconds of overlap between polls
+# Row-level diffs between tabular files (files.diff): chunked hashing, spilled to partitions, cached in Redis
+DIFF_CHUNK_ROWS = int(os.getenv('DIFF_CHUNK_ROWS', 200000))  # rows read and hashed at a time
+DIFF_PARTITIONS = int(os.getenv('DIFF_PARTITIONS', 16))  # partitions joined one at a time, up to 65536; more = less memory
+DIFF_MAX_ROWS = int(os.getenv('DIFF_MAX_ROWS', 1000))  # row numbers listed per kind of change
+DIFF_PREVIEW_ROWS = int(os.getenv('DIFF_PREVIEW_ROWS', 20))  # rows shown in full per kind of change
+DIFF_CACHE_TTL = int(os.getenv('DIFF_CACHE_TTL', 24 * 3600))  # seconds
+DIFF_TEMP_DIR = os.getenv('DIFF_TEMP_DIR', '')  # partition files; empty = the system temp directory
+ROWS_PAGE_MAX_LIMIT = int(os.getenv('ROWS_PAGE_MAX_LIMIT', 1000))  # rows per page on the rows endpoint
+LINES_PAGE_MAX_COUNT = int(os.getenv('LINES_PAGE_MAX_COUNT', 1000))  # lines per page on the lines endpoint
+LINE_INDEX_STRIDE = int(os.getenv('LINE_INDEX_STRIDE', 256))  # lines per entry in the TXT line-offset index
+TXT_READ_BLOCK_SIZE = int(os.getenv('TXT_READ_BLOCK_SIZE', 4 * 1024 * 1024))  # bytes per streamed TXT block
+PARTIAL_RESULTS_INTERVAL = float(os.getenv('PARTIAL_RESULTS_INTERVAL', 2))  # seconds between partial result writes
+CSV_READ_CHUNK_SIZE = int(os.getenv('CSV_READ_CHUNK_SIZE', 8 * 1024 * 1024))  # bytes per sequential CSV chunk
+# Seconds a parse may run per file type before it stops with status timed_out (0 = no limit),
+# overridable per type with PARSE_TIME_BUDGET_<TYPE>, e.g. PARSE_TIME_BUDGET_CSV=1200
+PARSE_TIME_BUDGETS = {
+    file_type: float(os.getenv(f'PARSE_TIME_BUDGET_{file_type.upper()}', default))
+    for file_type, default in {'csv': 900, 'xlsx': 600, 'xls': 600, 'pdf': 300, 'txt': 300}.items()
+}
+PARSE_CANCEL_CHECK_INTERVAL = float(os.getenv('PARSE_CANCEL_CHECK_INTERVAL', 1))  # seconds between cancel polls
+# Seconds past the longest budget after which Celery's soft time limit stops a parse stuck between checkpoints
+PARSE_SOFT_TIME_LIMIT_GRACE = int(os.getenv('PARSE_SOFT_TIME_LIMIT_GRACE', 300))
+# xlsx files with a sheet over this many bytes of XML are streamed with openpyxl (the sidecar strategy)
+EXCEL_STREAM_SHEET_SIZE = int(os.getenv('EXCEL_STREAM_SHEET_SIZE', 16 * 1024 * 1024))
+EXCEL_STREAM_BATCH_ROWS = int(os.getenv('EXCEL_STREAM_BATCH_ROWS', 5000))  # rows streamed between cancellation checks
+# Memory planning: each parse reserves its estimated peak memory against a per-host budget
+PARSE_MEMORY_BUDGET = int(os.getenv('PARSE_MEMORY_BUDGET', 2 * 1024 ** 3))  # bytes per worker host, 0 = no admission
+PARSE_ADMISSION_RETRY_DELAY = int(os.getenv('PARSE_ADMISSION_RETRY_DELAY', 15))  # seconds before a deferred task retries
+PARSE_MAX_RSS = int(os.getenv('PARSE_MAX_RSS', 3 * 1024 ** 3))  # bytes; a parse past this fails instead (0 = no limit)
+RSS_SAMPLE_INTERVAL = float(os.getenv('RSS_SAMPLE_INTERVAL', 0.5))  # seconds between RSS samples while parsing
+# Crash recovery: workers renew a lease on the file they process; expired leases are reaped
+FILE_LEASE_SECONDS = int(os.getenv('FILE_LEASE_SECONDS', 120))
+FILE_MAX_ATTEMPTS = int(os.getenv('FILE_MAX_ATTEMPTS', 3))  # claims before a repeatedly lost file is failed
+FILE_TASK_MAX_RETRIES = int(os.getenv('FILE_TASK_MAX_RETRIES', 5))  # retries after transient DB/Redis errors
+FILE_TASK_RETRY_BACKOFF = int(os.getenv('FILE_TASK_RETRY_BACKOFF', 5))  # seconds, doubled per retry
+FILE_TASK_RETRY_BACKOFF_MAX = int(os.getenv('FILE_TASK_RETRY_BACKOFF_MAX', 600))
+# CSVs at or above the threshold are split into byte ranges and parsed on several cores
+CSV_PARALLEL_THRESHOLD = int(os.getenv('CSV_PARALLEL_THRESHOLD', 64 * 1024 * 1024))  # bytes
+CSV_PARALLEL_WORKERS = int(os.getenv('CSV_PARALLEL_WORKERS', os.cpu_count() or 1))
+CSV_PARALLEL_CHUNK_SIZE = int(os.getenv('CSV_PARALLEL_CHUNK_SIZE', 32 * 1024 * 1024))  # bytes
+CSV_PARALLEL_START_METHOD = os.getenv('CSV_PARALLEL_START_METHOD', 'fork')
+
+# Admin changelist for large tables
+ADMIN_EXACT_COUNT_THRESHOLD = int(os.getenv('ADMIN_EXACT_COUNT_THRESHOLD', 10000))  # below this estimate, COUNT(*)
+# Search filenames by substring rather than by prefix; only enable once migration 0007 created the pg_trgm index
+ADMIN_TRIGRAM_SEARCH = os.getenv('ADMIN_TRIGRAM_SEARCH', 'False').lower() == 'true'
+ADMIN_BULK_BATCH_SIZE = int(os.getenv('ADMIN_BULK_BATCH_SIZE', 500))  # files per background task of a bulk action
+
+# Bulk deletes: rows are marked deleted at once, then storage is reclaimed in background batches
+BULK_DELETE_MAX_IDS = int(os.getenv('BULK_DELETE_MAX_IDS', 50000))  # ids per bulk delete request
+RECLAIM_BATCH_SIZE = int(os.getenv('RECLAIM_BATCH_SIZE', 500))  # files removed per batch (and progress update)
+
+# Metrics & Profiling Settings
+# Set PROMETHEUS_MULTIPROC_DIR to a shared directory to aggregate web and worker metrics on /metrics
+TASK_PROFILING_ENABLED = os.getenv('TASK_PROFILING_ENABLED', 'False').lower() == 'true'
+TASK_PROFILE_THRESHOLD = float(os.getenv('TASK_PROFILE_THRESHOLD', 30))  # seconds
+TASK_PROFILE_INTERVAL = float(os.getenv('TASK_PROFILE_INTERVAL', 0.01))  # seconds between samples
+TASK_PROFILE_DIR = os.getenv('TASK_PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
 
 # REST Framework Settings
 REST_FRAMEWORK = {
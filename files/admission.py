@@ -0,0 +1,100 @@
+"""
+Admission control for uploads.
+
+An upload is refused before its body is read when the server cannot keep up:
+
+- ``503`` when free disk space, the processing backlog (files waiting for a
+  worker) or the bytes in flight (uploading + processing) are over their limits
+- ``429`` when the client already has UPLOAD_MAX_PER_CLIENT files in flight
+
+``Retry-After`` is how long the backlog takes to drain by the excess, at the
+rate files finished over the last UPLOAD_DRAIN_WINDOW seconds. Limits set to 0
+are not checked. Concurrent uploads can overshoot a limit by a few files; the
+limits are backpressure, not quotas.
+"""
+
+import math
+import os
+import shutil
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import File
+
+ACTIVE_STATUSES = ('uploading', 'processing')
+FINISHED_STATUSES = ('ready', 'failed', 'cancelled', 'timed_out')
+
+
+class Rejection:
+    """Why an upload was refused, and when the client should try again"""
+
+    def __init__(self, status: int, reason: str, message: str, retry_after: int):
+        self.status = status
+        self.reason = reason
+        self.message = message
+        self.retry_after = retry_after
+
+
+def client_id_for(request) -> str:
+    """Client identity for per-client limits: the X-Client-ID header, else the remote address"""
+    return (request.headers.get('X-Client-ID') or request.META.get('REMOTE_ADDR') or 'anonymous')[:255]
+
+
+def drain_rate() -> Tuple[float, float]:
+    """Files and bytes finished per second over the last UPLOAD_DRAIN_WINDOW seconds"""
+    window = settings.UPLOAD_DRAIN_WINDOW
+    finished = File.objects.filter(
+        status__in=FINISHED_STATUSES, updated_at__gte=timezone.now() - timedelta(seconds=window)
+    ).aggregate(files=Count('id'), bytes=Sum('file_size'))
+    return finished['files'] / window, (finished['bytes'] or 0) / window
+
+
+def retry_after(excess: float, rate: float) -> int:
+    """Seconds to drain ``excess`` at ``rate`` per second, within [1, UPLOAD_RETRY_AFTER_MAX]"""
+    if rate <= 0:
+        return settings.UPLOAD_RETRY_AFTER_DEFAULT
+    return max(1, min(settings.UPLOAD_RETRY_AFTER_MAX, math.ceil(excess / rate)))
+
+
+def check_admission(client_id: str, upload_size: int) -> Optional[Rejection]:
+    """None if an upload of ``upload_size`` bytes from ``client_id`` may proceed, else the Rejection"""
+    min_free = settings.UPLOAD_MIN_FREE_DISK
+    if min_free:
+        media_root = settings.MEDIA_ROOT if os.path.isdir(settings.MEDIA_ROOT) else settings.BASE_DIR
+        free = shutil.disk_usage(media_root).free
+        if free - upload_size < min_free:
+            # Disk space comes back through cleanup rather than the processing rate
+            return Rejection(503, 'disk_space', 'Not enough free disk space to accept uploads',
+                             settings.UPLOAD_RETRY_AFTER_DEFAULT)
+
+    backlog = File.objects.filter(status__in=ACTIVE_STATUSES).aggregate(
+        queued=Count('id', filter=Q(status='uploading')),
+        bytes=Sum('file_size'),
+        client=Count('id', filter=Q(client_id=client_id)),
+    )
+    in_flight_bytes = backlog['bytes'] or 0
+
+    if settings.UPLOAD_MAX_PER_CLIENT and backlog['client'] >= settings.UPLOAD_MAX_PER_CLIENT:
+        files_rate, _ = drain_rate()
+        return Rejection(
+            429, 'client_limit',
+            f'Too many files in progress for this client (limit {settings.UPLOAD_MAX_PER_CLIENT})',
+            retry_after(backlog['client'] - settings.UPLOAD_MAX_PER_CLIENT + 1, files_rate),
+        )
+    if settings.UPLOAD_MAX_QUEUED_FILES and backlog['queued'] >= settings.UPLOAD_MAX_QUEUED_FILES:
+        files_rate, _ = drain_rate()
+        return Rejection(
+            503, 'queue_depth', 'Too many files are waiting to be processed',
+            retry_after(backlog['queued'] - settings.UPLOAD_MAX_QUEUED_FILES + 1, files_rate),
+        )
+    if settings.UPLOAD_MAX_INFLIGHT_BYTES and in_flight_bytes + upload_size > settings.UPLOAD_MAX_INFLIGHT_BYTES:
+        _, bytes_rate = drain_rate()
+        return Rejection(
+            503, 'in_flight_bytes', 'Too much data is waiting to be processed',
+            retry_after(in_flight_bytes + upload_size - settings.UPLOAD_MAX_INFLIGHT_BYTES, bytes_rate),
+        )
+    return None
@@ -0,0 +1,131 @@
+"""
+Native async versions of the read-only endpoints, used when the app is
+served through ASGI (file_parser/asgi.py turns on settings.ASYNC_VIEWS).
+
+They return the same payloads as the DRF views in views.py but query with
+the async ORM, so a slow database call doesn't hold a worker thread.
+"""
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .connections import connection_manager
+from .layouts import ARROW_MEDIA_TYPE, arrow_available, arrow_stream, content_table, requested_layout
+from .models import File
+from .serializers import FileDetailSerializer, FileListSerializer, FileProgressSerializer, ProgressBatchSerializer
+
+
+def _not_found():
+    return JsonResponse({'detail': 'Not found.'}, status=404)
+
+
+async def file_progress(request, file_id):
+    """Get file upload/processing progress"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        file_obj = await File.objects.only('id', 'status', 'progress').aget(id=file_id)
+        return JsonResponse(FileProgressSerializer(file_obj).data)
+    except File.DoesNotExist:
+        return _not_found()
+    except Exception as e:
+        return JsonResponse({'error': f'Error retrieving progress: {str(e)}'}, status=500)
+
+
+@csrf_exempt  # like the DRF view it mirrors; it only reads
+async def file_progress_batch(request):
+    """Get the progress of many files at once"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        body = json.loads(request.body or b'null')
+    except ValueError as e:
+        return JsonResponse({'detail': f'JSON parse error - {str(e)}'}, status=400)
+    serializer = ProgressBatchSerializer(data=body)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+    try:
+        files = [file_obj async for file_obj in serializer.queryset()]
+        return JsonResponse(serializer.response(files))
+    except Exception as e:
+        return JsonResponse({'error': f'Error retrieving progress: {str(e)}'}, status=500)
+
+
+async def file_list(request):
+    """List all uploaded files with metadata"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    queryset = File.objects.only(*FileListSerializer.Meta.fields)
+    data = [FileListSerializer(file_obj).data async for file_obj in queryset]
+    return JsonResponse(data, safe=False)
+
+
+def _wants_arrow(request):
+    return request.GET.get('format') == 'arrow' or (
+        'format' not in request.GET and request.accepts(ARROW_MEDIA_TYPE) and not request.accepts('application/json')
+    )
+
+
+async def file_detail(request, file_id):
+    """Get file details and parsed content (same layout and Arrow options as the DRF view)"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    arrow = _wants_arrow(request)
+    try:
+        layout = requested_layout(request)
+        fields, content_paths = (None, None) if arrow else FileDetailSerializer.parse_sparse_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    context = {'layout': layout, 'fields': fields, 'content_paths': content_paths}
+    try:
+        file_obj = await FileDetailSerializer.sparse_queryset(fields, content_paths).aget(id=file_id)
+
+        # While parsing, serve the latest partial result if one has been published;
+        # cancelled and timed-out files keep the partial result they stopped at
+        stopped = file_obj.status in File.STOPPED_STATUSES
+        if stopped or (file_obj.status == 'processing' and file_obj.content_available):
+            data = FileDetailSerializer(file_obj, context=context).data
+            data['partial'] = True
+            return JsonResponse(data, status=200 if stopped else 202)
+
+        # Check if file is ready
+        if file_obj.status != 'ready':
+            return JsonResponse({
+                'message': 'File upload or processing in progress. Please try again later.',
+                'status': file_obj.status,
+                'progress': file_obj.progress
+            }, status=202)
+
+        if arrow:
+            if not arrow_available():
+                return JsonResponse({'error': 'Arrow output requires pyarrow to be installed on the server'}, status=406)
+            table = content_table(file_obj.content_as('columnar'), request.GET.get('sheet'))
+            table['metadata'].update(id=file_obj.id, file_type=file_obj.file_type)
+            return HttpResponse(arrow_stream(table), content_type=ARROW_MEDIA_TYPE)
+
+        return JsonResponse(FileDetailSerializer(file_obj, context=context).data)
+    except File.DoesNotExist:
+        return _not_found()
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': f'Error retrieving file: {str(e)}'}, status=500)
+
+
+async def health_check(request):
+    """Health check endpoint; ?deep=1 also pings Postgres, MongoDB and Redis"""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    payload = {
+        'status': 'healthy',
+        'message': 'File Parser API is running'
+    }
+    if request.GET.get('deep'):
+        payload['connections'] = await sync_to_async(connection_manager.check)()
+        if not all(result['healthy'] for result in payload['connections'].values()):
+            payload['status'] = 'degraded'
+            return JsonResponse(payload, status=503)
+    return JsonResponse(payload)
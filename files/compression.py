@@ -0,0 +1,89 @@
+"""
+Compact storage for File.parsed_content.
+
+Small keys (type, counts, column names, summary) stay in the JSONB column so
+they remain queryable. The bulky keys go into a zstd-compressed msgpack blob,
+with record lists stored column-names-once as {columns, rows} instead of
+repeating every column name in every row.
+"""
+
+import importlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from .layouts import transpose
+
+# Keys holding previews / extracted text, which make up nearly all of the content
+BULKY_KEYS = ('data', 'sheets_data', 'text_content', 'lines_preview', 'content_preview')
+
+FORMAT_VERSION = 1
+
+
+def _compact(value: Any) -> Any:
+    """Turn lists of same-keyed records into {columns, rows}, recursively"""
+    if isinstance(value, dict):
+        return {key: _compact(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            columns = list(value[0])
+            if all(list(item) == columns for item in value):
+                return {'__records__': columns, 'rows': [[_compact(v) for v in item.values()] for item in value]}
+        return [_compact(item) for item in value]
+    return value
+
+
+def _expand(value: Any, layout: str = 'records', key: str = None) -> Any:
+    if isinstance(value, dict):
+        if '__records__' in value:
+            columns, rows = value['__records__'], value['rows']
+            # Previews already stored as rows go out as split/columnar without rebuilding dicts
+            if key == 'data' and layout == 'split':
+                return {'columns': columns, 'data': rows}
+            if key == 'data' and layout == 'columnar':
+                return {'columns': columns, 'data': transpose(rows, len(columns))}
+            return [dict(zip(columns, map(_expand, row))) for row in rows]
+        return {item_key: _expand(item, layout, item_key) for item_key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item, layout) for item in value]
+    return value
+
+
+def compression_enabled() -> bool:
+    return settings.PARSED_CONTENT_COMPRESSION == 'zstd'
+
+
+def pack_content(content: Optional[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[bytes]]:
+    """Split content into the JSON part and the compressed blob (None when nothing is bulky)"""
+    if content is None or not compression_enabled():
+        return content, None
+    bulky = {key: content[key] for key in BULKY_KEYS if key in content}
+    if not bulky:
+        return content, None
+    msgpack = importlib.import_module('msgpack')
+    zstandard = importlib.import_module('zstandard')
+    light = {key: value for key, value in content.items() if key not in bulky}
+    payload = msgpack.packb({
+        'version': FORMAT_VERSION,
+        'order': list(content),
+        'bulky': _compact(bulky),
+    })
+    blob = zstandard.ZstdCompressor(level=settings.PARSED_CONTENT_ZSTD_LEVEL).compress(payload)
+    return light, blob
+
+
+def unpack_content(light: Optional[Dict[str, Any]], blob: Optional[bytes],
+                   layout: str = 'records') -> Optional[Dict[str, Any]]:
+    """Reassemble content written by pack_content, in its original key order
+    
+    With a split or columnar ``layout``, compacted ``data`` previews come back in that layout.
+    """
+    if blob is None:
+        return light
+    msgpack = importlib.import_module('msgpack')
+    zstandard = importlib.import_module('zstandard')
+    payload = msgpack.unpackb(zstandard.ZstdDecompressor().decompress(bytes(blob)), strict_map_key=False)
+    parts = dict(light or {})
+    parts.update(_expand(payload['bulky'], layout))
+    order: List[str] = payload['order']
+    return {key: parts[key] for key in order if key in parts}
@@ -0,0 +1,235 @@
+import collections
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of raw connections with health-checked checkout"""
+
+    def __init__(self, connect, check, max_size, timeout, check_interval):
+        self._connect = connect
+        self._check = check
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._idle = collections.deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._in_use = 0
+
+    def acquire(self):
+        """Check a connection out, reusing an idle one when it is still healthy"""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(f'No connection available within {self.timeout}s (pool size {self.max_size})')
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    conn = self._connect()
+                    break
+                conn, last_used = item
+                # Only ping connections that sat idle long enough to have gone stale
+                if time.monotonic() - last_used < self.check_interval or self._check(conn):
+                    break
+                self._discard(conn)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or drop it if it is broken"""
+        try:
+            if discard:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close every idle connection; checked-out ones close on release"""
+        with self._lock:
+            idle, self._idle = list(self._idle), collections.deque()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        with self._lock:
+            return {'max_size': self.max_size, 'idle': len(self._idle), 'in_use': self._in_use}
+
+
+def _postgres_is_healthy(conn):
+    if conn.closed:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not conn.autocommit:
+            conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+class PostgresPool(ConnectionPool):
+    """Pool of psycopg2 connections handed out to the pooled Django backend"""
+
+    def __init__(self, conn_params):
+        import psycopg2
+        super().__init__(
+            connect=lambda: psycopg2.connect(**conn_params),
+            check=_postgres_is_healthy,
+            max_size=settings.POSTGRES_POOL_SIZE,
+            timeout=settings.POSTGRES_POOL_TIMEOUT,
+            check_interval=settings.CONNECTION_HEALTH_CHECK_INTERVAL,
+        )
+
+    def release(self, conn, discard=False):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+        if not discard:
+            if conn.closed:
+                discard = True
+            elif conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+                # Never hand out a connection with a half-finished transaction
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+        super().release(conn, discard=discard)
+
+
+class ConnectionManager:
+    """Per-process home for shared Postgres, MongoDB and Redis connection pools
+
+    Used by web workers (WSGI and ASGI) and Celery workers alike. Pools are
+    keyed by process id so a forked child never reuses its parent's sockets.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._postgres = {}
+        self._mongo = None
+        self._redis = None
+        self._inherited = []
+
+    def _ensure_process(self):
+        if self._pid != os.getpid():
+            self.reset()
+
+    def reset(self):
+        """Forget pools created by a parent process (call after fork)"""
+        with self._lock:
+            # Closing a psycopg2 connection inherited over fork would terminate
+            # the parent's session, so keep references instead of closing them.
+            self._inherited.append(self._postgres)
+            self._postgres = {}
+            self._mongo = None
+            self._redis = None
+            self._pid = os.getpid()
+
+    def postgres_pool(self, alias, conn_params):
+        """Pool for one database alias, created on first use"""
+        self._ensure_process()
+        key = (alias, conn_params.get('dbname') or conn_params.get('database'))
+        with self._lock:
+            if key not in self._postgres:
+                self._postgres[key] = PostgresPool(conn_params)
+            return self._postgres[key]
+
+    def close_postgres_pools(self, dbname=None):
+        """Close idle pooled connections, e.g. before a database is dropped"""
+        with self._lock:
+            pools = [pool for (alias, name), pool in self._postgres.items() if dbname in (None, name)]
+        for pool in pools:
+            pool.close()
+
+    def mongo(self):
+        """Shared MongoClient (pymongo pools connections internally)"""
+        self._ensure_process()
+        with self._lock:
+            if self._mongo is None:
+                from pymongo import MongoClient
+                self._mongo = MongoClient(
+                    host=settings.MONGO_HOST,
+                    port=int(settings.MONGO_PORT),
+                    username=settings.MONGO_USERNAME,
+                    password=settings.MONGO_PASSWORD,
+                    maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+                    serverSelectionTimeoutMS=int(settings.CONNECTION_TIMEOUT * 1000),
+                    connectTimeoutMS=int(settings.CONNECTION_TIMEOUT * 1000),
+                    connect=False,
+                )
+            return self._mongo
+
+    def mongo_db(self):
+        return self.mongo()[settings.MONGO_DB_NAME]
+
+    def redis(self):
+        """Shared Redis client backed by one connection pool"""
+        self._ensure_process()
+        with self._lock:
+            if self._redis is None:
+                import redis
+                pool = redis.ConnectionPool(
+                    host=settings.REDIS_HOST,
+                    port=int(settings.REDIS_PORT),
+                    db=0,
+                    max_connections=settings.REDIS_MAX_CONNECTIONS,
+                    socket_timeout=settings.CONNECTION_TIMEOUT,
+                    socket_connect_timeout=settings.CONNECTION_TIMEOUT,
+                    health_check_interval=settings.CONNECTION_HEALTH_CHECK_INTERVAL,
+                )
+                self._redis = redis.Redis(connection_pool=pool)
+            return self._redis
+
+    def check(self):
+        """Ping every backend, returning status and latency per connection"""
+        from django.db import connection
+
+        def postgres():
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+
+        checks = {
+            'postgres': postgres,
+            'mongo': lambda: self.mongo().admin.command('ping'),
+            'redis': lambda: self.redis().ping(),
+        }
+        results = {}
+        for name, ping in checks.items():
+            start = time.perf_counter()
+            try:
+                ping()
+                results[name] = {'healthy': True}
+            except Exception as e:
+                results[name] = {'healthy': False, 'error': str(e)}
+            results[name]['latency_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        results['postgres']['pools'] = [pool.stats() for pool in self._postgres.values()]
+        return results
+
+
+connection_manager = ConnectionManager()
@@ -0,0 +1,391 @@
+"""
+Row-level diff between two tabular uploads.
+
+diff_files(base, new) reports the rows added, removed and changed from one
+CSV/Excel file to the next, matched on key columns. Without key columns rows
+are matched on their whole content, so an edited row shows up as one removed
+and one added. Repeated rows are matched one for one.
+
+This is a grace hash join.
+
+- Read: each file is read once as text cells, DIFF_CHUNK_ROWS rows at a time.
+  CSV files use pyarrow's streaming reader when it is installed. A file stored
+  on another node is first copied over from it (files.nodes.LocalFile).
+- Hash: each cell's UTF-8 bytes are hashed eight at a time with numpy (the
+  murmur3 finalizer as mixer). The hashes do not depend on the reader, so a
+  CSV can be diffed against an Excel export.
+- Partition: each row becomes a 24-byte record (key hash, row hash, position),
+  spilled to one of DIFF_PARTITIONS files by key hash.
+- Join: matching rows always land in the same partition, so the partitions are
+  joined one pair at a time. Memory is bounded by a chunk plus a partition,
+  not by the files.
+
+Only the first DIFF_MAX_ROWS positions of each kind are kept. The
+DIFF_PREVIEW_ROWS rows shown in full come from a second pass that stops as
+soon as it has them. Results are cached in Redis, keyed on both files'
+versions (id, size and last change).
+"""
+
+import csv
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from .connections import connection_manager
+from .parsers import get_parser, registry, sample_bytes_per_row
+from .nodes import LocalFile
+from .storage import open_source
+
+logger = logging.getLogger(__name__)
+
+TABULAR_TYPES = ('csv', 'xlsx', 'xls')
+CACHE_PREFIX = 'files:diff:'
+
+# murmur3's 64-bit finalizer, and the constants for seeding values and combining columns
+FMIX_1, FMIX_2 = 0xFF51AFD7ED558CCD, 0xC4CEB93C185EC53
+GOLDEN = 0x9E3779B97F4A7C15
+# What a row is spilled to its partition as
+RECORD = [('key', '<u8'), ('row', '<u8'), ('pos', '<i8')]
+
+
+def fmix(h):
+    """Mix every uint64 of ``h`` in place (and return it)"""
+    import numpy as np
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(FMIX_1)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(FMIX_2)
+    h ^= h >> np.uint64(33)
+    return h
+
+
+def hash_text(data, offsets):
+    """64-bit hash of each value in a text column, given as UTF-8 bytes and the offsets of each value in them"""
+    import numpy as np
+    starts = offsets[:-1].astype(np.int64)
+    lengths = np.diff(offsets).astype(np.int64)
+    padded = np.zeros(len(data) + 8, dtype=np.uint8)
+    padded[:len(data)] = data
+    # A little-endian uint64 starting at every byte, so any value's next 8 bytes are one gather
+    words = np.ndarray((len(data) + 1,), dtype='<u8', buffer=padded, strides=(1,))
+    hashes = fmix(lengths.astype(np.uint64) ^ np.uint64(GOLDEN))
+    rows = np.arange(len(lengths))
+    for start in range(0, int(lengths.max(initial=0)), 8):
+        rows = rows[lengths[rows] > start]  # values with bytes left
+        word = words[starts[rows] + start]
+        remaining = lengths[rows] - start
+        tail = remaining < 8
+        # Keep only the value's own bytes of its last word
+        word[tail] &= (np.uint64(1) << (remaining[tail].astype(np.uint64) * np.uint64(8))) - np.uint64(1)
+        hashes[rows] = fmix(hashes[rows] ^ word)
+    return hashes
+
+
+def combine(hashes: List, rows: int):
+    """One hash per row from its columns' hashes, in order"""
+    import numpy as np
+    combined = np.full(rows, GOLDEN, dtype=np.uint64)
+    for column in hashes:
+        combined = fmix(combined * np.uint64(GOLDEN) + column)
+    return combined
+
+
+def text_buffers(chunk, index: int):
+    """UTF-8 bytes of one column of a chunk, with the offsets of its values in them"""
+    import numpy as np
+    if hasattr(chunk, 'iloc'):
+        encoded = [value.encode('utf-8', 'surrogatepass') for value in chunk.iloc[:, index].tolist()]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+    column = chunk.column(index)
+    _, offsets, data = column.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int32)[column.offset:column.offset + len(column) + 1]
+    return (np.empty(0, dtype=np.uint8) if data is None else np.frombuffer(data, dtype=np.uint8)), offsets
+
+
+def records(chunk, indices) -> List[Dict[str, str]]:
+    if hasattr(chunk, 'iloc'):
+        return chunk.iloc[indices].to_dict('records')
+    import pyarrow as pa
+    return chunk.take(pa.array(indices)).to_pylist()
+
+
+def open_text(path: str, file_type: str, sheet: Optional[str] = None) -> Tuple[List[str], Iterator[Any]]:
+    """The column names of the file at ``path`` (from LocalFile), and its rows as text DIFF_CHUNK_ROWS at a time
+
+    Chunks are pyarrow RecordBatches for CSV files when pyarrow is installed, and
+    DataFrames from the file's parser (FileParser.iter_text_chunks) otherwise.
+    """
+    if file_type == 'csv' and importlib.util.find_spec('pyarrow') is not None:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+        with io.TextIOWrapper(open_source(path), newline='', encoding='utf-8') as file:
+            columns = next(csv.reader(file), [])
+        block_size = int(settings.DIFF_CHUNK_ROWS * (sample_bytes_per_row(path) or 100))
+
+        def batches():
+            with open_source(path) as source:
+                reader = pa_csv.open_csv(
+                    source,
+                    read_options=pa_csv.ReadOptions(block_size=max(block_size, 1024 * 1024)),
+                    parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                    convert_options=pa_csv.ConvertOptions(column_types={column: pa.string() for column in columns}),
+                )
+                try:
+                    yield from reader
+                finally:
+                    reader.close()
+        return columns, batches()
+
+    chunks = get_parser(path, file_type).iter_text_chunks(settings.DIFF_CHUNK_ROWS, sheet=sheet)
+    first = next(chunks, None)
+
+    def frames():
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        finally:
+            chunks.close()
+    return ([] if first is None else [str(column) for column in first.columns]), frames()
+
+
+def partition(chunks: Iterator[Any], compared: List[int], keys: List[int], paths: List[str]) -> int:
+    """Hash every row into its partition file; returns the number of rows
+
+    ``compared`` and ``keys`` are column positions, in the order they are hashed in.
+    """
+    import numpy as np
+    outputs = [open(path, 'wb') for path in paths]
+    rows = 0
+    try:
+        for chunk in chunks:
+            hashes = {index: hash_text(*text_buffers(chunk, index)) for index in compared}
+            records = np.empty(len(chunk), dtype=RECORD)
+            records['row'] = combine([hashes[index] for index in compared], len(chunk))
+            records['key'] = combine([hashes[index] for index in keys], len(chunk)) if keys else records['row']
+            records['pos'] = np.arange(rows, rows + len(chunk))
+            # Group the chunk by partition with one stable sort, keeping positions in order within each
+            buckets = (records['key'] % np.uint64(len(paths))).astype(np.uint16)  # radix-sorted
+            records = records[np.argsort(buckets, kind='stable')]
+            bounds = np.concatenate(([0], np.cumsum(np.bincount(buckets, minlength=len(paths)))))
+            for index, output in enumerate(outputs):
+                records[bounds[index]:bounds[index + 1]].tofile(output)
+            rows += len(chunk)
+    finally:
+        for output in outputs:
+            output.close()
+    return rows
+
+
+def occurrence_keys(keys):
+    """``keys`` made unique, and the order that sorts them
+    
+    A key's second, third... occurrence (in position order) becomes a key of its own.
+    """
+    import numpy as np
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    repeated = sorted_keys[1:][sorted_keys[1:] == sorted_keys[:-1]]
+    if not len(repeated):
+        return keys, order
+    # Number the occurrences of repeated keys only, in position order
+    rows = np.flatnonzero(np.isin(keys, repeated))
+    rows = rows[np.argsort(keys[rows], kind='stable')]
+    index = np.arange(len(rows))
+    run_start = np.ones(len(rows), dtype=bool)
+    run_start[1:] = keys[rows[1:]] != keys[rows[:-1]]
+    occurrence = (index - np.maximum.accumulate(np.where(run_start, index, 0))).astype(np.uint64)
+    unique = keys.copy()
+    later = occurrence > 0
+    unique[rows[later]] = fmix(keys[rows[later]] + occurrence[later] * np.uint64(GOLDEN))
+    return unique, np.argsort(unique)
+
+
+def join_partition(base_path: str, new_path: str):
+    """Positions of the added, removed and changed rows of one partition, and the number unchanged
+    
+    The n-th occurrence of a key in one file matches its n-th occurrence in the other.
+    """
+    import numpy as np
+    base, new = np.fromfile(base_path, dtype=RECORD), np.fromfile(new_path, dtype=RECORD)
+    base_keys, base_order = occurrence_keys(base['key'])
+    new_keys, _ = occurrence_keys(new['key'])
+    sorted_keys = base_keys[base_order]
+    slots = np.searchsorted(sorted_keys, new_keys).clip(max=max(len(base) - 1, 0))
+    found = sorted_keys[slots] == new_keys if len(base) else np.zeros(len(new), dtype=bool)
+    new_matched = np.flatnonzero(found)
+    base_matched = base_order[slots[found]]
+    removed = np.ones(len(base), dtype=bool)
+    removed[base_matched] = False
+    differs = base['row'][base_matched] != new['row'][new_matched]
+    changed = np.column_stack([base['pos'][base_matched][differs], new['pos'][new_matched][differs]])
+    return new['pos'][~found], base['pos'][removed], changed, int(len(base_matched) - differs.sum())
+
+
+def first_positions(kept, found, limit: int, by: int = None):
+    """The ``limit`` lowest positions of kept and found together (of column ``by`` for pairs)"""
+    import numpy as np
+    combined = np.concatenate([kept, found])
+    if len(combined) > limit:
+        order = combined if by is None else combined[:, by]
+        combined = combined[np.argpartition(order, limit - 1)[:limit]]
+    return combined
+
+
+def read_positions(path: str, file_type: str, sheet: Optional[str],
+                   positions: Iterable[int]) -> Dict[int, Dict[str, str]]:
+    """The rows at ``positions``, reading no further into the file than the last of them"""
+    import numpy as np
+    wanted = np.unique(np.fromiter(positions, dtype=np.int64))
+    found = {}
+    if not len(wanted):
+        return found
+    _, chunks = open_text(path, file_type, sheet)
+    try:
+        start = 0
+        for chunk in chunks:
+            end = start + len(chunk)
+            hits = wanted[(wanted >= start) & (wanted < end)]
+            for position, record in zip(hits.tolist(), records(chunk, hits - start)):
+                found[position] = record
+            start = end
+            if start > wanted[-1]:
+                break
+    finally:
+        chunks.close()
+    return found
+
+
+def file_type_of(file_obj) -> str:
+    return file_obj.get_file_extension().lstrip('.')
+
+
+def local_file(file_obj) -> LocalFile:
+    """The file on this node's disk, copied from its storage node when it is elsewhere"""
+    return LocalFile(file_obj, streamed=registry.reads_compressed(file_type_of(file_obj)))
+
+
+def diff_files(base, new, keys: Optional[List[str]] = None, sheet: Optional[str] = None) -> Dict[str, Any]:
+    """Rows added, removed and changed from ``base`` to ``new``; row numbers are 0-based, as on the rows endpoint"""
+    with local_file(base) as base_source, local_file(new) as new_source:
+        return diff_paths(base, base_source, new, new_source, keys or [], sheet)
+
+
+def diff_paths(base, base_source: str, new, new_source: str, keys: List[str], sheet: Optional[str]) -> Dict[str, Any]:
+    import numpy as np
+    base_type, new_type = file_type_of(base), file_type_of(new)
+    base_columns, base_chunks = open_text(base_source, base_type, sheet)
+    new_columns, new_chunks = open_text(new_source, new_type, sheet)
+    try:
+        compared = [column for column in base_columns if column in new_columns]
+        if not compared:
+            raise ValueError('The files have no columns in common')
+        missing = [key for key in keys if key not in compared]
+        if missing:
+            raise ValueError(f"Key columns not in both files: {', '.join(missing)}")
+
+        limit = settings.DIFF_MAX_ROWS
+        added = removed = np.empty(0, dtype=np.int64)
+        changed = np.empty((0, 2), dtype=np.int64)
+        counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+        with tempfile.TemporaryDirectory(prefix='diff-', dir=settings.DIFF_TEMP_DIR or None) as directory:
+            paths = {
+                side: [os.path.join(directory, f'{side}.{index}') for index in range(settings.DIFF_PARTITIONS)]
+                for side in ('base', 'new')
+            }
+            base_rows = partition(base_chunks, [base_columns.index(column) for column in compared],
+                                  [base_columns.index(key) for key in keys], paths['base'])
+            new_rows = partition(new_chunks, [new_columns.index(column) for column in compared],
+                                 [new_columns.index(key) for key in keys], paths['new'])
+            for base_path, new_path in zip(paths['base'], paths['new']):
+                part_added, part_removed, part_changed, unchanged = join_partition(base_path, new_path)
+                counts['added'] += len(part_added)
+                counts['removed'] += len(part_removed)
+                counts['changed'] += len(part_changed)
+                counts['unchanged'] += unchanged
+                added = first_positions(added, part_added, limit)
+                removed = first_positions(removed, part_removed, limit)
+                changed = first_positions(changed, part_changed, limit, by=1)
+    finally:
+        base_chunks.close()
+        new_chunks.close()
+    added, removed = np.sort(added).tolist(), np.sort(removed).tolist()
+    changed = changed[np.argsort(changed[:, 1], kind='stable')].tolist()
+
+    # Rows shown in full: the first few of each kind
+    preview = settings.DIFF_PREVIEW_ROWS
+    base_records = read_positions(base_source, base_type, sheet,
+                                  removed[:preview] + [pair[0] for pair in changed[:preview]])
+    new_records = read_positions(new_source, new_type, sheet,
+                                 added[:preview] + [pair[1] for pair in changed[:preview]])
+
+    def listing(kind: str, rows: List[Any], preview_rows: List[Any]) -> Dict[str, Any]:
+        return {'rows': rows, 'truncated': counts[kind] > len(rows), 'preview': preview_rows}
+
+    return {
+        'base': str(base.id),
+        'file': str(new.id),
+        'sheet': sheet,
+        'match': 'keys' if keys else 'rows',
+        'keys': keys,
+        'columns': {
+            'compared': compared,
+            'added': [column for column in new_columns if column not in base_columns],
+            'removed': [column for column in base_columns if column not in new_columns],
+        },
+        'summary': {'base_rows': base_rows, 'rows': new_rows, **counts},
+        'added': listing('added', added, [new_records[row] for row in added[:preview]]),
+        'removed': listing('removed', removed, [base_records[row] for row in removed[:preview]]),
+        'changed': listing('changed', changed, [
+            {
+                'base_row': base_row,
+                'row': row,
+                'key': {key: new_records[row][key] for key in keys},
+                'changes': {
+                    column: [base_records[base_row][column], new_records[row][column]]
+                    for column in compared if base_records[base_row][column] != new_records[row][column]
+                },
+            }
+            for base_row, row in changed[:preview]
+        ]),
+    }
+
+
+def cache_key(base, new, keys: List[str], sheet: Optional[str]) -> str:
+    # An append or reprocess moves updated_at, so a stale diff is never served
+    identity = json.dumps([
+        [str(file_obj.id), file_obj.updated_at.isoformat(), file_obj.file_size] for file_obj in (base, new)
+    ] + [keys, sheet, settings.DIFF_MAX_ROWS, settings.DIFF_PREVIEW_ROWS])
+    return CACHE_PREFIX + hashlib.sha256(identity.encode()).hexdigest()
+
+
+def cached_diff(base, new, keys: Optional[List[str]] = None, sheet: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+    """diff_files(), served from the Redis cache when the same diff of the same versions was computed before
+
+    Returns the result and whether it came from the cache.
+    """
+    keys = keys or []
+    key = cache_key(base, new, keys, sheet)
+    try:
+        cached = connection_manager.redis().get(key)
+    except Exception as e:
+        # Without Redis every diff is computed afresh
+        logger.warning("Could not read cached diff %s: %s", key, e)
+        cached = None
+    if cached is not None:
+        return json.loads(cached), True
+    result = diff_files(base, new, keys, sheet)
+    try:
+        connection_manager.redis().set(key, json.dumps(result), ex=settings.DIFF_CACHE_TTL)
+    except Exception as e:
+        logger.warning("Could not cache diff %s: %s", key, e)
+    return result, False
@@ -0,0 +1,131 @@
+"""
+Response layouts for tabular previews (the ``data`` lists of CSV and Excel content).
+
+- ``records``: ``[{"col": value, ...}, ...]``, the stored format and the default
+- ``split``: ``{"columns": [...], "data": [[row values], ...]}``
+- ``columnar``: ``{"columns": [...], "data": [[column values], ...]}``
+
+Clients pick one with ``?layout=`` or an ``Accept: application/json; layout=split``
+parameter. Conversions use itemgetter/zip/pandas rather than per-row Python code.
+"""
+
+import importlib
+import importlib.util
+import json
+from operator import itemgetter
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .parsers import preview_records
+
+if TYPE_CHECKING:
+    import pandas
+
+LAYOUTS = ('records', 'split', 'columnar')
+
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+class ColumnarTable(dict):
+    """A table ({columns, data as column lists, metadata}) that can be sent as an Arrow stream"""
+
+    def __init__(self, columns: List[str], data: List[list], metadata: Optional[Dict[str, Any]] = None):
+        super().__init__(columns=columns, data=data, metadata=metadata or {})
+
+
+def requested_layout(request) -> str:
+    """Layout asked for by ?layout= or an Accept header parameter, defaulting to records"""
+    layout = request.GET.get('layout')
+    if layout is None:
+        for media_type in request.accepted_types:
+            if 'layout' in media_type.params:
+                layout = media_type.params['layout']
+                break
+    layout = layout or 'records'
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}'; expected one of {', '.join(LAYOUTS)}")
+    return layout
+
+
+def transpose(rows: List[list], width: int) -> List[list]:
+    return [list(column) for column in zip(*rows)] if rows else [[] for _ in range(width)]
+
+
+def records_in_layout(records: List[Dict[str, Any]], layout: str,
+                      columns: Optional[List[str]] = None) -> Any:
+    """Convert a records list to the split or columnar layout
+    
+    Pass the stored column_names as ``columns``: JSONB does not keep object key order.
+    """
+    if layout == 'records':
+        return records
+    columns = list(columns) if columns else list(records[0]) if records else []
+    if records:
+        values = map(itemgetter(*columns), records)
+        # itemgetter returns a bare value rather than a tuple for a single column
+        rows = list(values) if len(columns) > 1 else list(zip(values))
+    else:
+        rows = []
+    if layout == 'split':
+        return {'columns': columns, 'data': rows}
+    return {'columns': columns, 'data': transpose(rows, len(columns))}
+
+
+def apply_layout(value: Any, layout: str, key: Optional[str] = None, columns: Optional[List[str]] = None) -> Any:
+    """Convert every records list stored under a ``data`` key in parsed content"""
+    if layout == 'records' or (key == 'data' and isinstance(value, dict)):
+        return value
+    if isinstance(value, dict):
+        return {
+            item_key: apply_layout(item, layout, item_key, value.get('column_names'))
+            for item_key, item in value.items()
+        }
+    if key == 'data' and isinstance(value, list) and (not value or isinstance(value[0], dict)):
+        return records_in_layout(value, layout, columns)
+    return value
+
+
+def frame_in_layout(df: 'pandas.DataFrame', layout: str) -> Any:
+    """A DataFrame as JSON-safe data in the requested layout, converted by pandas"""
+    if layout == 'records':
+        return preview_records(df, len(df))
+    split = json.loads(df.to_json(orient='split', index=False, date_format='iso'))
+    if layout == 'split':
+        return {'columns': split['columns'], 'data': split['data']}
+    return {'columns': split['columns'], 'data': transpose(split['data'], len(split['columns']))}
+
+
+def content_table(content: Dict[str, Any], sheet: Optional[str] = None) -> ColumnarTable:
+    """The preview table of columnar-layout content: the CSV data, or one Excel sheet (default: the first)"""
+    if content.get('type') == 'excel':
+        sheet = sheet or next(iter(content['sheets']), None)
+        if sheet not in content['sheets_data']:
+            raise ValueError(f"Unknown sheet '{sheet}'")
+        table = content['sheets_data'][sheet]['data']
+        return ColumnarTable(table['columns'], table['data'], {'sheet': sheet})
+    if content.get('type') == 'csv':
+        return ColumnarTable(content['data']['columns'], content['data']['data'])
+    raise ValueError('Arrow output is only available for tabular (CSV and Excel) files')
+
+
+def arrow_available() -> bool:
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def arrow_stream(table: ColumnarTable) -> bytes:
+    """Encode a ColumnarTable as an Arrow IPC stream (requires pyarrow)"""
+    pa = importlib.import_module('pyarrow')
+    arrays = []
+    for values in table['data']:
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Columns mixing types (e.g. numbers and text) are sent as strings
+            arrays.append(pa.array([None if value is None else str(value) for value in values]))
+    arrow_table = pa.Table.from_arrays(arrays, names=[str(column) for column in table['columns']])
+    arrow_table = arrow_table.replace_schema_metadata(
+        {str(key): str(value) for key, value in table['metadata'].items()}
+    )
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return sink.getvalue().to_pybytes()
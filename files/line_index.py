@@ -0,0 +1,149 @@
+"""
+Sparse line-offset index for random access into text files.
+
+The index stores the byte offset of every ``stride``-th line start as a uint64
+array in ``<file>.lines.idx``, next to the upload (8 bytes per ``stride`` lines,
+e.g. ~280 KB for 9 million lines at the default stride of 256). Reading line N
+seeks to the offset of line N - N % stride and skips at most ``stride - 1``
+lines from there, so any line is as cheap to reach as line 1. Offsets are into
+the original bytes, so a compressed upload (files.storage.open_source) is
+indexed and read without being decompressed to disk.
+
+Lines end at ``\\n``, ``\\r\\n`` or a lone ``\\r``, as in the universal-newline text
+the TXT parser counts (files.text_stream), so a file has one more line than it
+has line endings and total_lines matches the parsed content.
+"""
+
+import codecs
+import io
+import os
+import struct
+from typing import List, Tuple
+
+from django.conf import settings
+
+from .storage import open_source, source_size
+
+MAGIC = b'LIDX'
+VERSION = 1
+# magic, version, stride, total lines, size of the indexed file
+HEADER = struct.Struct('<4sHxxQQQ')
+OFFSET = struct.Struct('<Q')
+BLOCK_SIZE = 16 * 1024 * 1024  # bytes scanned per numpy pass while building
+READ_SIZE = 64 * 1024  # bytes decoded at a time while reading lines
+
+
+class StaleIndex(Exception):
+    """The index is missing, unreadable, or was built for a different version of the file"""
+
+
+def indexable(encoding: str) -> bool:
+    """Whether line endings are b'\\n' and b'\\r' bytes in ``encoding`` (not so in UTF-16/32)"""
+    return not codecs.lookup(encoding).name.startswith(('utf-16', 'utf-32'))
+
+
+def index_path(file_path: str) -> str:
+    return f"{file_path}.lines.idx"
+
+
+def build_line_index(file_path: str, stride: int = None) -> int:
+    """Write the index next to ``file_path`` in one blocked pass, returning the number of lines"""
+    import numpy as np
+    stride = stride or settings.LINE_INDEX_STRIDE
+    starts = [np.zeros(1, dtype='<u8')]  # line 0
+    newlines = offset = 0
+    with open_source(file_path) as file:
+        while True:
+            block = file.read(BLOCK_SIZE)
+            if not block:
+                break
+            while block.endswith(b'\r'):
+                # Whether this \r is half of a \r\n depends on the next byte
+                next_byte = file.read(1)
+                if not next_byte:
+                    break
+                block += next_byte
+            data = np.frombuffer(block, dtype=np.uint8)
+            line_feeds, returns = data == ord('\n'), data == ord('\r')
+            # A \r ends a line unless a \n follows it, which then ends the line instead
+            returns[:-1] &= ~line_feeds[1:]
+            positions = np.flatnonzero(line_feeds | returns)
+            # The i-th line ending here starts line newlines + i + 1; keep the lines that are multiples of stride
+            first = -(newlines + 1) % stride
+            starts.append((positions[first::stride] + offset + 1).astype('<u8'))
+            newlines += len(positions)
+            offset += len(block)
+
+    temp_path = f"{index_path(file_path)}.tmp"
+    with open(temp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, stride, newlines + 1, offset))
+        np.concatenate(starts).tofile(out)
+    os.replace(temp_path, index_path(file_path))
+    return newlines + 1
+
+
+class LineIndex:
+    """Read access to a built index; offsets are read individually rather than loaded"""
+
+    def __init__(self, file_path: str):
+        try:
+            self.file = open(index_path(file_path), 'rb')
+        except FileNotFoundError:
+            raise StaleIndex(f"No line index for {file_path}")
+        try:
+            magic, version, self.stride, self.total_lines, indexed_size = HEADER.unpack(self.file.read(HEADER.size))
+        except struct.error:
+            self.close()
+            raise StaleIndex(f"Unreadable line index for {file_path}")
+        if magic != MAGIC or version != VERSION or indexed_size != source_size(file_path):
+            self.close()
+            raise StaleIndex(f"Line index for {file_path} is out of date")
+
+    def line_start(self, line: int) -> Tuple[int, int]:
+        """Offset of the nearest indexed line at or before ``line``, and how many lines remain to skip"""
+        self.file.seek(HEADER.size + (line // self.stride) * OFFSET.size)
+        return OFFSET.unpack(self.file.read(OFFSET.size))[0], line % self.stride
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def open_line_index(file_path: str) -> LineIndex:
+    """The file's index, (re)built first if it is missing or stale"""
+    try:
+        return LineIndex(file_path)
+    except StaleIndex:
+        build_line_index(file_path)
+        return LineIndex(file_path)
+
+
+def read_lines(file_path: str, start: int, count: int, encoding: str = 'utf-8') -> Tuple[List[str], int]:
+    """Lines ``start`` to ``start + count`` (fewer at the end of the file) and the file's total line count"""
+    with open_line_index(file_path) as index:
+        total_lines = index.total_lines
+        if start >= total_lines:
+            return [], total_lines
+        position, skip = index.line_start(start)
+
+    wanted = skip + min(count, total_lines - start)
+    # Decoded like the TXT parser's scan: \r\n and \r become \n, undecodable bytes U+FFFD
+    decoder = io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(errors='replace'), translate=True)
+    lines, partial = [], ''
+    with open_source(file_path) as file:
+        file.seek(position)
+        while len(lines) < wanted:
+            data = file.read(READ_SIZE)
+            pieces = (partial + decoder.decode(data, final=not data)).split('\n')
+            if not data:
+                lines.extend(pieces)
+                break
+            lines.extend(pieces[:-1])
+            partial = pieces[-1]
+    return lines[skip:wanted], total_lines
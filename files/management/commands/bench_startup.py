@@ -0,0 +1,80 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Each profile runs in a fresh interpreter and reports its own timings
+PROFILE_SCRIPT = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+{body}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "pandas_loaded": "pandas" in sys.modules,
+    "modules": len(sys.modules),
+}}))
+'''
+
+PROFILES = {
+    # What a gunicorn web worker imports before serving its first request
+    'web': 'import file_parser.urls',
+    # A Celery worker parent: task modules plus preloaded parser dependencies
+    'worker': 'import files.tasks\nfrom files.parsers import registry\nregistry.preload()',
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark import time and memory for web and worker process startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=5,
+            help='Number of fresh interpreters to start per profile'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the JSON results to this path'
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'file_parser.settings')
+        results = {}
+
+        for name, body in PROFILES.items():
+            runs = []
+            for _ in range(options['runs']):
+                completed = subprocess.run(
+                    [sys.executable, '-c', PROFILE_SCRIPT.format(body=body)],
+                    capture_output=True, text=True, env=env
+                )
+                if completed.returncode != 0:
+                    raise CommandError(f'{name} profile failed:\n{completed.stderr}')
+                runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+            results[name] = {
+                'median_seconds': round(statistics.median(run['seconds'] for run in runs), 4),
+                'median_max_rss_mb': round(statistics.median(run['max_rss_kb'] for run in runs) / 1024, 1),
+                'modules': runs[-1]['modules'],
+                'pandas_loaded': runs[-1]['pandas_loaded'],
+            }
+            self.stdout.write(
+                f'{name:<8} {results[name]["median_seconds"]:.3f}s  '
+                f'{results[name]["median_max_rss_mb"]} MB RSS  '
+                f'{results[name]["modules"]} modules  pandas={results[name]["pandas_loaded"]}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'📄 Results written to {options["output"]}'))
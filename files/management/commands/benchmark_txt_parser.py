@@ -0,0 +1,139 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+# Each implementation runs in a fresh interpreter and reports its time and how far
+# its peak memory rose over the RSS it started from. The peak is reset first
+# (/proc/self/clear_refs), so interpreter startup and imports are not counted;
+# where that is unavailable, only growth past the peak before the parse counts.
+BENCH_SCRIPT = '''
+import json, resource, sys, time
+from files.text_stream import scan_text  # imported before the peak is reset, like the builtins whole-file uses
+path, block_size = sys.argv[1], int(sys.argv[2])
+
+def peak_rss():
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+try:
+    with open('/proc/self/clear_refs', 'w') as refs:
+        refs.write('5')  # VmHWM restarts from the current RSS
+except OSError:
+    pass
+baseline = peak_rss()
+start = time.perf_counter()
+{body}
+print(json.dumps({{
+    "seconds": time.perf_counter() - start,
+    "peak_mb": (peak_rss() - baseline) / 1024 / 1024,
+    "lines": result["total_lines"],
+    "characters": result["total_characters"],
+}}))
+'''
+
+IMPLEMENTATIONS = {
+    # TXTParser.parse before streaming: the whole file as one string, then a list of every line
+    'whole-file': '''
+with open(path, 'r', encoding='utf-8') as file:
+    content = file.read()
+lines = content.split('\\n')
+result = {
+    'total_lines': len(lines),
+    'total_characters': len(content),
+    'content_preview': content[:2000],
+    'lines_preview': lines[:100],
+    'average_line_length': len(content) / len(lines) if lines else 0,
+}
+''',
+    'streaming': '''
+result = scan_text(path, block_size)
+''',
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare the streaming TXT parser with whole-file reading on a large log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            type=str,
+            help='Text file to parse (default: generate a synthetic log of --size-mb)'
+        )
+        parser.add_argument(
+            '--size-mb',
+            type=int,
+            default=300,
+            help='Size of the generated log'
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=settings.TXT_READ_BLOCK_SIZE,
+            help='Bytes per block for the streaming parser'
+        )
+
+    def generate_log(self, size_mb):
+        line = '2024-01-01T12:00:00.000Z INFO  [worker-{0:03d}] request {1} handled in {2} ms status=200\n'
+        handle, path = tempfile.mkstemp(suffix='.log')
+        written, index = 0, 0
+        with os.fdopen(handle, 'w', encoding='utf-8') as log:
+            while written < size_mb * 1024 * 1024:
+                batch = ''.join(line.format(i % 64, i, i % 997) for i in range(index, index + 10000))
+                log.write(batch)
+                written += len(batch)
+                index += 10000
+        return path
+
+    def handle(self, *args, **options):
+        path = options['path']
+        generated = path is None
+        if generated:
+            self.stdout.write(f'📝 Generating a {options["size_mb"]} MB log...')
+            path = self.generate_log(options['size_mb'])
+        elif not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'file_parser.settings')
+        self.stdout.write(f'📄 {path}: {os.path.getsize(path) / 1024 / 1024:.0f} MB')
+        results = {}
+        try:
+            for name, body in IMPLEMENTATIONS.items():
+                completed = subprocess.run(
+                    [sys.executable, '-c', BENCH_SCRIPT.format(body=body), path, str(options['block_size'])],
+                    capture_output=True, text=True, env=env, cwd=settings.BASE_DIR
+                )
+                if completed.returncode != 0:
+                    # The whole-file parser fails outright on non-UTF-8 input
+                    self.stdout.write(self.style.WARNING(f'{name:<11} failed: {completed.stderr.strip().splitlines()[-1]}'))
+                    continue
+                results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+                self.stdout.write(
+                    f'{name:<11} {results[name]["seconds"]:.2f}s  '
+                    f'+{results[name]["peak_mb"]:.0f} MB peak RSS  '
+                    f'{results[name]["lines"]:,} lines'
+                )
+        finally:
+            if generated:
+                os.remove(path)
+
+        if len(results) == 2 and results['whole-file']['lines'] != results['streaming']['lines']:
+            raise CommandError('The implementations disagree on the number of lines')
+        if len(results) == 2:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ Streaming: {results["whole-file"]["seconds"] / results["streaming"]["seconds"]:.1f}x the speed, '
+                f'{results["streaming"]["peak_mb"]:.0f} MB instead of {results["whole-file"]["peak_mb"]:.0f} MB'
+            ))
@@ -0,0 +1,381 @@
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.urls import reverse
+
+from file_parser.celery import app as celery_app
+
+
+ENDPOINTS = ['upload', 'progress', 'detail', 'list', 'delete']
+DEFAULT_FILES = [
+    os.path.join('sample_data', 'sample.csv'),
+    os.path.join('sample_data', 'sample.txt'),
+]
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarize(values):
+    """Summarize a list of samples into count/mean/p50/p95/p99/max"""
+    if not values:
+        return {'count': 0, 'mean': None, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(max(values), 3),
+    }
+
+
+class HTTPResponse:
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HTTPClient:
+    """Real HTTP requests to a running stack, with the get/post/delete calls of django.test.Client used here"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, data=None):
+        headers, body = {}, None
+        if data is not None:
+            boundary = uuid.uuid4().hex
+            parts = []
+            for field, value in data.items():
+                if hasattr(value, 'read'):
+                    disposition = f'form-data; name="{field}"; filename="{value.name}"'
+                    content = value.read()
+                else:
+                    disposition = f'form-data; name="{field}"'
+                    content = str(value).encode()
+                parts.append(f'--{boundary}\r\nContent-Disposition: {disposition}\r\n\r\n'.encode() + content + b'\r\n')
+            body = b''.join(parts) + f'--{boundary}--\r\n'.encode()
+            headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return HTTPResponse(response.status, response.read())
+        except urllib.error.HTTPError as e:
+            return HTTPResponse(e.code, e.read())
+
+    def get(self, path):
+        return self.request('GET', path)
+
+    def post(self, path, data=None):
+        return self.request('POST', path, data)
+
+    def delete(self, path):
+        return self.request('DELETE', path)
+
+
+class QueryCounter:
+    """Execute wrapper counting the SQL statements issued on a connection"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Recorder:
+    """Thread-safe collector for per-endpoint samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.queries = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.time_to_ready = []
+        self.outcomes = {'ready': 0, 'failed': 0, 'timeout': 0, 'error': 0}
+        self.successes = 0  # 2xx responses
+
+    def record(self, endpoint, latency_ms, queries, status_code, ok):
+        with self.lock:
+            self.latencies[endpoint].append(latency_ms)
+            if queries is not None:
+                self.queries[endpoint].append(queries)
+            if 200 <= status_code < 300:
+                self.successes += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def finish(self, outcome, ready_ms=None):
+        with self.lock:
+            self.outcomes[outcome] += 1
+            if ready_ms is not None:
+                self.time_to_ready.append(ready_ms)
+
+
+class Command(BaseCommand):
+    help = 'Load-test the upload → progress → detail → list → delete pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url',
+            default='http://localhost:8000',
+            help='Running stack to send HTTP requests to'
+        )
+        parser.add_argument(
+            '--in-process',
+            action='store_true',
+            help='Call the views in this process instead (also counts DB queries per request)'
+        )
+        parser.add_argument(
+            '--files',
+            type=int,
+            default=20,
+            help='Total number of upload pipelines to run'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Number of pipelines running at the same time'
+        )
+        parser.add_argument(
+            '--file',
+            action='append',
+            dest='sample_files',
+            help='Sample file to upload (repeatable, defaults to sample_data/)'
+        )
+        parser.add_argument(
+            '--eager',
+            action='store_true',
+            help='Run Celery tasks inline instead of sending them to workers (implies --in-process)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=0.2,
+            help='Seconds between progress polls'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=120.0,
+            help='Seconds to wait for a file to become ready'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the JSON report to this path'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            help='Previous JSON report to compare against'
+        )
+
+    def handle(self, *args, **options):
+        sample_files = options['sample_files'] or DEFAULT_FILES
+        for path in sample_files:
+            if not os.path.exists(path):
+                raise CommandError(f'Sample file not found: {path}')
+        payloads = []
+        for path in sample_files:
+            with open(path, 'rb') as f:
+                payloads.append((os.path.basename(path), f.read()))
+
+        if options['eager']:
+            celery_app.conf.task_always_eager = True
+            options['in_process'] = True
+
+        total = options['files']
+        concurrency = max(1, options['concurrency'])
+        target = 'in process' if options['in_process'] else options['base_url']
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'🚀 Running {total} pipelines at concurrency {concurrency} against {target} '
+                f'({"eager" if options["eager"] else "worker"} mode)'
+            )
+        )
+
+        recorder = Recorder()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(self.run_pipeline, payloads[i % len(payloads)], recorder, options)
+                for i in range(total)
+            ]
+            for future in futures:
+                future.result()
+        duration = time.perf_counter() - started
+
+        report = self.build_report(recorder, duration, options, sample_files)
+        self.print_report(report)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                self.print_comparison(report, json.load(f))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'📄 Report written to {options["output"]}'))
+
+        # A run where nothing succeeded measured a broken setup, not the pipeline
+        if not recorder.successes:
+            raise CommandError(f'No request to {target} returned 2xx; is the stack running and reachable?')
+
+    def call(self, client, recorder, endpoint, method, url, expected, **kwargs):
+        """Issue one request, recording latency and, in process, DB query count"""
+        if isinstance(client, HTTPClient):
+            start = time.perf_counter()
+            response = getattr(client, method)(url, **kwargs)
+            queries = None  # made by the server, out of sight
+        else:
+            counter = QueryCounter()
+            start = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                response = getattr(client, method)(url, **kwargs)
+            queries = counter.count
+        latency_ms = (time.perf_counter() - start) * 1000
+        recorder.record(endpoint, latency_ms, queries, response.status_code, response.status_code in expected)
+        return response
+
+    def run_pipeline(self, payload, recorder, options):
+        """Drive a single file through the whole API lifecycle"""
+        if options['in_process']:
+            # A host in the default ALLOWED_HOSTS, unlike the test client's 'testserver'
+            client = Client(SERVER_NAME='localhost')
+        else:
+            client = HTTPClient(options['base_url'])
+        name, content = payload
+        try:
+            upload_start = time.perf_counter()
+            response = self.call(
+                client, recorder, 'upload', 'post', reverse('files:file-upload'), (201,),
+                data={'file': SimpleUploadedFile(name, content)}
+            )
+            if response.status_code != 201:
+                recorder.finish('error')
+                return
+            file_id = response.json()['id']
+
+            outcome = 'timeout'
+            deadline = upload_start + options['timeout']
+            progress_url = reverse('files:file-progress', kwargs={'file_id': file_id})
+            while time.perf_counter() < deadline:
+                response = self.call(client, recorder, 'progress', 'get', progress_url, (200,))
+                file_status = response.json().get('status') if response.status_code == 200 else None
+                if file_status in ('ready', 'failed'):
+                    outcome = file_status
+                    break
+                time.sleep(options['poll_interval'])
+            ready_ms = (time.perf_counter() - upload_start) * 1000 if outcome == 'ready' else None
+
+            self.call(
+                client, recorder, 'detail', 'get',
+                reverse('files:file-detail', kwargs={'file_id': file_id}), (200, 202)
+            )
+            self.call(client, recorder, 'list', 'get', reverse('files:file-list'), (200,))
+            self.call(
+                client, recorder, 'delete', 'delete',
+                reverse('files:file-delete', kwargs={'file_id': file_id}), (204,)
+            )
+            recorder.finish(outcome, ready_ms)
+        except Exception as e:
+            self.stderr.write(f'Pipeline error: {str(e)}')
+            recorder.finish('error')
+        finally:
+            connections.close_all()
+
+    def build_report(self, recorder, duration, options, sample_files):
+        """Assemble the JSON-serializable report"""
+        total_requests = sum(len(samples) for samples in recorder.latencies.values())
+        return {
+            'generated_at': datetime.now(dt_timezone.utc).isoformat(),
+            'config': {
+                'files': options['files'],
+                'concurrency': options['concurrency'],
+                'eager': options['eager'],
+                'target': 'in-process' if options['in_process'] else options['base_url'],
+                'sample_files': sample_files,
+                'poll_interval': options['poll_interval'],
+            },
+            'duration_s': round(duration, 3),
+            'throughput': {
+                'pipelines_per_s': round(options['files'] / duration, 3) if duration else None,
+                'requests_per_s': round(total_requests / duration, 3) if duration else None,
+            },
+            'outcomes': recorder.outcomes,
+            'time_to_ready_ms': summarize(recorder.time_to_ready),
+            'endpoints': {
+                name: {
+                    'latency_ms': summarize(recorder.latencies[name]),
+                    'queries': summarize(recorder.queries[name]),
+                    'errors': recorder.errors[name],
+                }
+                for name in ENDPOINTS
+            },
+        }
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'⏱️  {report["duration_s"]}s, '
+            f'{report["throughput"]["pipelines_per_s"]} pipelines/s, '
+            f'{report["throughput"]["requests_per_s"]} req/s'
+        )
+        self.stdout.write(f'📊 Outcomes: {report["outcomes"]}')
+        ttr = report['time_to_ready_ms']
+        self.stdout.write(f'Time to ready (ms): p50={ttr["p50"]} p95={ttr["p95"]} p99={ttr["p99"]}')
+        self.stdout.write(f'{"endpoint":<10}{"count":>7}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"errors":>8}')
+        for name, data in report['endpoints'].items():
+            latency = data['latency_ms']
+            self.stdout.write(
+                f'{name:<10}{latency["count"]:>7}{str(latency["p50"]):>10}{str(latency["p95"]):>10}'
+                f'{str(latency["p99"]):>10}{str(data["queries"]["mean"]):>9}{data["errors"]:>8}'
+            )
+
+    def print_comparison(self, report, baseline):
+        """Print p95 latency and query deltas against a previous run"""
+        self.stdout.write('📈 Compared to baseline (p95 ms / mean queries):')
+        for name, data in report['endpoints'].items():
+            previous = baseline.get('endpoints', {}).get(name)
+            if not previous:
+                continue
+            self.stdout.write(
+                f'{name:<10}'
+                f'{self.delta(previous["latency_ms"]["p95"], data["latency_ms"]["p95"]):>22}'
+                f'{self.delta(previous["queries"]["mean"], data["queries"]["mean"]):>22}'
+            )
+
+    def delta(self, before, after):
+        if before is None or after is None:
+            return 'n/a'
+        if before == 0:
+            return f'{before} → {after}'
+        return f'{before} → {after} ({(after - before) / before * 100:+.1f}%)'
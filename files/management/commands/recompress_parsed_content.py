@@ -0,0 +1,92 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from files.models import File
+
+
+def encoded_size(light, blob):
+    """Bytes the content takes before the database's own (TOAST) compression"""
+    return (len(json.dumps(light)) if light is not None else 0) + (len(blob) if blob is not None else 0)
+
+
+class Command(BaseCommand):
+    help = ('Rewrite stored parsed_content in the format selected by PARSED_CONTENT_COMPRESSION '
+            '(compress existing rows, or decompress them with PARSED_CONTENT_COMPRESSION=none)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows read and written per transaction'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the savings without writing anything'
+        )
+
+    def stored_bytes(self):
+        """Bytes Postgres actually stores for the content columns, after TOAST compression"""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT COALESCE(SUM(pg_column_size(parsed_content)), 0)'
+                ' + COALESCE(SUM(pg_column_size(parsed_content_blob)), 0) FROM files'
+            )
+            return cursor.fetchone()[0]
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        stored_before = self.stored_bytes()
+        queryset = (
+            File.objects
+            .filter(Q(parsed_content__isnull=False) | Q(parsed_content_blob__isnull=False))
+            .only('id', 'parsed_content', 'parsed_content_blob')
+            .order_by('id')
+        )
+
+        scanned = rewritten = bytes_before = bytes_after = 0
+        last_id = None
+        while True:
+            batch_query = queryset if last_id is None else queryset.filter(id__gt=last_id)
+            with transaction.atomic():
+                batch = list(batch_query.select_for_update()[:batch_size])
+                if not batch:
+                    break
+                changed = []
+                for file_obj in batch:
+                    before = encoded_size(file_obj.parsed_content, file_obj.parsed_content_blob)
+                    fields = File.content_fields(file_obj.content)
+                    after = encoded_size(fields['parsed_content'], fields['parsed_content_blob'])
+                    bytes_before += before
+                    bytes_after += after
+                    if (fields['parsed_content'] != file_obj.parsed_content
+                            or fields['parsed_content_blob'] != file_obj.parsed_content_blob):
+                        for field, value in fields.items():
+                            setattr(file_obj, field, value)
+                        changed.append(file_obj)
+                if changed and not options['dry_run']:
+                    File.objects.bulk_update(changed, ['parsed_content', 'parsed_content_blob'])
+            scanned += len(batch)
+            rewritten += len(changed)
+            last_id = batch[-1].id
+            self.stdout.write(f'  {scanned} rows scanned, {rewritten} rewritten')
+
+        saved = bytes_before - bytes_after
+        percent = saved / bytes_before * 100 if bytes_before else 0
+        action = 'Would rewrite' if options['dry_run'] else 'Rewrote'
+        self.stdout.write(self.style.SUCCESS(f'✅ {action} {rewritten} of {scanned} rows'))
+        self.stdout.write(
+            f'📦 Encoded content: {bytes_before:,} → {bytes_after:,} bytes ({saved:,} bytes, {percent:.1f}% saved)'
+        )
+        if stored_before is not None and not options['dry_run']:
+            stored_after = self.stored_bytes()
+            self.stdout.write(
+                f'🗄️  Stored in Postgres (after TOAST): {stored_before:,} → {stored_after:,} bytes; '
+                'run VACUUM to return the freed pages'
+            )
@@ -91,9 +91,9 @@ class Command(BaseCommand):
             self.style.SUCCESS(f'📄 Final Status: {file_obj.status}')
         )
         
-        if file_obj.parsed_content:
+        if file_obj.has_content:
             self.stdout.write(
-                self.style.SUCCESS(f'📊 Parsed Content: {file_obj.parsed_content}')
+                self.style.SUCCESS(f'📊 Parsed Content: {file_obj.content}')
             )
 
         self.stdout.write(
@@ -0,0 +1,218 @@
+"""
+Memory planning for parse tasks.
+
+Before a file is parsed, plan_parse() estimates its peak memory from the file
+size, type and (for CSVs) a small sample, and picks a strategy:
+
+- ``full``: the file (or each Excel sheet) is loaded into memory at once
+- ``chunked``: the file is streamed in pieces sized to fit the budget (CSV chunks, PDF pages)
+- ``sidecar``: a large workbook, or one with a sheet over EXCEL_STREAM_SHEET_SIZE, is streamed row by row
+  into a CSV next to it, which is then read in chunks
+
+Each task reserves its estimate against the host's PARSE_MEMORY_BUDGET in Redis
+and waits (retries later) while other tasks hold the budget. RSSWatch samples
+the process's resident memory while a parse runs.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import zipfile
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+from .connections import connection_manager
+from .parsers import sample_bytes_per_row
+from .storage import open_source
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('full', 'chunked', 'sidecar')
+
+# Peak memory per byte of file when a whole file is loaded, for typical files
+FULL_LOAD_FACTORS = {'xlsx': 40, 'xls': 12, 'pdf': 4, 'txt': 4}
+# Parse buffers and intermediate copies on top of the DataFrame a CSV chunk becomes
+CSV_WORKING_FACTOR = 2
+MIN_CHUNK_SIZE = 1024 * 1024
+# Working set of openpyxl's read-only mode, which keeps one row in memory at a time
+STREAMING_WORKBOOK_BYTES = 64 * 1024 * 1024
+
+
+class ParsePlan:
+    """How a file will be parsed and the peak memory that is expected to take"""
+
+    def __init__(self, strategy: str, estimated_bytes: int, chunk_size: Optional[int] = None,
+                 parallel: bool = False):
+        self.strategy = strategy
+        self.estimated_bytes = int(estimated_bytes)
+        self.chunk_size = chunk_size
+        self.parallel = parallel
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'strategy': self.strategy,
+            'estimated_bytes': self.estimated_bytes,
+            'chunk_size': self.chunk_size,
+            'parallel': self.parallel,
+        }
+
+    def __repr__(self):
+        return f"ParsePlan({', '.join(f'{key}={value!r}' for key, value in self.as_dict().items())})"
+
+
+def csv_memory_ratio(file_path: str, sample_rows: int = 1000) -> float:
+    """DataFrame bytes per byte of CSV, measured on the first rows"""
+    import pandas as pd
+    bytes_per_row = sample_bytes_per_row(file_path)
+    if not bytes_per_row:
+        return 1.0
+    try:
+        with open_source(file_path) as file:
+            sample = pd.read_csv(file, nrows=sample_rows)
+    except Exception:
+        # Unreadable files are reported by the parser itself
+        return 1.0
+    if not len(sample):
+        return 1.0
+    memory_per_row = sample.memory_usage(deep=True, index=False).sum() / len(sample)
+    return max(1.0, memory_per_row / bytes_per_row)
+
+
+def largest_sheet_size(file_path: str) -> int:
+    """Uncompressed bytes of the largest worksheet of an xlsx file (0 if it cannot be read as one)"""
+    try:
+        with zipfile.ZipFile(file_path) as workbook:
+            return max((
+                info.file_size for info in workbook.infolist()
+                if info.filename.startswith('xl/worksheets/') and info.filename.endswith('.xml')
+            ), default=0)
+    except (OSError, zipfile.BadZipFile):
+        return 0
+
+
+def plan_parse(file_path: str, file_type: str, file_size: int, budget: Optional[int] = None) -> ParsePlan:
+    """Pick the cheapest-to-run strategy whose estimated peak memory fits ``budget``"""
+    budget = budget or settings.PARSE_MEMORY_BUDGET or float('inf')
+    if file_type == 'csv':
+        ratio = csv_memory_ratio(file_path) * CSV_WORKING_FACTOR
+        # Shrink chunks until one fits the budget; never below MIN_CHUNK_SIZE
+        chunk_size = int(min(settings.CSV_READ_CHUNK_SIZE, max(MIN_CHUNK_SIZE, budget / ratio)))
+        parallel_bytes = settings.CSV_PARALLEL_WORKERS * settings.CSV_PARALLEL_CHUNK_SIZE * ratio
+        if file_size >= settings.CSV_PARALLEL_THRESHOLD and parallel_bytes <= budget:
+            return ParsePlan('chunked', parallel_bytes, chunk_size, parallel=True)
+        strategy = 'full' if file_size <= chunk_size else 'chunked'
+        return ParsePlan(strategy, min(file_size, chunk_size) * ratio, chunk_size)
+    if file_type == 'pdf':
+        # Pages are extracted one at a time, but the reader holds the whole document
+        return ParsePlan('chunked', file_size * FULL_LOAD_FACTORS['pdf'])
+    full_bytes = file_size * FULL_LOAD_FACTORS.get(file_type, 4)
+    # A single huge sheet is streamed too: read_excel loads it in one call that cannot be cancelled
+    huge_sheet = file_type == 'xlsx' and largest_sheet_size(file_path) > settings.EXCEL_STREAM_SHEET_SIZE
+    if file_type == 'xlsx' and (full_bytes > budget or huge_sheet):
+        chunk_size = int(min(settings.CSV_READ_CHUNK_SIZE, max(MIN_CHUNK_SIZE, budget / CSV_WORKING_FACTOR)))
+        return ParsePlan('sidecar', STREAMING_WORKBOOK_BYTES + chunk_size * CSV_WORKING_FACTOR, chunk_size)
+    return ParsePlan('full', full_bytes)
+
+
+# Atomically sum the live reservations (dropping expired ones) and add this one if it fits.
+# A task is always admitted when nothing else holds memory, so oversized files still run.
+RESERVE_SCRIPT = """
+local used = 0
+local entries = redis.call('HGETALL', KEYS[1])
+for i = 1, #entries, 2 do
+    local bytes, expires = string.match(entries[i + 1], '(%d+):(%d+)')
+    if tonumber(expires) < tonumber(ARGV[4]) then
+        redis.call('HDEL', KEYS[1], entries[i])
+    elseif entries[i] ~= ARGV[1] then
+        used = used + tonumber(bytes)
+    end
+end
+if used > 0 and used + tonumber(ARGV[2]) > tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2] .. ':' .. ARGV[5])
+return 1
+"""
+
+
+class MemoryReservation:
+    """A task's share of its worker host's PARSE_MEMORY_BUDGET, held in a Redis hash
+
+    Entries expire after ``ttl`` seconds, so a task killed without releasing
+    its reservation only holds the budget for a bounded time.
+    """
+
+    def __init__(self, task_key: str, nbytes: int, ttl: float, host: Optional[str] = None):
+        self.task_key = task_key
+        self.nbytes = int(nbytes)
+        self.ttl = ttl
+        self.key = f"parse-memory:{host or socket.gethostname()}"
+        self.held = False
+
+    def acquire(self) -> bool:
+        """Reserve the memory; False if the host's budget is taken by other tasks"""
+        budget = settings.PARSE_MEMORY_BUDGET
+        if not budget:
+            return True
+        now = int(time.time())
+        try:
+            self.held = bool(connection_manager.redis().eval(
+                RESERVE_SCRIPT, 1, self.key, self.task_key, self.nbytes, budget, now, now + int(self.ttl)
+            ))
+        except Exception as e:
+            # Without Redis, admit the task rather than stall every upload
+            logger.warning("Could not reserve parse memory for %s: %s", self.task_key, e)
+            return True
+        return self.held
+
+    def release(self):
+        if self.held:
+            self.held = False
+            try:
+                connection_manager.redis().hdel(self.key, self.task_key)
+            except Exception as e:
+                # The entry expires after ttl anyway
+                logger.warning("Could not release parse memory for %s: %s", self.task_key, e)
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # No procfs (e.g. macOS): fall back to the peak, which ru_maxrss reports in bytes there
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RSSWatch:
+    """Samples resident memory in a background thread while the block runs, keeping the peak"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.start_rss = self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        self.peak = max(self.peak, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.start_rss = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, name='rss-watch', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+        return False
@@ -0,0 +1,170 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from contextlib import contextmanager
+
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess
+)
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (bytes) and labels used to bucket files by size
+SIZE_BUCKETS = [
+    (1024 * 1024, 'lt_1mb'),
+    (10 * 1024 * 1024, '1_10mb'),
+    (100 * 1024 * 1024, '10_100mb'),
+]
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+VIEW_LATENCY = Histogram(
+    'file_parser_view_duration_seconds',
+    'Time spent handling requests to the files API',
+    ['view', 'method', 'status'],
+    buckets=LATENCY_BUCKETS,
+)
+VIEW_REQUESTS = Counter(
+    'file_parser_view_requests_total',
+    'Requests handled by the files API',
+    ['view', 'method', 'status'],
+)
+STAGE_LATENCY = Histogram(
+    'file_parser_stage_duration_seconds',
+    'Time spent in each stage of the upload and processing pipeline',
+    ['stage', 'file_type', 'size_bucket'],
+    buckets=LATENCY_BUCKETS,
+)
+PARSER_LATENCY = Histogram(
+    'file_parser_parser_duration_seconds',
+    'Time spent inside each parser, split by parser stage',
+    ['parser', 'stage', 'size_bucket'],
+    buckets=LATENCY_BUCKETS,
+)
+CONTENT_BYTES = Histogram(
+    'file_parser_parsed_content_bytes',
+    'Size of the JSON-encoded parsed content',
+    ['file_type'],
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+)
+TASK_OUTCOMES = Counter(
+    'file_parser_tasks_total',
+    'Processing tasks by outcome',
+    ['file_type', 'size_bucket', 'outcome'],
+)
+UPLOAD_REJECTIONS = Counter(
+    'file_parser_upload_rejections_total',
+    'Uploads refused by admission control',
+    ['reason'],
+)
+TASK_PEAK_RSS = Histogram(
+    'file_parser_task_peak_rss_bytes',
+    'Peak resident memory of the worker process while parsing a file',
+    ['file_type', 'strategy'],
+    buckets=(64e6, 128e6, 256e6, 512e6, 1e9, 2e9, 4e9, 8e9),
+)
+
+
+def size_bucket(file_size):
+    """Map a file size in bytes to a coarse bucket label"""
+    for limit, label in SIZE_BUCKETS:
+        if (file_size or 0) < limit:
+            return label
+    return 'gte_100mb'
+
+
+def observe_stage(stage, file_type, file_size, seconds):
+    """Record the duration of one pipeline stage"""
+    STAGE_LATENCY.labels(stage, file_type or 'unknown', size_bucket(file_size)).observe(seconds)
+
+
+@contextmanager
+def time_stage(stage, file_type, file_size):
+    """Time the enclosed block as a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, file_type, file_size, time.perf_counter() - start)
+
+
+def observe_view(view, method, status_code, seconds):
+    """Record latency and count for one API request"""
+    VIEW_LATENCY.labels(view, method, str(status_code)).observe(seconds)
+    VIEW_REQUESTS.labels(view, method, str(status_code)).inc()
+
+
+def render_metrics():
+    """Render all metrics, aggregating worker processes in multiprocess mode"""
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+class SamplingProfiler:
+    """Sample the stack of one thread and dump it if the run turns out slow"""
+
+    def __init__(self, name, interval=None, threshold=None, output_dir=None):
+        self.name = name
+        self.interval = interval or settings.TASK_PROFILE_INTERVAL
+        self.threshold = threshold if threshold is not None else settings.TASK_PROFILE_THRESHOLD
+        self.output_dir = output_dir or settings.TASK_PROFILE_DIR
+        self.stacks = StackCounter()
+        self.started = None
+        self.report_path = None
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._sampler.join()
+        elapsed = time.perf_counter() - self.started
+        if elapsed >= self.threshold and self.stacks:
+            self.report_path = self.dump(elapsed)
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, elapsed):
+        """Write samples in collapsed-stack format (flamegraph.pl / speedscope)"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f'{self.name}_{int(time.time())}.folded')
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+        logger.warning('Slow task %s took %.1fs, profile written to %s', self.name, elapsed, path)
+        return path
+
+
+@contextmanager
+def profile_if_enabled(name):
+    """Run the block under SamplingProfiler when TASK_PROFILING_ENABLED is set"""
+    if not settings.TASK_PROFILING_ENABLED:
+        yield None
+        return
+    with SamplingProfiler(name) as profiler:
+        yield profiler
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='parsed_content_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
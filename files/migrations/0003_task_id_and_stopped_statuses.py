@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_parsed_content_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='task_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='file',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('timed_out', 'Timed out')], default='uploading', max_length=20),
+        ),
+    ]
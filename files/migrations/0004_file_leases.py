@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_task_id_and_stopped_statuses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='file',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_file_leases'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='client_id',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['status', 'client_id'], name='files_status_client_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['status', 'updated_at'], name='files_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_upload_admission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='storage_node',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+    ]
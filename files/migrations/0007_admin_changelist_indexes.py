@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:43
+
+import logging
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+# Every index is built CONCURRENTLY, outside a transaction (atomic = False below), so uploads and
+# status writes to a large files table are not blocked while it is built.
+# Expressions match the SQL of Django's case-insensitive lookups on PostgreSQL,
+# UPPER("files"."original_filename"::text) LIKE UPPER(...), so the admin search can use them
+PREFIX_INDEX = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS files_name_prefix_idx '
+    'ON files (UPPER(original_filename::text) text_pattern_ops)'
+)
+TRIGRAM_INDEX = (
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS files_name_trgm_idx '
+    'ON files USING gin (UPPER(original_filename::text) gin_trgm_ops)'
+)
+
+
+def create_search_indexes(apps, schema_editor):
+    """Prefix (istartswith) index, plus a trigram (icontains) index where pg_trgm can be installed"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(PREFIX_INDEX)
+    try:
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(TRIGRAM_INDEX)
+    except Exception as e:
+        # A failed concurrent build leaves an invalid index behind, which IF NOT EXISTS would keep on a rerun
+        schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS files_name_trgm_idx')
+        # Without the extension the admin keeps to prefix search (ADMIN_TRIGRAM_SEARCH=False, the default)
+        logger.warning('Skipping the trigram search index on files.original_filename: %s', e)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS files_name_trgm_idx')
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS files_name_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('files', '0006_storage_node'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='file',
+            index=models.Index(fields=['-created_at'], name='files_created_idx'),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
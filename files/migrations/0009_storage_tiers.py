@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-19 05:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_bulk_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='storage_tier',
+            field=models.CharField(choices=[('hot', 'Hot'), ('compressed', 'Compressed'), ('cold', 'Cold')], default='hot', editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(fields=['storage_tier', 'updated_at'], name='files_tier_updated_idx'),
+        ),
+    ]
@@ -1,8 +1,47 @@
 import os
 import uuid
-from django.db import models
+from datetime import timedelta
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.core.validators import FileExtensionValidator
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from .compression import pack_content, unpack_content
+from .layouts import apply_layout
+from .storage import TIERS, remove_rehydrated, remove_stored, remove_tier, write_tier
+
+
+class DeletionJob(models.Model):
+    """Files deleted in bulk whose storage is being reclaimed in the background"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    total = models.PositiveIntegerField(default=0)  # files marked deleted
+    reclaimed = models.PositiveIntegerField(default=0)  # files whose storage and row are gone
+    reclaimed_bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'deletion_jobs'
+    
+    @property
+    def progress(self):
+        return 100 if not self.total else min(100, int(self.reclaimed * 100 / self.total))
+
+
+class LiveFileManager(models.Manager):
+    """Files that have not been deleted; deleted files wait for their storage to be reclaimed"""
+    
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class File(models.Model):
@@ -13,8 +52,27 @@ class File(models.Model):
         ('processing', 'Processing'),
         ('ready', 'Ready'),
         ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+        ('timed_out', 'Timed out'),
     ]
     
+    # Statuses each status may be entered from
+    TRANSITIONS = {
+        # Requeued after its worker was lost, or reprocessed from the admin
+        'uploading': ('processing', 'ready', 'failed', 'cancelled', 'timed_out'),
+        'processing': ('uploading', 'failed'),
+        'ready': ('processing',),
+        'failed': ('uploading', 'processing'),
+        'cancelled': ('uploading', 'processing'),
+        'timed_out': ('processing',),
+    }
+    
+    # Stopped before finishing; whatever was parsed by then is kept as a partial result
+    STOPPED_STATUSES = ('cancelled', 'timed_out')
+    
+    # Set on the instance that won mark_as_processing(); its writes are then fenced by claim_filter()
+    claimed = False
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     filename = models.CharField(max_length=255)
     original_filename = models.CharField(max_length=255)
@@ -27,49 +85,269 @@ class File(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
     progress = models.IntegerField(default=0)
     parsed_content = models.JSONField(null=True, blank=True)
+    # Bulky parts of parsed_content, zstd-compressed; read them through File.content
+    parsed_content_blob = models.BinaryField(null=True, blank=True, editable=False)
     error_message = models.TextField(blank=True, null=True)
+    # Celery id of the processing task, used to revoke it on cancel
+    task_id = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    # While processing, the worker renews this lease; once it lapses the worker is presumed dead
+    lease_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    attempts = models.PositiveIntegerField(default=0, editable=False)  # processing claims so far
+    # Who uploaded the file (X-Client-ID header or remote address), for per-client upload limits
+    client_id = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    # Where to POST a signed webhook once the file is ready or failed (see files.webhooks)
+    callback_url = models.URLField(max_length=2048, blank=True, default='')
+    # NODE_NAME of the node whose MEDIA_ROOT holds the upload; its workers parse the file
+    storage_node = models.CharField(max_length=255, null=True, blank=True, editable=False)
+    # Where the raw upload is kept: as uploaded, compressed next to it, or compressed in COLD_STORAGE_DIR
+    storage_tier = models.CharField(
+        max_length=20, choices=[(tier, tier.capitalize()) for tier in TIERS], default='hot', editable=False
+    )
+    # Set when the file is deleted in bulk; the row is removed once its job has reclaimed the storage
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    deletion_job = models.ForeignKey(
+        DeletionJob, null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='files'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = LiveFileManager()
+    all_objects = models.Manager()  # including deleted files
+    
     class Meta:
         ordering = ['-created_at']
         db_table = 'files'
+        indexes = [
+            # Upload admission control: backlog per status/client and recent drain rate
+            models.Index(fields=['status', 'client_id'], name='files_status_client_idx'),
+            models.Index(fields=['status', 'updated_at'], name='files_status_updated_idx'),
+            # Admin changelist: newest first, one page at a time
+            models.Index(fields=['-created_at'], name='files_created_idx'),
+            # Storage lifecycle: aged files still in a given tier
+            models.Index(fields=['storage_tier', 'updated_at'], name='files_tier_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.original_filename} ({self.id})"
     
+    @staticmethod
+    def content_fields(content):
+        """Column values that store content, for use with save() or QuerySet.update()"""
+        light, blob = pack_content(content)
+        return {'parsed_content': light, 'parsed_content_blob': blob}
+    
+    @property
+    def has_content(self):
+        return self.parsed_content is not None or self.parsed_content_blob is not None
+    
+    @property
+    def content(self):
+        """Full parsed content, decompressed on first access"""
+        blob = self.parsed_content_blob
+        if blob is None:
+            return self.parsed_content
+        cached = self.__dict__.get('_decoded_content')
+        if cached is None or cached[0] is not blob:
+            cached = (blob, unpack_content(self.parsed_content, blob))
+            self.__dict__['_decoded_content'] = cached
+        return cached[1]
+    
+    def content_as(self, layout='records'):
+        """Parsed content with its tabular previews in one of files.layouts.LAYOUTS"""
+        if layout == 'records' or self.parsed_content_blob is None:
+            return apply_layout(self.content, layout)
+        return apply_layout(unpack_content(self.parsed_content, self.parsed_content_blob, layout), layout)
+    
+    @content.setter
+    def content(self, value):
+        for field, field_value in self.content_fields(value).items():
+            setattr(self, field, field_value)
+    
     def get_file_extension(self):
         """Get file extension from filename"""
         return os.path.splitext(self.original_filename)[1].lower()
     
+    @classmethod
+    def transition_id(cls, file_id, status, claim=None, **fields):
+        """Move a file to ``status`` with one conditional UPDATE
+        
+        Returns False, changing nothing, if the file's current status may not move
+        to ``status`` (e.g. a stale worker trying to reprocess a ready file), or if
+        it no longer matches ``claim`` (see claim_filter()).
+        """
+        query = cls.objects.filter(id=file_id, status__in=cls.TRANSITIONS[status], **(claim or {}))
+        fields.update(status=status, updated_at=timezone.now())
+        if status not in WebhookDelivery.EVENTS:
+            return query.update(**fields) == 1
+        # Finished: queue the file's webhook, if it has one, with the status change or not at all
+        with transaction.atomic():
+            won = query.update(**fields) == 1
+            if won:
+                WebhookDelivery.record([file_id], status)
+        return won
+    
+    def transition(self, status, **fields):
+        """transition_id() for this instance, updating it in memory when the transition wins"""
+        won = self.transition_id(self.id, status, claim=self.claim_filter(), **fields)
+        if won:
+            self.status = status
+            for field, value in fields.items():
+                setattr(self, field, value)
+        return won
+    
     def update_progress(self, progress):
-        """Update upload/processing progress"""
-        self.progress = progress
+        """Raise upload/processing progress; never lowers it. 100 marks the file ready"""
         if progress >= 100:
-            self.status = 'ready'
-        self.save(update_fields=['progress', 'status'])
+            return self.mark_as_ready()
+        won = File.objects.filter(
+            id=self.id, status__in=('uploading', 'processing'), progress__lt=progress
+        ).update(progress=progress, updated_at=timezone.now()) == 1
+        if won:
+            self.progress = progress
+        return won
+    
+    def mark_as_processing(self, task_id=None, lease_seconds=None):
+        """Claim the file for processing, taking out a lease on it
+        
+        Besides the TRANSITIONS sources, a file still 'processing' under an
+        expired lease (its worker died) can be claimed, e.g. by a redelivered task.
+        """
+        now = timezone.now()
+        fields = dict(
+            status='processing', progress=0, updated_at=now, attempts=F('attempts') + 1,
+            lease_expires_at=now + timedelta(seconds=lease_seconds or settings.FILE_LEASE_SECONDS),
+            **self.content_fields(None)
+        )
+        if task_id:
+            fields['task_id'] = task_id
+        won = File.objects.filter(id=self.id).filter(
+            Q(status__in=self.TRANSITIONS['processing']) | Q(status='processing', lease_expires_at__lt=now)
+        ).update(**fields) == 1
+        if won:
+            self.parsed_content = self.parsed_content_blob = None
+            self.refresh_from_db(fields=['status', 'progress', 'attempts', 'lease_expires_at', 'task_id'])
+            self.claimed = True
+        return won
+    
+    def claim_filter(self):
+        """Filter arguments matching the file only while the claim this instance took is current
+        
+        Each claim stores its task id and bumps attempts, so once another task (or a
+        redelivery of the same one) reclaims the file, the superseded worker's lease,
+        progress and status writes update nothing. Empty if this instance has not
+        claimed the file.
+        """
+        if not self.claimed:
+            return {}
+        return {'task_id': self.task_id, 'attempts': self.attempts}
     
-    def mark_as_processing(self):
-        """Mark file as processing"""
-        self.status = 'processing'
-        self.progress = 0
-        self.save(update_fields=['status', 'progress'])
+    def renew_lease(self, lease_seconds=None):
+        """Extend the processing lease (the worker's heartbeat); False once the file was reclaimed"""
+        return File.objects.filter(id=self.id, status='processing', **self.claim_filter()).update(
+            lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds or settings.FILE_LEASE_SECONDS)
+        ) == 1
     
     def mark_as_failed(self, error_message=""):
-        """Mark file as failed with error message"""
-        self.status = 'failed'
-        self.error_message = error_message
-        self.save(update_fields=['status', 'error_message'])
+        """Mark file as failed with error message, dropping any partial result"""
+        return self.transition('failed', error_message=error_message, **self.content_fields(None))
     
     def mark_as_ready(self, parsed_content=None):
         """Mark file as ready with parsed content"""
-        self.status = 'ready'
-        self.progress = 100
-        if parsed_content:
-            self.parsed_content = parsed_content
-        self.save(update_fields=['status', 'progress', 'parsed_content'])
+        fields = self.content_fields(parsed_content) if parsed_content else {}
+        return self.transition('ready', progress=100, **fields)
+    
+    def mark_as_cancelled(self):
+        """Mark an uploading or processing file as cancelled, keeping any partial result"""
+        return self.transition('cancelled', error_message='Cancelled by request')
+    
+    def mark_as_timed_out(self, error_message, partial_content=None):
+        """Mark file as timed out, storing the partial result it got to (if given)"""
+        fields = self.content_fields(partial_content) if partial_content else {}
+        return self.transition('timed_out', error_message=error_message, **fields)
+    
+    def move_to_hot_tier(self):
+        """Decompress a compressed or cold upload back to its original path, e.g. before writing to it
+        
+        Call with the row locked; the compressed copy is removed once the transaction commits.
+        """
+        previous = self.storage_tier
+        if previous == 'hot':
+            return
+        write_tier(self, 'hot')
+        File.objects.filter(id=self.id).update(storage_tier='hot')
+        self.storage_tier = 'hot'
+        transaction.on_commit(lambda: (remove_tier(self, previous), remove_rehydrated(self.id)))
     
     def delete_file_from_storage(self):
-        """Delete the actual file from storage"""
-        if self.file_path and os.path.exists(self.file_path.path):
-            os.remove(self.file_path.path)
+        """Delete the actual file from every storage tier, with its line index and rehydrated copy"""
+        if self.file_path:
+            remove_stored(self)
+
+
+class WebhookDelivery(models.Model):
+    """A webhook event waiting to be sent to a file's callback_url, or already sent (an outbox row)"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('delivered', 'Delivered'),
+        ('failed', 'Failed'),
+    ]
+    
+    # File statuses that send a webhook
+    EVENTS = ('ready', 'failed')
+    # File fields sent in the event
+    PAYLOAD_FIELDS = (
+        'id', 'original_filename', 'file_type', 'file_size', 'status', 'progress', 'error_message', 'updated_at'
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)  # the event id receivers dedupe on
+    file_id = models.UUIDField()  # not a foreign key: the event outlives a deleted file
+    url = models.URLField(max_length=2048)
+    event = models.CharField(max_length=50)
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    # When the next attempt is due; while a worker is sending, when its claim lapses
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'webhook_deliveries'
+        indexes = [
+            models.Index(fields=['next_attempt_at'], condition=Q(status='pending'), name='webhooks_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event} for {self.file_id} to {self.url}"
+    
+    @classmethod
+    def record(cls, file_ids, status):
+        """Queue the ``status`` event of those files that have a callback_url
+        
+        Call in the transaction that changes their status; delivery starts once it commits.
+        """
+        files = File.all_objects.filter(id__in=file_ids).exclude(callback_url='').only(
+            'callback_url', *cls.PAYLOAD_FIELDS
+        )
+        deliveries = [
+            cls(
+                file_id=file_obj.id, url=file_obj.callback_url, event=f'file.{status}',
+                payload={field: getattr(file_obj, field) for field in cls.PAYLOAD_FIELDS},
+            )
+            for file_obj in files
+        ]
+        if deliveries:
+            cls.objects.bulk_create(deliveries)
+            transaction.on_commit(schedule_webhook_delivery)
+        return deliveries
+    
+    def as_event(self):
+        return {'id': self.id, 'type': self.event, 'created_at': self.created_at, 'data': self.payload}
+
+
+def schedule_webhook_delivery():
+    """Send pending webhooks after WEBHOOK_BATCH_DELAY, so files finishing together share a request"""
+    from .tasks import deliver_webhooks
+    deliver_webhooks.apply_async(countdown=settings.WEBHOOK_BATCH_DELAY)
@@ -0,0 +1,166 @@
+"""
+Node affinity for uploads.
+
+An upload is written to the MEDIA_ROOT of the web node that received it, and
+File.storage_node records which node that is. Its parse task is routed to that
+node's queue, ``<NODE_QUEUE_PREFIX><NODE_NAME>``, which the node's workers
+consume next to the shared queue, so normally the file is opened from local disk.
+
+When a task runs on another node anyway (affinity turned off, or a file
+requeued after its node's worker was lost), LocalFile streams the upload from
+the storage node's internal raw endpoint into NODE_TRANSFER_DIR for the length
+of the parse, so no shared mount is needed. Diffs read remote files the same way.
+
+Requests that read a page of the stored file or write to it (rows, lines,
+append) can arrive at any web node; forward_to_storage_node() replays them on
+the node that has the file and relays its response.
+"""
+
+import hmac
+import os
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+from typing import Optional
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+
+from .storage import source_path, stored_path
+
+TOKEN_HEADER = 'X-Node-Token'
+FORWARDED_HEADER = 'X-Node-Forwarded'
+
+
+class NodeTransferError(Exception):
+    """The upload could not be fetched from its storage node"""
+
+
+class NodeUnavailable(NodeTransferError):
+    """The storage node could not be reached or failed to answer; worth retrying"""
+
+
+def node_queue(node: str) -> str:
+    return f"{settings.NODE_QUEUE_PREFIX}{node}"
+
+
+def parse_queue(storage_node: Optional[str]) -> Optional[str]:
+    """Queue for a file's parse task: its storage node's, or None for the default queue"""
+    if settings.FILE_NODE_AFFINITY and storage_node:
+        return node_queue(storage_node)
+    return None
+
+
+def stored_here(file_obj) -> bool:
+    """Whether the upload is on this node's disk (always assumed for files without a storage node)"""
+    node = file_obj.storage_node
+    return not node or node == settings.NODE_NAME or os.path.exists(stored_path(file_obj))
+
+
+def forward_to_storage_node(request, file_obj) -> Optional[HttpResponse]:
+    """The storage node's response to ``request`` when the file is on another node, or None when it is here
+
+    Call before the request body is parsed. A request is forwarded at most once: a node
+    asked for a file it does not have answers 404 rather than passing it on.
+    """
+    if stored_here(file_obj):
+        return None
+    if request.headers.get(FORWARDED_HEADER):
+        return JsonResponse({'error': f'File is not stored on node {settings.NODE_NAME}'}, status=404)
+    node = file_obj.storage_node
+    url = settings.NODE_TRANSFER_URL.format(node=node).rstrip('/') + request.get_full_path()
+    headers = {FORWARDED_HEADER: settings.NODE_NAME}
+    for header in ('Content-Type', 'Accept'):
+        if request.headers.get(header):
+            headers[header] = request.headers[header]
+    forwarded = urllib.request.Request(url, data=request.body or None, method=request.method, headers=headers)
+    try:
+        with urllib.request.urlopen(forwarded, timeout=settings.NODE_TRANSFER_TIMEOUT) as response:
+            return HttpResponse(response.read(), status=response.status,
+                                content_type=response.headers.get('Content-Type'))
+    except urllib.error.HTTPError as e:
+        return HttpResponse(e.read(), status=e.code, content_type=e.headers.get('Content-Type'))
+    except (urllib.error.URLError, OSError) as e:
+        return JsonResponse(
+            {'error': f'Storage node {node} could not be reached: {getattr(e, "reason", e)}'}, status=503
+        )
+
+
+def valid_transfer_token(token: Optional[str]) -> bool:
+    """Whether ``token`` is NODE_TRANSFER_TOKEN; always False while no token is configured"""
+    expected = settings.NODE_TRANSFER_TOKEN
+    return bool(expected) and token is not None and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def raw_file_url(file_id, node: str) -> str:
+    base = settings.NODE_TRANSFER_URL.format(node=node).rstrip('/')
+    return base + reverse('files:file-raw', kwargs={'file_id': file_id})
+
+
+def fetch(url: str, destination: str, expected_size: int):
+    """Stream ``url`` from another node into ``destination``, chunk by chunk"""
+    request = urllib.request.Request(url, headers={TOKEN_HEADER: settings.NODE_TRANSFER_TOKEN})
+    received = 0
+    try:
+        with urllib.request.urlopen(request, timeout=settings.NODE_TRANSFER_TIMEOUT) as response, \
+                open(destination, 'wb') as out:
+            while True:
+                chunk = response.read(settings.NODE_TRANSFER_CHUNK_SIZE)
+                if not chunk:
+                    break
+                out.write(chunk)
+                received += len(chunk)
+    except urllib.error.HTTPError as e:
+        # 4xx (bad token, file gone) will not fix itself; 5xx might
+        error = NodeUnavailable if e.code >= 500 else NodeTransferError
+        raise error(f"Fetching {url} failed: HTTP {e.code}") from e
+    except (urllib.error.URLError, OSError) as e:
+        raise NodeUnavailable(f"Fetching {url} failed: {e}") from e
+    if received != expected_size:
+        raise NodeUnavailable(f"Fetched {received:,} of {expected_size:,} bytes from {url}")
+
+
+class LocalFile:
+    """An upload as a path on this node's disk, copied from its storage node when it is elsewhere
+
+    ``streamed`` is for parsers that read compressed storage as a stream (see
+    files.storage.source_path); the raw endpoint serves the original bytes
+    whatever the storage tier, so a copy from another node is uncompressed.
+    """
+
+    def __init__(self, file_obj, streamed: bool = False):
+        self.file_obj = file_obj
+        self.streamed = streamed
+        self.copy_dir = None
+
+    def acquire(self) -> str:
+        if stored_here(self.file_obj):
+            # Compressed and cold files are streamed, or come back through the rehydration cache
+            return source_path(self.file_obj, self.streamed)
+        path = self.file_obj.file_path.path
+        node = self.file_obj.storage_node
+        os.makedirs(settings.NODE_TRANSFER_DIR, exist_ok=True)
+        # A directory per acquisition, so a redelivered task never shares a copy with another
+        self.copy_dir = tempfile.mkdtemp(prefix=f"{self.file_obj.id}-", dir=settings.NODE_TRANSFER_DIR)
+        copy_path = os.path.join(self.copy_dir, os.path.basename(path))
+        try:
+            fetch(raw_file_url(self.file_obj.id, node), copy_path, self.file_obj.file_size)
+        except Exception:
+            self.release()
+            raise
+        return copy_path
+
+    def release(self):
+        """Remove the copy, and anything written next to it while parsing (line index, sidecars)"""
+        if self.copy_dir is not None:
+            shutil.rmtree(self.copy_dir, ignore_errors=True)
+            self.copy_dir = None
+
+    def __enter__(self) -> str:
+        return self.acquire()
+
+    def __exit__(self, *exc_info):
+        self.release()
+        return False
@@ -1,150 +1,666 @@
-import pandas as pd
-import PyPDF2
+import importlib
 import io
+import itertools
+import os
 import json
-from typing import Dict, Any, List
+import logging
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Dict, Any, Iterator, List, Optional, Tuple, Type
 from django.conf import settings
+from .metrics import PARSER_LATENCY, size_bucket
+from .storage import is_seekable_zstd, open_source, source_size
+
+if TYPE_CHECKING:
+    import pandas
+    from .memory import ParsePlan
+
+logger = logging.getLogger(__name__)
+
+
+class ParserRegistry:
+    """Extension- and MIME-keyed registry of parser plugins
+    
+    Plugins list the modules they need in ``requires``. Those are imported only
+    when a plugin first parses something, so processes that never parse (web
+    workers) never pay for importing pandas or PyPDF2.
+    """
+    
+    def __init__(self):
+        self._by_extension: Dict[str, Type['FileParser']] = {}
+        self._by_mime_type: Dict[str, Type['FileParser']] = {}
+        self._plugins_loaded = False
+    
+    def register(self, parser_class: Type['FileParser']) -> Type['FileParser']:
+        """Register a parser class under its extensions and MIME types"""
+        for extension in parser_class.extensions:
+            self._by_extension[extension.lower()] = parser_class
+        for mime_type in parser_class.mime_types:
+            self._by_mime_type[mime_type.lower()] = parser_class
+        return parser_class
+    
+    def _load_plugins(self):
+        """Import the extra plugin modules listed in settings.PARSER_PLUGINS once"""
+        if self._plugins_loaded:
+            return
+        self._plugins_loaded = True
+        for module_path in getattr(settings, 'PARSER_PLUGINS', []):
+            importlib.import_module(module_path)
+    
+    def get(self, file_type: str = None, mime_type: str = None) -> Optional[Type['FileParser']]:
+        """Look a parser class up by extension, falling back to MIME type"""
+        self._load_plugins()
+        parser_class = self._by_extension.get((file_type or '').lower().lstrip('.'))
+        if parser_class is None and mime_type:
+            parser_class = self._by_mime_type.get(mime_type.split(';')[0].strip().lower())
+        return parser_class
+    
+    def extensions(self) -> List[str]:
+        """All registered extensions, in registration order"""
+        self._load_plugins()
+        return list(self._by_extension)
+    
+    def reads_compressed(self, file_type: str) -> bool:
+        """Whether the parser for ``file_type`` reads compressed storage as a stream (see files.storage.source_path)"""
+        parser_class = self.get(file_type)
+        return parser_class is not None and parser_class.reads_compressed
+    
+    def preload(self):
+        """Import every plugin's dependencies, e.g. in a worker parent before it forks"""
+        self._load_plugins()
+        for parser_class in set(self._by_extension.values()) | set(self._by_mime_type.values()):
+            for module_name in parser_class.requires:
+                importlib.import_module(module_name)
+
+
+registry = ParserRegistry()
+
+
+class ParseAborted(Exception):
+    """Parsing stopped at a checkpoint; ``snapshot`` holds the latest partial result, if any"""
+    
+    def __init__(self, message: str, snapshot: Optional[Dict[str, Any]] = None):
+        super().__init__(message)
+        self.snapshot = snapshot
+
+
+class ParseCancelled(ParseAborted):
+    """The file was cancelled while it was being parsed"""
+
+
+class ParseTimedOut(ParseAborted):
+    """Parsing ran past its time budget"""
+
+
+class ParseMemoryExceeded(ParseAborted):
+    """The process's resident memory went over the per-task limit"""
+
+
+class CancellationToken:
+    """Checked by parsers between chunks/pages to stop cooperatively
+    
+    ``budget`` is the number of seconds parsing may take (None for no limit).
+    ``is_cancelled`` is polled at most once per ``check_interval`` seconds, so it
+    can be a database query. ``max_rss`` (bytes) stops a parse whose process
+    has grown past it.
+    """
+    
+    def __init__(self, budget: Optional[float] = None, is_cancelled: Optional[Callable[[], bool]] = None,
+                 check_interval: float = 1.0, max_rss: Optional[int] = None):
+        self.budget = budget
+        self.deadline = time.monotonic() + budget if budget is not None else None
+        self.is_cancelled = is_cancelled
+        self.check_interval = check_interval
+        self.max_rss = max_rss
+        self._next_poll = 0.0
+    
+    def check(self, snapshot: Optional[Dict[str, Any]] = None):
+        """Raise ParseTimedOut or ParseCancelled, carrying ``snapshot``, if parsing should stop"""
+        now = time.monotonic()
+        if self.deadline is not None and now >= self.deadline:
+            raise ParseTimedOut(f"Parsing exceeded its time budget of {self.budget:g}s", snapshot)
+        if self.max_rss:
+            from .memory import current_rss
+            rss = current_rss()
+            if rss > self.max_rss:
+                raise ParseMemoryExceeded(
+                    f"Parsing stopped: worker memory ({rss:,} bytes) exceeded the limit of {self.max_rss:,} bytes",
+                    snapshot
+                )
+        if self.is_cancelled is not None and now >= self._next_poll:
+            self._next_poll = now + self.check_interval
+            if self.is_cancelled():
+                raise ParseCancelled("Parsing was cancelled", snapshot)
 
 
 class FileParser:
     """Base class for file parsing"""
     
-    def __init__(self, file_path: str):
+    extensions: tuple = ()
+    mime_types: tuple = ()
+    requires: tuple = ()
+    reads_compressed = False  # opens file_path with files.storage.open_source, so it may be seekable zstd
+    
+    def __init__(self, file_path: str, on_progress: Optional[Callable[[float, Optional[Dict[str, Any]]], None]] = None,
+                 token: Optional[CancellationToken] = None, plan: Optional['ParsePlan'] = None):
         self.file_path = file_path
+        self.on_progress = on_progress
+        self.token = token
+        self.plan = plan  # files.memory.ParsePlan; without one, settings-based defaults apply
+        self.last_snapshot: Optional[Dict[str, Any]] = None
+    
+    def require(self, module_name: str):
+        """Import one of this parser's dependencies on first use"""
+        return importlib.import_module(module_name)
     
     def parse(self) -> Dict[str, Any]:
         """Parse file and return structured data"""
         raise NotImplementedError("Subclasses must implement parse method")
+    
+    def read_rows(self, offset: int, limit: int, sheet: Optional[str] = None) -> 'pandas.DataFrame':
+        """Read a page of rows straight from the file (tabular parsers only)"""
+        raise ValueError(f"{type(self).__name__} does not produce rows")
+    
+    def iter_text_chunks(self, chunk_rows: int, sheet: Optional[str] = None) -> Iterator['pandas.DataFrame']:
+        """Every row of the file in order, ``chunk_rows`` at a time, as text ('' for empty cells; tabular parsers only)
+        
+        Cells are not type-inferred, so equal cells compare equal whichever chunk or file they are in.
+        """
+        raise ValueError(f"{type(self).__name__} does not produce rows")
+    
+    def report(self, fraction: float, snapshot: Optional[Dict[str, Any]] = None):
+        """Pass progress (0-1) and optionally a partial result, shaped like parse()'s, to the caller
+        
+        Parsers report between chunks/pages, so this is also where they stop when cancelled or out of time.
+        """
+        if snapshot is not None:
+            self.last_snapshot = snapshot
+        if self.on_progress is not None:
+            self.on_progress(min(1.0, fraction), snapshot)
+        self.checkpoint()
+    
+    def checkpoint(self):
+        """Raise ParseAborted, with the latest partial result, if the token says to stop"""
+        if self.token is not None:
+            self.token.check(self.last_snapshot)
+    
+    @contextmanager
+    def timed(self, stage: str):
+        """Record how long a stage of this parser takes"""
+        file_size = source_size(self.file_path) if os.path.exists(self.file_path) else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            PARSER_LATENCY.labels(type(self).__name__, stage, size_bucket(file_size)).observe(
+                time.perf_counter() - start
+            )
+
+
+def preview_records(df: 'pandas.DataFrame', limit: int) -> List[Dict[str, Any]]:
+    """First rows of a DataFrame as JSON-safe records (NaN -> None, dates -> ISO strings)"""
+    return json.loads(df.head(limit).to_json(orient='records', date_format='iso'))
+
+
+def column_stats(df: 'pandas.DataFrame') -> Dict[str, Dict[str, Any]]:
+    """Per-column statistics that can be merged across chunks and appends"""
+    counts = df.count()
+    numeric = df.select_dtypes('number')
+    minimums, maximums, sums = numeric.min(), numeric.max(), numeric.sum()
+    stats = {}
+    for column in df.columns:
+        count = int(counts[column])
+        entry = {'count': count, 'nulls': len(df) - count}
+        if column in numeric.columns and count:
+            entry['min'] = minimums[column].item()
+            entry['max'] = maximums[column].item()
+            entry['sum'] = sums[column].item()
+            entry['mean'] = entry['sum'] / count
+        stats[str(column)] = entry
+    return stats
+
 
+def merge_column_stats(left: Dict[str, Dict[str, Any]], right: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Combine two column_stats results as if computed over both row sets"""
+    merged = {}
+    for column in list(left) + [c for c in right if c not in left]:
+        a = left.get(column, {'count': 0, 'nulls': 0})
+        b = right.get(column, {'count': 0, 'nulls': 0})
+        entry = {'count': a['count'] + b['count'], 'nulls': a['nulls'] + b['nulls']}
+        # Numeric stats survive only if every non-empty side was numeric
+        sides = [side for side in (a, b) if side['count']]
+        if sides and all('sum' in side for side in sides):
+            entry['min'] = min(side['min'] for side in sides)
+            entry['max'] = max(side['max'] for side in sides)
+            entry['sum'] = sum(side['sum'] for side in sides)
+            entry['mean'] = entry['sum'] / entry['count']
+        merged[column] = entry
+    return merged
 
+
+def build_csv_result(columns: List[str], rows: int, preview: List[Dict[str, Any]],
+                     stats: Dict[str, Dict[str, Any]], memory_usage: int, **summary: Any) -> Dict[str, Any]:
+    """Parsed CSV content; extra keyword arguments (e.g. estimates in partial results) go into the summary"""
+    return {
+        'type': 'csv',
+        'rows': rows,
+        'columns': len(columns),
+        'column_names': columns,
+        'data': preview,  # First 100 rows
+        'summary': {
+            'total_rows': rows,
+            'total_columns': len(columns),
+            'memory_usage': memory_usage,
+            'column_stats': stats,
+            **summary,
+        }
+    }
+
+
+def sample_bytes_per_row(file_path: str, sample_size: int = 1024 * 1024) -> Optional[float]:
+    """Average record length in the first ``sample_size`` bytes, used to estimate total rows early"""
+    with open_source(file_path) as file:
+        sample = file.read(sample_size)
+    header_end = sample.find(b'\n') + 1
+    rows = sample.count(b'\n', header_end)
+    return (len(sample) - header_end) / rows if header_end and rows else None
+
+
+@registry.register
 class CSVParser(FileParser):
     """Parser for CSV files"""
     
+    extensions = ('csv',)
+    mime_types = ('text/csv', 'application/csv')
+    requires = ('pandas',)
+    reads_compressed = True
+    
+    sample_rows = 1000  # rows in the first, early-published chunk
+    
+    def use_parallel(self) -> bool:
+        """Large files on multi-core hosts are parsed in byte ranges across processes, memory permitting"""
+        if self.plan is not None and not self.plan.parallel:
+            return False
+        if is_seekable_zstd(self.file_path):
+            return False  # byte ranges are memory-mapped, which needs the file uncompressed
+        return (settings.CSV_PARALLEL_WORKERS > 1
+                and os.path.getsize(self.file_path) >= settings.CSV_PARALLEL_THRESHOLD)
+    
+    def chunk_size(self) -> int:
+        """Target bytes per sequential chunk, as planned to fit the memory budget"""
+        if self.plan is not None and self.plan.chunk_size:
+            return self.plan.chunk_size
+        return settings.CSV_READ_CHUNK_SIZE
+    
     def parse(self) -> Dict[str, Any]:
+        pd = self.require('pandas')
+        if self.use_parallel():
+            from .csv_parallel import parse_csv_parallel
+            try:
+                self.report(0, self.sample_snapshot(pd))
+                with self.timed('parallel'):
+                    return parse_csv_parallel(
+                        self.file_path,
+                        workers=settings.CSV_PARALLEL_WORKERS,
+                        chunk_size=settings.CSV_PARALLEL_CHUNK_SIZE,
+                        start_method=settings.CSV_PARALLEL_START_METHOD,
+                        on_chunk=lambda done, total: self.report(done / total),
+                    )
+            except ParseAborted:
+                raise
+            except Exception as e:
+                # Any chunk failing (bad row, broken pool) falls back to one sequential pass
+                logger.warning("Parallel CSV parse of %s failed, retrying sequentially: %s", self.file_path, e)
+        
         try:
-            df = pd.read_csv(self.file_path)
-            return {
-                'type': 'csv',
-                'rows': len(df),
-                'columns': len(df.columns),
-                'column_names': df.columns.tolist(),
-                'data': df.head(100).to_dict('records'),  # First 100 rows
-                'summary': {
-                    'total_rows': len(df),
-                    'total_columns': len(df.columns),
-                    'memory_usage': df.memory_usage(deep=True).sum(),
-                }
-            }
+            with self.timed('read'):
+                return self.parse_chunked(pd)
+        except ParseAborted:
+            raise
         except Exception as e:
             raise ValueError(f"Error parsing CSV file: {str(e)}")
+    
+    def parse_chunked(self, pd) -> Dict[str, Any]:
+        """Read the file in chunks, publishing a refined partial result after each one"""
+        size = source_size(self.file_path)
+        bytes_per_row = sample_bytes_per_row(self.file_path)
+        chunk_rows = self.sample_rows
+        rows, memory_usage, preview, stats, columns = 0, 0, [], {}, None
+        
+        with open_source(self.file_path) as file:
+            reader = pd.read_csv(file, iterator=True)
+            while True:
+                try:
+                    chunk = reader.get_chunk(chunk_rows)
+                except StopIteration:
+                    break
+                if columns is None:
+                    columns = chunk.columns.tolist()
+                    stats = column_stats(chunk)
+                else:
+                    stats = merge_column_stats(stats, column_stats(chunk))
+                rows += len(chunk)
+                memory_usage += int(chunk.memory_usage(deep=True, index=False).sum())
+                if len(preview) < 100:
+                    preview += preview_records(chunk, 100 - len(preview))
+                
+                # The reader buffers ahead, so tell() is only exact for large chunks
+                consumed = file.tell()
+                if rows > self.sample_rows and consumed < size:
+                    bytes_per_row = consumed / rows
+                self.report(consumed / size if size else 1, build_csv_result(
+                    columns, rows, preview, stats, memory_usage,
+                    estimated_total_rows=max(rows, round(size / bytes_per_row)) if bytes_per_row else rows,
+                ))
+                # Later chunks aim for chunk_size() bytes each
+                chunk_rows = max(self.sample_rows, int(self.chunk_size() / (bytes_per_row or 1)))
+        
+        # Chunks exclude their index; add the RangeIndex a single-frame parse would carry
+        memory_usage += int(pd.RangeIndex(rows).memory_usage())
+        return build_csv_result(columns, rows, preview, stats, memory_usage)
+    
+    def sample_snapshot(self, pd) -> Dict[str, Any]:
+        """Partial result from the first rows only, published before a parallel parse starts"""
+        with open_source(self.file_path) as file:
+            sample = pd.read_csv(file, nrows=self.sample_rows)
+        bytes_per_row = sample_bytes_per_row(self.file_path)
+        size = source_size(self.file_path)
+        return build_csv_result(
+            sample.columns.tolist(), len(sample), preview_records(sample, 100), column_stats(sample),
+            int(sample.memory_usage(deep=True, index=False).sum()),
+            estimated_total_rows=max(len(sample), round(size / bytes_per_row)) if bytes_per_row else len(sample),
+        )
+    
+    def read_rows(self, offset: int, limit: int, sheet: Optional[str] = None) -> 'pandas.DataFrame':
+        pd = self.require('pandas')
+        with open_source(self.file_path) as file:
+            columns = pd.read_csv(file, nrows=0).columns.tolist()
+            file.seek(0)
+            # An integer skiprows skips whole records (quoted newlines included) in the C reader
+            return pd.read_csv(file, header=None, names=columns, skiprows=offset + 1, nrows=limit)
+    
+    def iter_text_chunks(self, chunk_rows: int, sheet: Optional[str] = None) -> Iterator['pandas.DataFrame']:
+        pd = self.require('pandas')
+        with open_source(self.file_path) as file:
+            yield from pd.read_csv(file, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+    
+    def append(self, parsed_content: Dict[str, Any], rows_csv: str) -> Tuple[Dict[str, Any], int]:
+        """Append header-less CSV rows to the file and fold only those rows into parsed_content
+        
+        Cost depends on the size of the delta, not of the existing file.
+        """
+        pd = self.require('pandas')
+        columns = parsed_content['column_names']
+        try:
+            delta = pd.read_csv(io.StringIO(rows_csv), header=None, names=columns)
+        except Exception as e:
+            raise ValueError(f"Error parsing appended rows: {str(e)}")
+        
+        with open(self.file_path, 'rb+') as file:
+            file.seek(0, os.SEEK_END)
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    file.write(b'\n')
+            file.write(rows_csv.encode('utf-8'))
+        
+        content = dict(parsed_content)
+        summary = dict(content.get('summary', {}))
+        content['rows'] = content.get('rows', 0) + len(delta)
+        summary['total_rows'] = summary.get('total_rows', 0) + len(delta)
+        summary['memory_usage'] = summary.get('memory_usage', 0) + int(delta.memory_usage(deep=True, index=False).sum())
+        # Files parsed before column_stats existed keep their summary without it
+        if 'column_stats' in summary:
+            summary['column_stats'] = merge_column_stats(summary['column_stats'], column_stats(delta))
+        content['summary'] = summary
+        preview = content.get('data', [])
+        if len(preview) < 100:
+            content['data'] = preview + preview_records(delta, 100 - len(preview))
+        return content, len(delta)
 
 
+@registry.register
 class ExcelParser(FileParser):
     """Parser for Excel files"""
     
+    extensions = ('xlsx', 'xls')
+    mime_types = (
+        'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'application/vnd.ms-excel',
+    )
+    requires = ('pandas', 'openpyxl')
+    
     def parse(self) -> Dict[str, Any]:
+        pd = self.require('pandas')
+        if self.plan is not None and self.plan.strategy == 'sidecar':
+            try:
+                return self.parse_sidecar(pd)
+            except ParseAborted:
+                raise
+            except Exception as e:
+                raise ValueError(f"Error parsing Excel file: {str(e)}")
         try:
             # Read all sheets
             excel_file = pd.ExcelFile(self.file_path)
             sheets_data = {}
             
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(self.file_path, sheet_name=sheet_name)
-                sheets_data[sheet_name] = {
-                    'rows': len(df),
-                    'columns': len(df.columns),
-                    'column_names': df.columns.tolist(),
-                    'data': df.head(50).to_dict('records'),  # First 50 rows per sheet
-                }
+            for index, sheet_name in enumerate(excel_file.sheet_names):
+                with self.timed('read'):
+                    df = pd.read_excel(excel_file, sheet_name=sheet_name)
+                with self.timed('summarize'):
+                    sheets_data[sheet_name] = {
+                        'rows': len(df),
+                        'columns': len(df.columns),
+                        'column_names': [str(column) for column in df.columns],
+                        'data': preview_records(df, 50),  # First 50 rows per sheet
+                    }
+                self.report((index + 1) / len(excel_file.sheet_names), self.result(excel_file.sheet_names, sheets_data))
             
-            return {
-                'type': 'excel',
-                'sheets': list(excel_file.sheet_names),
-                'sheets_data': sheets_data,
-                'summary': {
-                    'total_sheets': len(excel_file.sheet_names),
-                    'total_rows': sum(sheet['rows'] for sheet in sheets_data.values()),
-                }
-            }
+            return self.result(excel_file.sheet_names, sheets_data)
+        except ParseAborted:
+            raise
         except Exception as e:
             raise ValueError(f"Error parsing Excel file: {str(e)}")
+    
+    def read_rows(self, offset: int, limit: int, sheet: Optional[str] = None) -> 'pandas.DataFrame':
+        pd = self.require('pandas')
+        df = pd.read_excel(self.file_path, sheet_name=sheet or 0, skiprows=range(1, offset + 1), nrows=limit)
+        df.columns = [str(column) for column in df.columns]
+        return df
+    
+    def iter_text_chunks(self, chunk_rows: int, sheet: Optional[str] = None) -> Iterator['pandas.DataFrame']:
+        pd = self.require('pandas')
+        if not self.file_path.lower().endswith('.xlsx'):
+            # xlrd cannot stream .xls files, which hold at most 65,536 rows anyway
+            df = pd.read_excel(self.file_path, sheet_name=sheet or 0, dtype=str, keep_default_na=False)
+            df.columns = [str(column) for column in df.columns]
+            for start in range(0, len(df), chunk_rows):
+                yield df.iloc[start:start + chunk_rows].reset_index(drop=True)
+            return
+        openpyxl = self.require('openpyxl')
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            if sheet is not None and sheet not in workbook.sheetnames:
+                raise ValueError(f"Sheet {sheet!r} not found")
+            rows = (workbook[sheet] if sheet else workbook.worksheets[0]).iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = ['' if value is None else str(value) for value in header]
+            while True:
+                batch = [
+                    ['' if value is None else str(value) for value in row[:len(columns)]]
+                    for row in itertools.islice(rows, chunk_rows)
+                ]
+                if not batch:
+                    break
+                yield pd.DataFrame(batch, columns=columns, dtype=str).fillna('')
+        finally:
+            workbook.close()
+    
+    def parse_sidecar(self, pd) -> Dict[str, Any]:
+        """Stream each sheet into a CSV next to the workbook, then summarize that CSV in chunks
+        
+        openpyxl's read-only mode holds one row at a time, where read_excel builds every
+        cell of a sheet in memory. Only used for xlsx (xlrd cannot stream .xls files).
+        Rows are written EXCEL_STREAM_BATCH_ROWS at a time, checking for cancellation in between.
+        """
+        import csv
+        openpyxl = self.require('openpyxl')
+        workbook = openpyxl.load_workbook(self.file_path, read_only=True, data_only=True)
+        try:
+            sheet_names = list(workbook.sheetnames)
+            sheets_data = {}
+            for index, sheet_name in enumerate(sheet_names):
+                sidecar = f"{self.file_path}.sheet{index}.csv"
+                try:
+                    with self.timed('convert'):
+                        with open(sidecar, 'w', newline='', encoding='utf-8') as out:
+                            writer = csv.writer(out)
+                            rows = workbook[sheet_name].iter_rows(values_only=True)
+                            while True:
+                                batch = list(itertools.islice(rows, settings.EXCEL_STREAM_BATCH_ROWS))
+                                if not batch:
+                                    break
+                                writer.writerows(batch)
+                                self.checkpoint()
+                    with self.timed('read'):
+                        sheets_data[sheet_name] = self.summarize_sidecar(pd, sidecar)
+                finally:
+                    if os.path.exists(sidecar):
+                        os.remove(sidecar)
+                self.report((index + 1) / len(sheet_names), self.result(sheet_names, sheets_data))
+            return self.result(sheet_names, sheets_data)
+        finally:
+            workbook.close()
+    
+    def summarize_sidecar(self, pd, sidecar: str) -> Dict[str, Any]:
+        """Per-sheet summary, like parse() builds, from a sheet converted to CSV"""
+        if os.path.getsize(sidecar) == 0:
+            return {'rows': 0, 'columns': 0, 'column_names': [], 'data': []}
+        bytes_per_row = sample_bytes_per_row(sidecar) or 1
+        chunk_rows = max(1000, int(self.plan.chunk_size / bytes_per_row)) if self.plan.chunk_size else 10000
+        rows, columns, preview = 0, None, []
+        for chunk in pd.read_csv(sidecar, chunksize=chunk_rows):
+            if columns is None:
+                columns = [str(column) for column in chunk.columns]
+            rows += len(chunk)
+            if len(preview) < 50:
+                preview += preview_records(chunk, 50 - len(preview))
+            self.checkpoint()
+        return {'rows': rows, 'columns': len(columns), 'column_names': columns, 'data': preview}
+    
+    def result(self, sheet_names: List[str], sheets_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'type': 'excel',
+            'sheets': list(sheet_names),
+            'sheets_data': sheets_data,
+            'summary': {
+                'total_sheets': len(sheet_names),
+                'total_rows': sum(sheet['rows'] for sheet in sheets_data.values()),
+            }
+        }
 
 
+@registry.register
 class PDFParser(FileParser):
     """Parser for PDF files"""
     
+    extensions = ('pdf',)
+    mime_types = ('application/pdf',)
+    requires = ('PyPDF2',)
+    
     def parse(self) -> Dict[str, Any]:
+        PyPDF2 = self.require('PyPDF2')
         try:
             with open(self.file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
+                with self.timed('read'):
+                    pdf_reader = PyPDF2.PdfReader(file)
+                    page_count = len(pdf_reader.pages)
                 
                 text_content = []
-                page_count = len(pdf_reader.pages)
                 
                 # Extract text from first 10 pages to avoid memory issues
-                for page_num in range(min(10, page_count)):
-                    page = pdf_reader.pages[page_num]
-                    text_content.append({
-                        'page': page_num + 1,
-                        'text': page.extract_text()[:1000]  # First 1000 characters per page
-                    })
+                pages_to_parse = min(10, page_count)
+                with self.timed('extract'):
+                    for page_num in range(pages_to_parse):
+                        page = pdf_reader.pages[page_num]
+                        text_content.append({
+                            'page': page_num + 1,
+                            'text': page.extract_text()[:1000]  # First 1000 characters per page
+                        })
+                        self.report((page_num + 1) / pages_to_parse, self.result(page_count, text_content))
                 
-                return {
-                    'type': 'pdf',
-                    'total_pages': page_count,
-                    'pages_parsed': len(text_content),
-                    'text_content': text_content,
-                    'summary': {
-                        'total_pages': page_count,
-                        'total_text_length': sum(len(page['text']) for page in text_content),
-                    }
-                }
+                return self.result(page_count, text_content)
+        except ParseAborted:
+            raise
         except Exception as e:
             raise ValueError(f"Error parsing PDF file: {str(e)}")
+    
+    def result(self, page_count: int, text_content: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            'type': 'pdf',
+            'total_pages': page_count,
+            'pages_parsed': len(text_content),
+            'text_content': list(text_content),
+            'summary': {
+                'total_pages': page_count,
+                'total_text_length': sum(len(page['text']) for page in text_content),
+            }
+        }
 
 
+@registry.register
 class TXTParser(FileParser):
     """Parser for TXT files"""
     
+    extensions = ('txt',)
+    mime_types = ('text/plain',)
+    reads_compressed = True
+    
     def parse(self) -> Dict[str, Any]:
+        from .text_stream import scan_text
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-                lines = content.split('\n')
-                
-                return {
-                    'type': 'txt',
-                    'total_lines': len(lines),
-                    'total_characters': len(content),
-                    'content_preview': content[:2000],  # First 2000 characters
-                    'lines_preview': lines[:100],  # First 100 lines
-                    'summary': {
-                        'total_lines': len(lines),
-                        'total_characters': len(content),
-                        'average_line_length': len(content) / len(lines) if lines else 0,
-                    }
-                }
+            size = source_size(self.file_path)
+            with self.timed('read'):
+                result = scan_text(
+                    self.file_path, settings.TXT_READ_BLOCK_SIZE,
+                    on_block=lambda done, partial: self.report(done / size if size else 1, partial),
+                )
+            self.build_index(result['encoding'])
+            return result
+        except ParseAborted:
+            raise
         except Exception as e:
             raise ValueError(f"Error parsing TXT file: {str(e)}")
+    
+    def build_index(self, encoding: str):
+        """Write the line-offset index behind the lines endpoint (rebuilt on demand if this fails)"""
+        from .line_index import build_line_index, indexable
+        if not indexable(encoding):
+            return
+        try:
+            with self.timed('index'):
+                build_line_index(self.file_path)
+        except OSError as e:
+            logger.warning("Could not build the line index for %s: %s", self.file_path, e)
 
 
-def get_parser(file_path: str, file_type: str) -> FileParser:
+def get_parser(file_path: str, file_type: str, mime_type: str = None, on_progress=None,
+               token: Optional[CancellationToken] = None, plan: Optional['ParsePlan'] = None) -> FileParser:
     """Factory function to get appropriate parser based on file type"""
-    file_type = file_type.lower()
-    
-    if file_type in ['csv']:
-        return CSVParser(file_path)
-    elif file_type in ['xlsx', 'xls']:
-        return ExcelParser(file_path)
-    elif file_type in ['pdf']:
-        return PDFParser(file_path)
-    elif file_type in ['txt']:
-        return TXTParser(file_path)
-    else:
+    parser_class = registry.get(file_type, mime_type)
+    if parser_class is None:
         raise ValueError(f"Unsupported file type: {file_type}")
+    return parser_class(file_path, on_progress=on_progress, token=token, plan=plan)
 
 
-def parse_file(file_path: str, file_type: str) -> Dict[str, Any]:
-    """Parse file and return structured data"""
-    parser = get_parser(file_path, file_type)
+def parse_file(file_path: str, file_type: str, mime_type: str = None, on_progress=None,
+               token: Optional[CancellationToken] = None, plan: Optional['ParsePlan'] = None) -> Dict[str, Any]:
+    """Parse file and return structured data, reporting partial results to ``on_progress``
+    
+    Raises a ParseAborted subclass when ``token`` stops the parse between chunks or pages.
+    ``plan`` (files.memory.plan_parse) selects the strategy and chunk size.
+    """
+    parser = get_parser(file_path, file_type, mime_type, on_progress=on_progress, token=token, plan=plan)
     return parser.parse()
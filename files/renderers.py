@@ -0,0 +1,23 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+from .layouts import ARROW_MEDIA_TYPE, ColumnarTable, arrow_stream
+
+
+class ArrowStreamRenderer(BaseRenderer):
+    """Renders a ColumnarTable as an Arrow IPC stream (?format=arrow)
+
+    Other payloads (errors, processing responses) are rendered as JSON.
+    """
+
+    media_type = ARROW_MEDIA_TYPE
+    format = 'arrow'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, ColumnarTable):
+            response = (renderer_context or {}).get('response')
+            if response is not None:
+                response['Content-Type'] = 'application/json'
+            return JSONRenderer().render(data, 'application/json', renderer_context)
+        return arrow_stream(data)
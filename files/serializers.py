@@ -1,5 +1,13 @@
+import csv
+import io
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.fields.json import KeyTransform
+from django.utils import timezone
 from rest_framework import serializers
-from .models import File
+from .compression import BULKY_KEYS
+from .models import DeletionJob, File
 
 
 class FileUploadSerializer(serializers.ModelSerializer):
@@ -19,6 +27,49 @@ class FileProgressSerializer(serializers.ModelSerializer):
         fields = ['id', 'status', 'progress']
 
 
+class FileBatchProgressSerializer(FileProgressSerializer):
+    """Progress of one file in a batch, with the time it last changed"""
+    
+    class Meta(FileProgressSerializer.Meta):
+        fields = FileProgressSerializer.Meta.fields + ['updated_at']
+
+
+class ProgressBatchSerializer(serializers.Serializer):
+    """Serializer for a batch progress request: ``ids``, and optionally the ``since`` of the last poll
+    
+    Files unchanged since ``since`` are left out; ids that don't exist (or were
+    deleted) are listed under ``missing``. ``as_of`` is the ``since`` for the
+    next poll. It is taken before the query and moved back by
+    PROGRESS_BATCH_SINCE_SLACK, so a change committed just after the query
+    is never skipped, at the cost of sometimes reporting a file twice.
+    """
+    
+    ids = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
+    since = serializers.DateTimeField(required=False)
+    
+    FIELDS = FileBatchProgressSerializer.Meta.fields
+    
+    def validate_ids(self, ids):
+        if len(ids) > settings.PROGRESS_BATCH_MAX_IDS:
+            raise serializers.ValidationError(f'At most {settings.PROGRESS_BATCH_MAX_IDS} ids per request')
+        return list(dict.fromkeys(ids))
+    
+    def queryset(self):
+        self.as_of = timezone.now() - timedelta(seconds=settings.PROGRESS_BATCH_SINCE_SLACK)
+        return File.objects.filter(id__in=self.validated_data['ids']).only(*self.FIELDS).order_by()
+    
+    def response(self, files):
+        """Response body for the files the queryset() returned"""
+        since = self.validated_data.get('since')
+        found = {file_obj.id for file_obj in files}
+        changed = [file_obj for file_obj in files if since is None or file_obj.updated_at > since]
+        return {
+            'files': FileBatchProgressSerializer(changed, many=True).data,
+            'missing': [str(file_id) for file_id in self.validated_data['ids'] if file_id not in found],
+            'as_of': serializers.DateTimeField().to_representation(self.as_of),
+        }
+
+
 class FileListSerializer(serializers.ModelSerializer):
     """Serializer for listing files"""
     
@@ -27,8 +78,19 @@ class FileListSerializer(serializers.ModelSerializer):
         fields = ['id', 'original_filename', 'file_size', 'file_type', 'status', 'created_at']
 
 
+def content_path_alias(index):
+    return f'content_path_{index}'
+
+
 class FileDetailSerializer(serializers.ModelSerializer):
-    """Serializer for file details and parsed content"""
+    """Serializer for file details and parsed content
+    
+    Context options: ``layout`` for tabular previews, ``fields`` to return only
+    some fields, and ``content_paths`` (key tuples) to return only those parts of
+    parsed_content. Load instances with sparse_queryset() for the same options.
+    """
+    
+    parsed_content = serializers.SerializerMethodField()
     
     class Meta:
         model = File
@@ -37,6 +99,83 @@ class FileDetailSerializer(serializers.ModelSerializer):
             'status', 'progress', 'parsed_content', 'error_message', 
             'created_at', 'updated_at'
         ]
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+    
+    @classmethod
+    def parse_sparse_params(cls, params):
+        """Read ?fields= and ?content_paths= into (fields, content_paths); None means everything"""
+        fields, content_paths = params.get('fields'), params.get('content_paths')
+        if fields is not None:
+            fields = [name.strip() for name in fields.split(',') if name.strip()]
+            unknown = set(fields) - set(cls.Meta.fields)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        if content_paths is not None:
+            content_paths = [tuple(path.strip().split('.')) for path in content_paths.split(',') if path.strip()]
+            if any('' in path for path in content_paths):
+                raise ValueError('content_paths entries must be dotted key paths like summary.total_rows')
+            if fields is not None and 'parsed_content' not in fields:
+                fields.append('parsed_content')
+        return fields, content_paths
+    
+    @classmethod
+    def sparse_queryset(cls, fields=None, content_paths=None):
+        """Queryset loading only the columns, and JSON sub-paths, that the response needs
+        
+        Paths into the JSONB column are extracted by the database (parsed_content -> 'key');
+        only paths into the compressed bulky keys need the blob.
+        """
+        wanted = cls.Meta.fields if fields is None else fields
+        load = {'id', 'status', 'progress'} | {name for name in wanted if name != 'parsed_content'}
+        queryset = File.objects.annotate(content_available=ExpressionWrapper(
+            Q(parsed_content__isnull=False) | Q(parsed_content_blob__isnull=False), output_field=BooleanField()
+        ))
+        if content_paths is None:
+            if 'parsed_content' in wanted:
+                load |= {'parsed_content', 'parsed_content_blob'}
+        else:
+            annotations = {}
+            for index, path in enumerate(content_paths):
+                if path[0] in BULKY_KEYS:
+                    load |= {'parsed_content', 'parsed_content_blob'}
+                    continue
+                expression = KeyTransform(path[0], 'parsed_content')
+                for key in path[1:]:
+                    expression = KeyTransform(key, expression)
+                annotations[content_path_alias(index)] = expression
+            queryset = queryset.annotate(**annotations)
+        return queryset.only(*load)
+    
+    def get_parsed_content(self, obj):
+        """Parsed content with previews in the layout from the context (records by default)"""
+        layout = self.context.get('layout', 'records')
+        content_paths = self.context.get('content_paths')
+        if content_paths is None:
+            return obj.content_as(layout)
+        
+        content, full_content = {}, None
+        for index, path in enumerate(content_paths):
+            if path[0] in BULKY_KEYS:
+                if full_content is None:
+                    full_content = obj.content_as(layout) or {}
+                value = full_content
+                for key in path:
+                    value = value.get(key) if isinstance(value, dict) else None
+            else:
+                value = getattr(obj, content_path_alias(index))
+            target = content
+            for key in path[:-1]:
+                if not isinstance(target.get(key), dict):
+                    target[key] = {}
+                target = target[key]
+            target[path[-1]] = value
+        return content
 
 
 class FileUploadResponseSerializer(serializers.ModelSerializer):
@@ -47,3 +186,104 @@ class FileUploadResponseSerializer(serializers.ModelSerializer):
     class Meta:
         model = File
         fields = ['id', 'message', 'status']
+
+
+class FileAppendSerializer(serializers.Serializer):
+    """Serializer validating rows appended to a tabular file
+    
+    Accepts either ``rows`` (lists in column order, or objects keyed by column
+    name) or a CSV ``file`` whose header matches the stored columns. Expects
+    the stored ``columns`` in the serializer context.
+    """
+    
+    rows = serializers.ListField(required=False, allow_empty=False)
+    file = serializers.FileField(required=False)
+    
+    def validate(self, attrs):
+        columns = self.context['columns']
+        if 'rows' in attrs:
+            rows = attrs['rows']
+        elif 'file' in attrs:
+            reader = csv.reader(io.StringIO(attrs['file'].read().decode('utf-8-sig')))
+            header = next(reader, None)
+            if header != columns:
+                raise serializers.ValidationError(
+                    f'CSV header {header} does not match the stored columns {columns}'
+                )
+            rows = reader
+        else:
+            raise serializers.ValidationError('Provide either "rows" or a CSV "file"')
+        
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        count = 0
+        for index, row in enumerate(rows):
+            if isinstance(row, dict):
+                if set(row) != set(columns):
+                    raise serializers.ValidationError(
+                        f'Row {index} has columns {sorted(row)}, expected {columns}'
+                    )
+                row = [row[column] for column in columns]
+            elif not isinstance(row, (list, tuple)) or len(row) != len(columns):
+                raise serializers.ValidationError(f'Row {index} must have {len(columns)} values')
+            writer.writerow(['' if value is None else value for value in row])
+            count += 1
+        if not count:
+            raise serializers.ValidationError('No rows to append')
+        
+        attrs['rows_csv'] = buffer.getvalue()
+        return attrs
+
+
+class BulkDeleteSerializer(serializers.Serializer):
+    """Serializer selecting the files of a bulk delete, by ``ids`` or by a ``filter``
+    
+    A filter needs at least one criterion, so an empty body never deletes everything.
+    """
+    
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    filter = serializers.DictField(required=False)
+    
+    FILTERS = {
+        'status': serializers.ChoiceField(choices=[choice for choice, _ in File.STATUS_CHOICES]),
+        'file_type': serializers.CharField(max_length=10),
+        'client_id': serializers.CharField(max_length=255),
+        'created_before': serializers.DateTimeField(),
+        'created_after': serializers.DateTimeField(),
+    }
+    LOOKUPS = {'created_before': 'created_at__lt', 'created_after': 'created_at__gte'}
+    
+    def validate_ids(self, ids):
+        if len(ids) > settings.BULK_DELETE_MAX_IDS:
+            raise serializers.ValidationError(f'At most {settings.BULK_DELETE_MAX_IDS} ids per request')
+        return ids
+    
+    def validate_filter(self, criteria):
+        unknown = set(criteria) - set(self.FILTERS)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        if not criteria:
+            raise serializers.ValidationError('A filter needs at least one criterion')
+        return {
+            self.LOOKUPS.get(name, name): self.FILTERS[name].run_validation(value)
+            for name, value in criteria.items()
+        }
+    
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError('Provide either "ids" or a "filter"')
+        return attrs
+    
+    def queryset(self):
+        if 'ids' in self.validated_data:
+            return File.objects.filter(id__in=self.validated_data['ids'])
+        return File.objects.filter(**self.validated_data['filter'])
+
+
+class DeletionJobSerializer(serializers.ModelSerializer):
+    """Serializer for the progress of a bulk delete"""
+    
+    class Meta:
+        model = DeletionJob
+        fields = ['id', 'status', 'total', 'reclaimed', 'reclaimed_bytes', 'progress', 'created_at', 'updated_at']
+
@@ -0,0 +1,302 @@
+"""
+Storage tiers for raw uploads.
+
+- ``hot``: the upload as received, in MEDIA_ROOT/uploads
+- ``compressed``: zstd-compressed next to it, as ``uploads/<file id><ext>.zst``
+- ``cold``: zstd-compressed in COLD_STORAGE_DIR (e.g. a cheaper, slower disk)
+
+Compressed files use the zstd seekable format: independent frames of
+STORAGE_FRAME_SIZE bytes followed by a seek table in a skippable frame, so
+plain ``zstd -d`` still reads them and any byte range can be decompressed
+without the frames before it. open_stored() reads a file in any tier as a
+seekable stream. Readers that take a path get one from source_path(): the
+stored file itself for those that open it with open_source() (the CSV and TXT
+parsers, line reads), which decompresses frames as they are read, and otherwise
+(Excel, PDF, mmap) a decompressed copy from a small LRU rehydration cache.
+"""
+
+import bisect
+import io
+import os
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, List
+
+from django.conf import settings
+
+TIERS = ('hot', 'compressed', 'cold')
+
+SKIPPABLE_MAGIC = 0x184D2A5E
+SEEKABLE_MAGIC = 0x8F92EAB1
+ENTRY = struct.Struct('<II')  # compressed size, decompressed size
+FOOTER = struct.Struct('<IBI')  # number of frames, descriptor, seekable magic
+CHECKSUM_FLAG = 0x80
+
+
+class SeekTableError(Exception):
+    """The file is not in the zstd seekable format"""
+
+
+def tier_path(file_obj, tier: str) -> str:
+    """Where the bytes of ``file_obj`` live in ``tier``"""
+    path = file_obj.file_path.path
+    if tier == 'hot':
+        return path
+    name = f"{file_obj.id}{os.path.splitext(path)[1].lower()}.zst"
+    if tier == 'cold':
+        return os.path.join(settings.COLD_STORAGE_DIR, name)
+    return os.path.join(os.path.dirname(path), name)
+
+
+def stored_path(file_obj) -> str:
+    return tier_path(file_obj, file_obj.storage_tier)
+
+
+def compress_seekable(source_path: str, destination: str, frame_size: int = None, level: int = None):
+    """Write ``source_path`` to ``destination`` as seekable zstd, atomically"""
+    with open(source_path, 'rb') as source:
+        write_seekable(source, destination, frame_size, level)
+
+
+def write_seekable(source: BinaryIO, destination: str, frame_size: int = None, level: int = None) -> int:
+    """Write everything read from ``source`` to ``destination`` as seekable zstd, atomically
+    
+    Returns the number of bytes read. Nothing is left at ``destination`` if reading fails.
+    """
+    import zstandard
+    compressor = zstandard.ZstdCompressor(level=level or settings.STORAGE_ZSTD_LEVEL, write_content_size=True)
+    frame_size = frame_size or settings.STORAGE_FRAME_SIZE
+    entries = []
+    total = 0
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temp_path = f"{destination}.tmp"
+    try:
+        with open(temp_path, 'wb') as out:
+            while True:
+                chunk = source.read(frame_size)
+                if not chunk:
+                    break
+                frame = compressor.compress(chunk)
+                out.write(frame)
+                entries.append(ENTRY.pack(len(frame), len(chunk)))
+                total += len(chunk)
+            table = b''.join(entries) + FOOTER.pack(len(entries), 0, SEEKABLE_MAGIC)
+            out.write(struct.pack('<II', SKIPPABLE_MAGIC, len(table)) + table)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, destination)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return total
+
+
+class SeekableZstdReader(io.RawIOBase):
+    """Random-access reads of a seekable zstd file, decompressing only the frames that are read"""
+
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        try:
+            self._read_seek_table()
+        except Exception:
+            self.file.close()
+            raise
+        self.position = 0
+        self._frame_index, self._frame = None, b''
+
+    def _read_seek_table(self):
+        self.file.seek(0, io.SEEK_END)
+        if self.file.tell() < FOOTER.size:
+            raise SeekTableError(f"{self.file.name} is too short for a seek table")
+        self.file.seek(-FOOTER.size, io.SEEK_END)
+        frames, descriptor, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+        if magic != SEEKABLE_MAGIC:
+            raise SeekTableError(f"{self.file.name} has no seek table")
+        entry_size = ENTRY.size + (4 if descriptor & CHECKSUM_FLAG else 0)
+        self.file.seek(-(FOOTER.size + frames * entry_size), io.SEEK_END)
+        table = self.file.read(frames * entry_size)
+        # Start offsets of every frame, compressed and decompressed, plus the end of the last
+        self.compressed_starts: List[int] = [0]
+        self.starts: List[int] = [0]
+        for index in range(frames):
+            compressed, decompressed = ENTRY.unpack_from(table, index * entry_size)
+            self.compressed_starts.append(self.compressed_starts[-1] + compressed)
+            self.starts.append(self.starts[-1] + decompressed)
+        self.size = self.starts[-1]
+
+    def _load_frame(self, index: int) -> bytes:
+        if index != self._frame_index:
+            import zstandard
+            self.file.seek(self.compressed_starts[index])
+            compressed = self.file.read(self.compressed_starts[index + 1] - self.compressed_starts[index])
+            self._frame = zstandard.ZstdDecompressor().decompress(compressed)
+            self._frame_index = index
+        return self._frame
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = max(0, base + offset)
+        return self.position
+
+    def readinto(self, buffer):
+        filled = 0
+        while filled < len(buffer) and self.position < self.size:
+            index = bisect.bisect_right(self.starts, self.position) - 1
+            frame = self._load_frame(index)
+            start = self.position - self.starts[index]
+            count = min(len(buffer) - filled, len(frame) - start)
+            buffer[filled:filled + count] = frame[start:start + count]
+            self.position += count
+            filled += count
+        return filled
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def is_seekable_zstd(path: str) -> bool:
+    # Uploads keep their own extension, so only the compressed tiers end in .zst
+    return path.endswith('.zst')
+
+
+def open_source(path: str) -> BinaryIO:
+    """The original bytes behind a path from source_path(), decompressing seekable zstd as it is read"""
+    if is_seekable_zstd(path):
+        return io.BufferedReader(SeekableZstdReader(path), buffer_size=1024 * 1024)
+    return open(path, 'rb')
+
+
+def source_size(path: str) -> int:
+    """Size of the original bytes behind ``path``, from the seek table for seekable zstd"""
+    if is_seekable_zstd(path):
+        with SeekableZstdReader(path) as reader:
+            return reader.size
+    return os.path.getsize(path)
+
+
+def open_stored(file_obj) -> BinaryIO:
+    """The upload's original bytes as a seekable binary stream, whatever its tier"""
+    return open_source(stored_path(file_obj))
+
+
+def _cache_entries():
+    """Cached copies by file id, with their total size and last use, least recently used first"""
+    entries = {}
+    with os.scandir(settings.REHYDRATION_CACHE_DIR) as scan:
+        for entry in scan:
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            # <file id><ext>, and the <file id><ext>.lines.idx built from it
+            file_id = entry.name[:36]
+            stat = entry.stat()
+            size, used = entries.get(file_id, (0, 0))
+            entries[file_id] = (size + stat.st_size, max(used, stat.st_mtime))
+    return sorted(entries.items(), key=lambda item: item[1][1])
+
+
+def evict_rehydrated(keep: str = None):
+    """Remove least recently used copies until the cache fits REHYDRATION_CACHE_BYTES"""
+    entries = _cache_entries()
+    total = sum(size for _, (size, _) in entries)
+    for file_id, (size, _) in entries:
+        if total <= settings.REHYDRATION_CACHE_BYTES:
+            break
+        if file_id == keep:
+            continue
+        remove_rehydrated(file_id)
+        total -= size
+
+
+def remove_rehydrated(file_id):
+    directory = settings.REHYDRATION_CACHE_DIR
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.startswith(str(file_id)):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+def local_path(file_obj) -> str:
+    """A path to the upload's original bytes, decompressing a compressed or cold file into the cache"""
+    if file_obj.storage_tier == 'hot':
+        return stored_path(file_obj)
+    os.makedirs(settings.REHYDRATION_CACHE_DIR, exist_ok=True)
+    path = os.path.join(
+        settings.REHYDRATION_CACHE_DIR, f"{file_obj.id}{os.path.splitext(file_obj.file_path.name)[1].lower()}"
+    )
+    if os.path.exists(path):
+        os.utime(path)  # mark as recently used
+        return path
+    handle, temp_path = tempfile.mkstemp(suffix='.tmp', dir=settings.REHYDRATION_CACHE_DIR)
+    try:
+        with open_stored(file_obj) as source, os.fdopen(handle, 'wb') as out:
+            shutil.copyfileobj(source, out, 1024 * 1024)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    evict_rehydrated(keep=str(file_obj.id))
+    return path
+
+
+def source_path(file_obj, streamed: bool = False) -> str:
+    """The path a reader should open: the stored file itself for ``streamed`` readers (they use open_source()),
+    otherwise local_path()'s uncompressed one
+    """
+    if streamed:
+        return stored_path(file_obj)
+    return local_path(file_obj)
+
+
+def write_tier(file_obj, tier: str) -> str:
+    """Copy the upload from its current tier into ``tier``, returning the new path
+
+    The current copy is left in place; remove_tier() it once the new tier is recorded.
+    """
+    source = stored_path(file_obj)
+    destination = tier_path(file_obj, tier)
+    if tier == 'hot':
+        temp_path = f"{destination}.tmp"
+        with open_stored(file_obj) as stream, open(temp_path, 'wb') as out:
+            shutil.copyfileobj(stream, out, 1024 * 1024)
+        os.replace(temp_path, destination)
+    elif file_obj.storage_tier == 'hot':
+        compress_seekable(source, destination)
+    else:
+        # Already compressed: moving between disks needs no recompression
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copyfile(source, f"{destination}.tmp")
+        os.replace(f"{destination}.tmp", destination)
+    return destination
+
+
+def remove_tier(file_obj, tier: str):
+    """Delete the upload's copy in ``tier`` and whatever was derived from it"""
+    from .line_index import index_path
+    path = tier_path(file_obj, tier)
+    for derived in (path, index_path(path)):
+        if os.path.exists(derived):
+            os.remove(derived)
+
+
+def remove_stored(file_obj):
+    """Delete the upload from every tier and the rehydration cache"""
+    for tier in TIERS:
+        if tier != 'cold' or settings.COLD_STORAGE_DIR:
+            remove_tier(file_obj, tier)
+    remove_rehydrated(file_obj.id)
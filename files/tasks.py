@@ -1,46 +1,489 @@
 import os
+import json
+import threading
 import time
+import uuid
+from datetime import timedelta
+from typing import Optional
 from celery import shared_task
+from celery.exceptions import Retry, SoftTimeLimitExceeded
+from celery.utils.log import get_task_logger
+from celery.utils.time import get_exponential_backoff_interval
 from django.conf import settings
-from .models import File
-from .parsers import parse_file
+from django.db import InterfaceError, OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+from .memory import MemoryReservation, RSSWatch, plan_parse
+from .metrics import (
+    CONTENT_BYTES, TASK_OUTCOMES, TASK_PEAK_RSS, observe_stage, time_stage, size_bucket, profile_if_enabled
+)
+from .models import DeletionJob, File, WebhookDelivery
+from .nodes import LocalFile, NodeUnavailable, parse_queue
+from .parsers import CancellationToken, ParseCancelled, ParseMemoryExceeded, ParseTimedOut, parse_file, registry
+from .storage import remove_tier, write_tier
+from .webhooks import UnsafeWebhookURL, WebhookError, post as post_webhook
 
+logger = get_task_logger(__name__)
 
-@shared_task(bind=True)
-def process_file_upload(self, file_id: str):
-    """Background task to process file upload and parsing"""
+# Infrastructure errors worth retrying; parse errors are not, they would fail again
+TRANSIENT_ERRORS = (OperationalError, InterfaceError, RedisConnectionError, RedisTimeoutError, NodeUnavailable)
+# Statuses a file can be reprocessed from
+REPROCESSABLE_STATUSES = ('ready', 'failed', 'cancelled', 'timed_out')
+
+
+class PartialResultPublisher:
+    """Writes parse progress and the latest partial result to the File row, at most once per interval
+    
+    The first snapshot is always written straight away so the detail endpoint has
+    something to show early. Progress is capped at 99 until the file is ready.
+    ``claim`` (File.claim_filter()) keeps a superseded worker from writing over the new one.
+    """
+    
+    def __init__(self, file_id: str, interval: float, claim: dict = None):
+        self.file_id = file_id
+        self.interval = interval
+        self.claim = claim or {}
+        self.progress = 0
+        self.last_write = None
+        self.has_snapshot = False
+    
+    def __call__(self, fraction: float, snapshot: dict = None):
+        progress = max(self.progress, min(99, int(fraction * 100)))
+        now = time.monotonic()
+        first_snapshot = snapshot is not None and not self.has_snapshot
+        if not first_snapshot and self.last_write is not None and now - self.last_write < self.interval:
+            return
+        if snapshot is None and progress == self.progress:
+            return
+        
+        fields = {'progress': progress, 'updated_at': timezone.now()}
+        if snapshot is not None:
+            fields.update(File.content_fields(snapshot))
+        try:
+            # Conditional on the claim, status and progress, so a stale worker can't roll either back
+            File.objects.filter(
+                id=self.file_id, status='processing', progress__lte=progress, **self.claim
+            ).update(**fields)
+        except Exception as e:
+            # A snapshot that can't be stored must not fail the parse itself
+            logger.warning("Could not publish partial result for %s: %s", self.file_id, e)
+            return
+        self.progress, self.last_write = progress, now
+        self.has_snapshot = self.has_snapshot or snapshot is not None
+
+
+def parse_token(file_id: str, parser_type: str, claim: dict = None) -> CancellationToken:
+    """Token that stops a parse once the file leaves 'processing' (cancelled) or ``claim`` (reclaimed
+    by another task), its type's budget runs out or the worker process grows past PARSE_MAX_RSS"""
+    budget = settings.PARSE_TIME_BUDGETS.get(parser_type) or None
+    return CancellationToken(
+        budget=budget,
+        is_cancelled=lambda: not File.objects.filter(id=file_id, status='processing', **(claim or {})).exists(),
+        check_interval=settings.PARSE_CANCEL_CHECK_INTERVAL,
+        max_rss=settings.PARSE_MAX_RSS or None,
+    )
+
+
+def reservation_ttl(parser_type: str) -> float:
+    """How long a memory reservation outlives its task at most: the parse time budget plus slack"""
+    return (settings.PARSE_TIME_BUDGETS.get(parser_type) or 3600) + 300
+
+
+class LeaseHeartbeat:
+    """Renews a processing file's lease from a background thread while the block runs
+    
+    If the worker dies the renewals stop, the lease lapses and reap_expired_leases
+    requeues the file. A parse that hangs keeps renewing, but is stopped by its time budget.
+    """
+    
+    def __init__(self, file_obj: File, interval: float):
+        self.file_obj = file_obj
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.file_obj.renew_lease()
+                except Exception as e:
+                    logger.warning("Could not renew the lease on file %s: %s", self.file_obj.id, e)
+        finally:
+            connection.close()
+    
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+        self._thread.start()
+        return self
+    
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def parse_soft_time_limit() -> Optional[float]:
+    """Celery soft time limit of a parse task: the longest parse time budget plus PARSE_SOFT_TIME_LIMIT_GRACE
+    
+    A backstop for a parse stuck where it never reaches a checkpoint, e.g. one pathological
+    PDF page. None (no limit) if any file type's budget is unlimited.
+    """
+    budgets = list(settings.PARSE_TIME_BUDGETS.values())
+    if not budgets or not all(budgets):
+        return None
+    return max(budgets) + settings.PARSE_SOFT_TIME_LIMIT_GRACE
+
+
+def retry_countdown(retries: int) -> int:
+    """Exponential backoff with full jitter for retrying after transient errors"""
+    return get_exponential_backoff_interval(
+        factor=settings.FILE_TASK_RETRY_BACKOFF, retries=retries,
+        maximum=settings.FILE_TASK_RETRY_BACKOFF_MAX, full_jitter=True,
+    )
+
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, soft_time_limit=parse_soft_time_limit())
+def process_file_upload(self, file_id: str, enqueued_at: float = None):
+    """Background task to process file upload and parsing
+    
+    Idempotent: every delivery must first claim the file, so redeliveries (acks_late)
+    and retries after transient database/Redis errors never process a file twice. Every
+    write after the claim is fenced by it, so a worker whose file was reclaimed changes nothing.
+    """
+    file_obj = None
     try:
         # Get the file object
-        file_obj = File.objects.get(id=file_id)
-        
-        # Update status to processing
-        file_obj.mark_as_processing()
-        
-        # Simulate upload progress (in real scenario, this would be tracked during upload)
-        for progress in range(0, 101, 10):
-            file_obj.update_progress(progress)
-            time.sleep(0.5)  # Simulate processing time
+        load_start = time.perf_counter()
+        file_obj = File.objects.only(
+            'id', 'status', 'file_path', 'file_type', 'file_size', 'original_filename', 'storage_node', 'storage_tier'
+        ).get(id=file_id)
+        file_type, file_size = file_obj.file_type, file_obj.file_size
+        observe_stage('load', file_type, file_size, time.perf_counter() - load_start)
         
-        # Parse the file
-        file_path = file_obj.file_path.path
-        file_type = file_obj.get_file_extension().lstrip('.')
+        # Time spent waiting in the broker queue, from the enqueue timestamp
+        if enqueued_at:
+            observe_stage('queue_wait', file_type, file_size, max(0.0, time.time() - enqueued_at))
         
+        # Parse from local disk; an upload stored on another node is streamed over first
+        parser_type = file_obj.get_file_extension().lstrip('.')
+        local_file = LocalFile(file_obj, streamed=registry.reads_compressed(parser_type))
+        file_path = local_file.acquire()
         try:
-            parsed_content = parse_file(file_path, file_type)
-            file_obj.mark_as_ready(parsed_content)
+            # Plan the parse and wait for enough of this host's memory budget to run it
+            plan = plan_parse(file_path, parser_type, file_size)
+            reservation = MemoryReservation(file_id, plan.estimated_bytes, reservation_ttl(parser_type))
+            # Inline (eager) runs cannot wait for a retry, so they always proceed
+            if not reservation.acquire() and not self.request.is_eager:
+                logger.info("File %s is waiting for worker memory (%s bytes, %s)",
+                            file_id, f"{plan.estimated_bytes:,}", plan.strategy)
+                TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'deferred').inc()
+                raise self.retry(countdown=settings.PARSE_ADMISSION_RETRY_DELAY, max_retries=None)
             
-        except Exception as parse_error:
-            file_obj.mark_as_failed(str(parse_error))
+            try:
+                with profile_if_enabled(f'process_file_upload_{file_id}'):
+                    # Claim the file; a duplicate or stale delivery loses and leaves it alone
+                    if not file_obj.mark_as_processing(task_id=self.request.id):
+                        logger.info("File %s was not claimed for processing (status %s)", file_id, file_obj.status)
+                        TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'skipped').inc()
+                        return
+                    
+                    # Parse the file, publishing real progress and partial results as it goes
+                    claim = file_obj.claim_filter()
+                    publisher = PartialResultPublisher(file_id, settings.PARTIAL_RESULTS_INTERVAL, claim)
+                    
+                    try:
+                        with LeaseHeartbeat(file_obj, settings.FILE_LEASE_SECONDS / 4):
+                            with time_stage('parse', file_type, file_size), RSSWatch(settings.RSS_SAMPLE_INTERVAL) as rss:
+                                parsed_content = parse_file(
+                                    file_path, parser_type, on_progress=publisher,
+                                    token=parse_token(file_id, parser_type, claim), plan=plan,
+                                )
+                            TASK_PEAK_RSS.labels(file_type, plan.strategy).observe(rss.peak)
+                            
+                            # Encode up front so non-JSON-safe content fails here rather than in the DB write
+                            with time_stage('serialize', file_type, file_size):
+                                encoded = json.dumps(parsed_content, allow_nan=False)
+                            CONTENT_BYTES.labels(file_type).observe(len(encoded))
+                            
+                            with time_stage('save', file_type, file_size):
+                                saved = file_obj.mark_as_ready(parsed_content)
+                        TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'ready' if saved else 'superseded').inc()
+                        
+                    except ParseCancelled:
+                        # The cancel endpoint already set the status; the published partial result stays
+                        logger.info("Parsing of file %s stopped: cancelled", file_id)
+                        TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'cancelled').inc()
+                    
+                    except ParseTimedOut as timed_out:
+                        file_obj.mark_as_timed_out(str(timed_out), timed_out.snapshot)
+                        TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'timed_out').inc()
+                    
+                    except SoftTimeLimitExceeded:
+                        # Stopped by Celery between checkpoints; the published partial result stays
+                        file_obj.mark_as_timed_out(
+                            f"Parsing exceeded its time budget and was stopped after {self.soft_time_limit:g}s"
+                        )
+                        TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'timed_out').inc()
+                    
+                    except ParseMemoryExceeded as exceeded:
+                        # Fail this file rather than let the OOM killer take the whole worker
+                        file_obj.mark_as_failed(
+                            f"{exceeded} (planned {plan.strategy}, estimated {plan.estimated_bytes:,} bytes)"
+                        )
+                        TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'memory_exceeded').inc()
+                    
+                    except TRANSIENT_ERRORS:
+                        raise
+                    
+                    except Exception as parse_error:
+                        file_obj.mark_as_failed(str(parse_error))
+                        TASK_OUTCOMES.labels(file_type, size_bucket(file_size), 'failed').inc()
+            finally:
+                reservation.release()
+        finally:
+            local_file.release()
             
+    except Retry:
+        raise
     except File.DoesNotExist:
-        print(f"File with ID {file_id} not found")
+        logger.warning("File with ID %s not found", file_id)
+    except TRANSIENT_ERRORS as e:
+        logger.warning("Transient error processing file %s (retry %s): %s", file_id, self.request.retries, e)
+        if file_obj is not None and file_obj.claimed:
+            try:
+                # Let the retry reclaim the file straight away instead of waiting for the lease to lapse.
+                # Only this run's own claim: a duplicate that failed before claiming must not end a live lease
+                File.objects.filter(id=file_id, status='processing', **file_obj.claim_filter()).update(
+                    lease_expires_at=timezone.now()
+                )
+            except Exception:
+                pass
+        # Once retries run out the lease has lapsed, so reap_expired_leases picks the file up
+        raise self.retry(exc=e, countdown=retry_countdown(self.request.retries),
+                         max_retries=settings.FILE_TASK_MAX_RETRIES)
     except Exception as e:
-        print(f"Error processing file {file_id}: {str(e)}")
+        logger.exception("Error processing file %s", file_id)
+        # Before its claim this run may not touch a file that another worker is processing
+        claim = file_obj.claim_filter() if file_obj is not None and file_obj.claimed else {'status': 'uploading'}
         try:
-            file_obj = File.objects.get(id=file_id)
-            file_obj.mark_as_failed(str(e))
-        except:
-            pass
+            File.transition_id(file_id, 'failed', claim=claim, error_message=str(e), **File.content_fields(None))
+        except Exception:
+            logger.exception("Could not mark file %s as failed", file_id)
+
+
+@shared_task
+def reap_expired_leases():
+    """Requeue files whose worker stopped renewing its lease, or fail them after FILE_MAX_ATTEMPTS claims"""
+    now = timezone.now()
+    requeued = failed = 0
+    expired = File.objects.filter(status='processing', lease_expires_at__lt=now).values_list('id', 'attempts')
+    for file_id, attempts in expired:
+        # Conditional on the lease still being expired, so a late heartbeat or a parallel reaper wins
+        stale = File.objects.filter(id=file_id, status='processing', lease_expires_at__lt=now)
+        if attempts >= settings.FILE_MAX_ATTEMPTS:
+            with transaction.atomic():
+                if stale.update(
+                    status='failed', lease_expires_at=None, updated_at=now,
+                    error_message=f'Processing was interrupted {attempts} times (worker lost)',
+                    **File.content_fields(None)
+                ):
+                    WebhookDelivery.record([file_id], 'failed')
+                    failed += 1
+            continue
+        task_id = str(uuid.uuid4())
+        if stale.update(status='uploading', task_id=task_id, progress=0, lease_expires_at=None, updated_at=now):
+            # The shared queue rather than the storage node's, whose workers may be gone; any
+            # worker can stream the file from the node
+            process_file_upload.apply_async(args=[str(file_id)], kwargs={'enqueued_at': time.time()}, task_id=task_id)
+            requeued += 1
+    if requeued or failed:
+        logger.warning("Reaped expired leases: %s files requeued, %s failed", requeued, failed)
+    return f"Requeued {requeued} and failed {failed} files with expired leases"
+
+
+@shared_task
+def reprocess_files(file_ids):
+    """Requeue finished files to be parsed again (admin bulk action); files in progress are left alone"""
+    requeued = 0
+    finished = File.objects.filter(id__in=file_ids, status__in=REPROCESSABLE_STATUSES)
+    for file_id, storage_node in finished.values_list('id', 'storage_node'):
+        task_id = str(uuid.uuid4())
+        # Conditional, so a file requeued by someone else in the meantime is not queued twice
+        if File.objects.filter(id=file_id, status__in=REPROCESSABLE_STATUSES).update(
+            status='uploading', task_id=task_id, progress=0, attempts=0, error_message=None,
+            lease_expires_at=None, updated_at=timezone.now(), **File.content_fields(None)
+        ):
+            process_file_upload.apply_async(
+                args=[str(file_id)], kwargs={'enqueued_at': time.time()}, task_id=task_id,
+                queue=parse_queue(storage_node)
+            )
+            requeued += 1
+    return f"Requeued {requeued} of {len(file_ids)} files"
+
+
+def delete_in_background(queryset) -> DeletionJob:
+    """Mark the queryset's files deleted in one UPDATE and queue the reclamation of their storage
+    
+    The files disappear from the API at once. One reclaim task per storage node
+    then removes their uploads, derived files and rows in batches.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        job = DeletionJob.objects.create()
+        job.total = queryset.filter(deleted_at__isnull=True).update(
+            deleted_at=now, deletion_job=job, updated_at=now
+        )
+        job.save(update_fields=['total'])
+    if not job.total:
+        DeletionJob.objects.filter(id=job.id).update(status='done')
+        job.status = 'done'
+        return job
+    nodes = File.all_objects.filter(deletion_job=job).order_by().values_list('storage_node', flat=True).distinct()
+    for storage_node in nodes:
+        reclaim_deleted_files.apply_async(args=[str(job.id), storage_node], queue=parse_queue(storage_node))
+    return job
+
+
+@shared_task(acks_late=True)
+def reclaim_deleted_files(job_id: str, storage_node: str = None):
+    """Remove the stored files and rows of a deletion job's files on one storage node, batch by batch
+    
+    Safe to run again after a crash: each batch's rows are only removed once their storage is.
+    """
+    DeletionJob.objects.filter(id=job_id, status='pending').update(status='running', updated_at=timezone.now())
+    pending = File.all_objects.filter(deletion_job_id=job_id, storage_node=storage_node)
+    reclaimed = 0
+    while True:
+        batch = list(pending.only('id', 'file_path', 'file_size')[:settings.RECLAIM_BATCH_SIZE])
+        if not batch:
+            break
+        for file_obj in batch:
+            try:
+                file_obj.delete_file_from_storage()
+            except OSError as e:
+                logger.warning("Could not remove the stored file of %s: %s", file_obj.id, e)
+        File.all_objects.filter(id__in=[file_obj.id for file_obj in batch]).delete()
+        DeletionJob.objects.filter(id=job_id).update(
+            reclaimed=F('reclaimed') + len(batch),
+            reclaimed_bytes=F('reclaimed_bytes') + sum(file_obj.file_size for file_obj in batch),
+            updated_at=timezone.now(),
+        )
+        reclaimed += len(batch)
+    # The last node to finish completes the job
+    DeletionJob.objects.filter(id=job_id, reclaimed__gte=F('total')).update(status='done', updated_at=timezone.now())
+    return f"Reclaimed {reclaimed} files of deletion job {job_id}"
+
+
+@shared_task
+def apply_storage_lifecycle():
+    """Tier aged uploads on every storage node (scheduled by Celery beat)"""
+    if not settings.STORAGE_COMPRESS_AFTER_DAYS and not settings.STORAGE_COLD_AFTER_DAYS:
+        return "Storage lifecycle is disabled"
+    nodes = File.objects.filter(status__in=REPROCESSABLE_STATUSES).exclude(storage_tier='cold').order_by(
+    ).values_list('storage_node', flat=True).distinct()
+    for storage_node in nodes:
+        tier_aged_files.apply_async(args=[storage_node], queue=parse_queue(storage_node))
+    return f"Tiering files on {len(nodes)} nodes"
+
+
+@shared_task
+def tier_aged_files(storage_node: str = None):
+    """Compress finished uploads on this node untouched for STORAGE_COMPRESS_AFTER_DAYS, and move those
+    untouched for STORAGE_COLD_AFTER_DAYS to COLD_STORAGE_DIR"""
+    now = timezone.now()
+    finished = File.objects.filter(storage_node=storage_node, status__in=REPROCESSABLE_STATUSES)
+    policies = []
+    if settings.STORAGE_COLD_AFTER_DAYS and settings.COLD_STORAGE_DIR:
+        policies.append(('cold', ('hot', 'compressed'), settings.STORAGE_COLD_AFTER_DAYS))
+    if settings.STORAGE_COMPRESS_AFTER_DAYS:
+        policies.append(('compressed', ('hot',), settings.STORAGE_COMPRESS_AFTER_DAYS))
+    
+    moved = {}
+    for tier, sources, days in policies:
+        aged = finished.filter(storage_tier__in=sources, updated_at__lt=now - timedelta(days=days)).only(
+            'id', 'file_path', 'file_size', 'storage_tier', 'updated_at'
+        )[:settings.STORAGE_LIFECYCLE_BATCH]
+        for file_obj in aged:
+            try:
+                new_path = write_tier(file_obj, tier)
+            except OSError as e:
+                logger.warning("Could not move file %s to the %s tier: %s", file_obj.id, tier, e)
+                continue
+            # Conditional on the file being unchanged since it was read, so an append or
+            # reprocess in the meantime keeps its tier and nothing it wrote is lost
+            if File.objects.filter(
+                id=file_obj.id, storage_tier=file_obj.storage_tier, status__in=REPROCESSABLE_STATUSES,
+                updated_at=file_obj.updated_at, file_size=file_obj.file_size,
+            ).update(storage_tier=tier):
+                remove_tier(file_obj, file_obj.storage_tier)
+                moved[tier] = moved.get(tier, 0) + 1
+            else:
+                os.remove(new_path)
+    return f"Moved {moved.get('compressed', 0)} files to compressed and {moved.get('cold', 0)} to cold storage"
+
+
+def webhook_retry_delay(attempts: int) -> int:
+    """Seconds before another attempt at a webhook that has failed ``attempts`` times"""
+    return get_exponential_backoff_interval(
+        factor=settings.WEBHOOK_RETRY_BACKOFF, retries=attempts - 1,
+        maximum=settings.WEBHOOK_RETRY_BACKOFF_MAX, full_jitter=True,
+    )
+
+
+@shared_task
+def deliver_webhooks():
+    """Send the webhooks that are due, one request per callback URL and batch
+    
+    Routed to WEBHOOK_QUEUE; queued when a file finishes and swept by Celery beat
+    for retries. Deliveries are claimed with SKIP LOCKED, so parallel runs never
+    send the same one, and a claim lapses if its worker dies while sending.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = list(
+            WebhookDelivery.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:settings.WEBHOOK_CLAIM_SIZE]
+        )
+        by_url = {}
+        for delivery in due:
+            by_url.setdefault(delivery.url, []).append(delivery)
+        batches = [
+            deliveries[start:start + settings.WEBHOOK_BATCH_SIZE]
+            for deliveries in by_url.values()
+            for start in range(0, len(deliveries), settings.WEBHOOK_BATCH_SIZE)
+        ]
+        # Long enough to send every batch, even if each one times out
+        claimed_until = now + timedelta(seconds=settings.WEBHOOK_TIMEOUT * (len(batches) + 1))
+        WebhookDelivery.objects.filter(id__in=[delivery.id for delivery in due]).update(
+            attempts=F('attempts') + 1, next_attempt_at=claimed_until
+        )
+    
+    delivered = retried = failed = 0
+    for batch in batches:
+        url = batch[0].url
+        try:
+            post_webhook(url, [delivery.as_event() for delivery in batch])
+        except WebhookError as e:
+            logger.warning("Webhook delivery of %s events to %s failed: %s", len(batch), url, e)
+            for delivery in batch:
+                attempts = delivery.attempts + 1
+                # A URL pointing inside the cluster is not retried
+                if attempts >= settings.WEBHOOK_MAX_ATTEMPTS or isinstance(e, UnsafeWebhookURL):
+                    fields = {'status': 'failed'}
+                    failed += 1
+                else:
+                    fields = {'next_attempt_at': timezone.now() + timedelta(seconds=webhook_retry_delay(attempts))}
+                    retried += 1
+                WebhookDelivery.objects.filter(id=delivery.id).update(last_error=str(e), **fields)
+            continue
+        WebhookDelivery.objects.filter(id__in=[delivery.id for delivery in batch]).update(
+            status='delivered', delivered_at=timezone.now(), last_error=''
+        )
+        delivered += len(batch)
+    return f"Delivered {delivered} webhooks; {retried} will be retried and {failed} gave up"
 
 
 @shared_task
@@ -55,18 +498,14 @@ def cleanup_failed_files():
         created_at__lt=cutoff_time
     )
     
-    for file_obj in failed_files:
-        file_obj.delete_file_from_storage()
-        file_obj.delete()
+    # Reclaimed on each file's storage node, where the stored files are
+    job = delete_in_background(failed_files)
     
-    return f"Cleaned up {failed_files.count()} failed files"
+    return f"Cleaned up {job.total} failed files"
 
 
 @shared_task
 def update_file_progress(file_id: str, progress: int):
     """Update file progress"""
-    try:
-        file_obj = File.objects.get(id=file_id)
-        file_obj.update_progress(progress)
-    except File.DoesNotExist:
-        print(f"File with ID {file_id} not found")
+    if not File(id=file_id).update_progress(progress):
+        logger.info("Progress of file %s not updated (missing, finished or already at %s%% or more)", file_id, progress)
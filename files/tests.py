@@ -1,6 +1,7 @@
+import io
 import os
 import tempfile
-from django.test import TestCase, Client
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, Client, override_settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -58,12 +59,25 @@ class FileModelTest(TestCase):
         file_obj.mark_as_ready({"data": "test"})
         self.assertEqual(file_obj.status, "ready")
         self.assertEqual(file_obj.progress, 100)
-        self.assertEqual(file_obj.parsed_content, {"data": "test"})
+        self.assertEqual(file_obj.content, {"data": "test"})
+        
+        # A ready file can no longer be marked as failed or reprocessed
+        self.assertFalse(file_obj.mark_as_failed("Test error"))
+        self.assertFalse(file_obj.mark_as_processing())
+        file_obj.refresh_from_db()
+        self.assertEqual(file_obj.status, "ready")
         
         # Test mark as failed
-        file_obj.mark_as_failed("Test error")
-        self.assertEqual(file_obj.status, "failed")
-        self.assertEqual(file_obj.error_message, "Test error")
+        other = File.objects.create(
+            filename="other.csv",
+            original_filename="other.csv",
+            file_path=self.test_file,
+            file_size=100,
+            file_type="csv"
+        )
+        self.assertTrue(other.mark_as_failed("Test error"))
+        self.assertEqual(other.status, "failed")
+        self.assertEqual(other.error_message, "Test error")
     
     def test_file_extension(self):
         """Test file extension extraction"""
@@ -217,11 +231,17 @@ class FileAPITest(APITestCase):
             file_type="csv"
         )
         
+        from unittest import mock
+        from .tasks import reclaim_deleted_files
+        
         delete_url = reverse('files:file-delete', kwargs={'file_id': file_obj.id})
-        response = self.client.delete(delete_url)
+        with mock.patch.object(reclaim_deleted_files, 'apply_async') as reclaim:
+            response = self.client.delete(delete_url)
         
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(File.objects.filter(id=file_obj.id).exists())
+        reclaim_deleted_files(*reclaim.call_args.kwargs['args'])
+        self.assertFalse(File.all_objects.filter(id=file_obj.id).exists())
     
     def test_file_not_found(self):
         """Test endpoints with non-existent file ID"""
@@ -242,3 +262,1835 @@ class FileAPITest(APITestCase):
         delete_url = reverse('files:file-delete', kwargs={'file_id': fake_id})
         response = self.client.delete(delete_url)
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LoadTestSummaryTest(TestCase):
+    """Test cases for the load_test command statistics"""
+    
+    def test_percentiles(self):
+        """Test percentile interpolation and summaries"""
+        from .management.commands.load_test import percentile, summarize
+        
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50.5)
+        self.assertAlmostEqual(percentile(samples, 99), 99.01)
+        self.assertEqual(percentile([7], 95), 7)
+        self.assertIsNone(percentile([], 50))
+        
+        summary = summarize([10, 20, 30])
+        self.assertEqual(summary['count'], 3)
+        self.assertEqual(summary['p50'], 20)
+        self.assertEqual(summary['max'], 30)
+        self.assertIsNone(summarize([])['p99'])
+
+
+class MetricsTest(TestCase):
+    """Test cases for metrics collection and the /metrics endpoint"""
+    
+    def test_metrics_endpoint_records_views(self):
+        """Test that API requests show up on /metrics"""
+        self.client.get(reverse('files:health-check'))
+        response = self.client.get(reverse('metrics'))
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn('file_parser_view_requests_total{method="GET",status="200",view="health-check"}', body)
+        self.assertIn('file_parser_stage_duration_seconds', body)
+    
+    def test_csv_parse_is_json_safe(self):
+        """Test that parsed CSV content survives strict JSON encoding"""
+        import json
+        from .parsers import parse_file
+        
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+            f.write("Name,Age\nJohn,30\nJane,\n")
+        try:
+            parsed = parse_file(f.name, 'csv')
+        finally:
+            os.remove(f.name)
+        
+        json.dumps(parsed, allow_nan=False)
+        self.assertIsNone(parsed['data'][1]['Age'])
+        self.assertIsInstance(parsed['summary']['memory_usage'], int)
+    
+    def test_sampling_profiler_dumps_slow_runs(self):
+        """Test that the profiler writes collapsed stacks past its threshold"""
+        import time
+        from .metrics import SamplingProfiler
+        
+        with tempfile.TemporaryDirectory() as output_dir:
+            with SamplingProfiler('slow', interval=0.001, threshold=0, output_dir=output_dir) as profiler:
+                time.sleep(0.05)
+            
+            self.assertIsNotNone(profiler.report_path)
+            with open(profiler.report_path) as f:
+                self.assertIn('test_sampling_profiler_dumps_slow_runs', f.read())
+
+
+class ParserRegistryTest(TestCase):
+    """Test cases for the lazy parser plugin registry"""
+    
+    def test_lookup_by_extension_and_mime_type(self):
+        """Test parser lookup by extension with MIME type fallback"""
+        from .parsers import registry, CSVParser, ExcelParser, TXTParser, get_parser
+        
+        self.assertIs(registry.get('CSV'), CSVParser)
+        self.assertIs(registry.get('.xls'), ExcelParser)
+        self.assertIs(registry.get('log', 'text/plain; charset=utf-8'), TXTParser)
+        self.assertIsNone(registry.get('exe', 'application/octet-stream'))
+        self.assertEqual(registry.extensions(), ['csv', 'xlsx', 'xls', 'pdf', 'txt'])
+        with self.assertRaises(ValueError):
+            get_parser('test.exe', 'exe')
+    
+    def test_web_startup_does_not_import_parser_dependencies(self):
+        """Test that loading the URLconf and views leaves pandas unimported"""
+        import subprocess
+        import sys
+        
+        script = (
+            "import sys, django; django.setup(); import file_parser.urls; "
+            "print('pandas' in sys.modules, 'PyPDF2' in sys.modules)"
+        )
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'file_parser.settings')
+        result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'False False')
+
+
+class CSVParallelParseTest(TestCase):
+    """Test cases for byte-range parallel CSV parsing"""
+    
+    def setUp(self):
+        """Write a CSV whose quoted fields contain newlines, commas and quotes"""
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='') as f:
+            f.write('id,note,score\n')
+            for i in range(500):
+                note = f'"line {i}\nstill, ""quoted"" {i}"' if i % 7 == 0 else f'plain {i}'
+                score = '' if i % 11 == 0 else f'{i * 1.5}'
+                f.write(f'{i},{note},{score}\n')
+        self.path = f.name
+    
+    def tearDown(self):
+        os.remove(self.path)
+    
+    def test_ranges_end_on_record_boundaries(self):
+        """Test that no byte range starts inside a quoted field"""
+        from .csv_parallel import split_records
+        
+        header_end, ranges = split_records(self.path, 16)
+        self.assertGreater(len(ranges), 1)
+        self.assertEqual(ranges[0][0], header_end)
+        self.assertEqual(ranges[-1][1], os.path.getsize(self.path))
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for start, end in ranges:
+            self.assertEqual(data[start - 1:start], b'\n')
+            self.assertEqual(data[start:end].count(b'"') % 2, 0)
+    
+    def test_parallel_parse_matches_sequential(self):
+        """Test that the parallel path produces the same result as one read_csv"""
+        from django.test import override_settings
+        from .parsers import CSVParser
+        
+        with override_settings(CSV_PARALLEL_WORKERS=1):
+            sequential = CSVParser(self.path).parse()
+        with override_settings(CSV_PARALLEL_THRESHOLD=0, CSV_PARALLEL_WORKERS=2, CSV_PARALLEL_CHUNK_SIZE=2048):
+            parallel = CSVParser(self.path).parse()
+        
+        self.assertGreater(parallel['summary'].pop('parallel_chunks'), 2)
+        self.assertEqual(parallel, sequential)
+
+
+class AsyncViewsTest(TestCase):
+    """Test cases for the native async read endpoints"""
+    
+    def setUp(self):
+        """Set up test data"""
+        from django.test import AsyncRequestFactory
+        self.factory = AsyncRequestFactory()
+        self.file_obj = File.objects.create(
+            filename="test.csv",
+            original_filename="test.csv",
+            file_path=SimpleUploadedFile("test.csv", b"Name,Age\nJohn,30"),
+            file_size=100,
+            file_type="csv",
+            status="ready",
+            progress=100,
+            parsed_content={"type": "csv", "rows": 1}
+        )
+    
+    def call(self, view, *args):
+        from asgiref.sync import async_to_sync
+        return async_to_sync(view)(self.factory.get('/'), *args)
+    
+    def test_progress_detail_and_list(self):
+        """Test async views return the same payloads as the DRF views"""
+        import json
+        from . import async_views
+        
+        response = self.call(async_views.file_progress, self.file_obj.id)
+        self.assertEqual(json.loads(response.content), {
+            'id': str(self.file_obj.id), 'status': 'ready', 'progress': 100
+        })
+        
+        response = self.call(async_views.file_detail, self.file_obj.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content)['parsed_content']['rows'], 1)
+        
+        response = self.call(async_views.file_list)
+        self.assertEqual([item['id'] for item in json.loads(response.content)], [str(self.file_obj.id)])
+    
+    def test_not_found(self):
+        """Test async views with non-existent file ID"""
+        import uuid
+        from . import async_views
+        
+        self.assertEqual(self.call(async_views.file_progress, uuid.uuid4()).status_code, 404)
+        self.assertEqual(self.call(async_views.file_detail, uuid.uuid4()).status_code, 404)
+
+
+class ConnectionPoolTest(TestCase):
+    """Test cases for the shared connection pool"""
+    
+    class FakeConnection:
+        def __init__(self, healthy=True):
+            self.healthy = healthy
+            self.closed = False
+        
+        def close(self):
+            self.closed = True
+    
+    def make_pool(self, **kwargs):
+        from .connections import ConnectionPool
+        options = {'max_size': 2, 'timeout': 0.05, 'check_interval': 0}
+        options.update(kwargs)
+        return ConnectionPool(
+            connect=lambda: self.FakeConnection(),
+            check=lambda conn: conn.healthy,
+            **options
+        )
+    
+    def test_reuses_and_health_checks_connections(self):
+        """Test that released connections are reused unless unhealthy"""
+        pool = self.make_pool()
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        
+        first.healthy = False
+        pool.release(first)
+        replacement = pool.acquire()
+        self.assertIsNot(replacement, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.stats()['in_use'], 1)
+    
+    def test_checkout_times_out_when_exhausted(self):
+        """Test that the pool never exceeds max_size"""
+        from .connections import PoolTimeout
+        pool = self.make_pool()
+        pool.acquire()
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+    
+    def test_worker_logs_backend_health(self):
+        """Test that the worker's startup health report goes through logging, at error level when unhealthy"""
+        from unittest import mock
+        from file_parser.celery import check_connections
+        from .connections import connection_manager
+        
+        results = {
+            'postgres': {'healthy': True, 'latency_ms': 1.5},
+            'redis': {'healthy': False, 'error': 'Connection refused'},
+        }
+        with mock.patch.object(connection_manager, 'check', return_value=results):
+            with self.assertLogs('file_parser.celery', 'INFO') as logs:
+                check_connections()
+        self.assertEqual(logs.output, [
+            'INFO:file_parser.celery:postgres: healthy (1.5 ms)',
+            'ERROR:file_parser.celery:redis: UNHEALTHY - Connection refused',
+        ])
+
+
+class FileAppendTest(APITestCase):
+    """Test cases for appending rows to a tabular file"""
+    
+    def setUp(self):
+        """Set up a parsed CSV file"""
+        from .parsers import parse_file
+        self.file_obj = File.objects.create(
+            filename="data.csv",
+            original_filename="data.csv",
+            file_path=SimpleUploadedFile("data.csv", b"name,score\na,1\nb,2\n"),
+            file_size=20,
+            file_type="csv",
+            status="ready",
+            progress=100
+        )
+        self.file_obj.content = parse_file(self.file_obj.file_path.path, 'csv')
+        self.file_obj.save()
+        self.append_url = reverse('files:file-append', kwargs={'file_id': self.file_obj.id})
+    
+    def tearDown(self):
+        self.file_obj.delete_file_from_storage()
+    
+    def test_append_rows_updates_counts_and_stats(self):
+        """Test that appended rows are folded into the stored summary"""
+        from .parsers import parse_file
+        
+        response = self.client.post(
+            self.append_url, {'rows': [['c', 3], {'name': 'd', 'score': 4.5}]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['rows_appended'], 2)
+        self.assertEqual(response.json()['total_rows'], 4)
+        
+        self.file_obj.refresh_from_db()
+        reparsed = parse_file(self.file_obj.file_path.path, 'csv')
+        self.assertEqual(self.file_obj.parsed_content['rows'], reparsed['rows'])
+        self.assertEqual(self.file_obj.parsed_content['summary']['column_stats'], reparsed['summary']['column_stats'])
+        self.assertEqual(len(self.file_obj.content['data']), 4)
+        self.assertEqual(self.file_obj.file_size, os.path.getsize(self.file_obj.file_path.path))
+    
+    def test_append_csv_upload(self):
+        """Test appending a CSV upload whose header matches the stored columns"""
+        delta = SimpleUploadedFile("delta.csv", b"name,score\ne,5\n")
+        response = self.client.post(self.append_url, {'file': delta}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['total_rows'], 3)
+    
+    def test_append_rejects_mismatched_columns(self):
+        """Test that rows not matching the stored columns leave the file untouched"""
+        size = os.path.getsize(self.file_obj.file_path.path)
+        response = self.client.post(self.append_url, {'rows': [{'name': 'x', 'age': 1}]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.append_url, {'rows': [['x', 1, 2]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(os.path.getsize(self.file_obj.file_path.path), size)
+    
+    def test_append_requires_csv(self):
+        """Test that non-tabular files cannot be appended to"""
+        self.file_obj.file_type = 'txt'
+        self.file_obj.save()
+        response = self.client.post(self.append_url, {'rows': [['x', 1]]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class PartialResultsTest(APITestCase):
+    """Test cases for partial results published while a file is parsing"""
+    
+    def setUp(self):
+        """Set up a CSV file that is still processing"""
+        rows = ''.join(f'{i},{i % 5}\n' for i in range(5000))
+        self.file_obj = File.objects.create(
+            filename="big.csv",
+            original_filename="big.csv",
+            file_path=SimpleUploadedFile("big.csv", f"id,group\n{rows}".encode()),
+            file_size=len(rows) + 9,
+            file_type="csv",
+            status="processing",
+        )
+    
+    def tearDown(self):
+        self.file_obj.delete_file_from_storage()
+    
+    def test_csv_parser_publishes_refined_snapshots(self):
+        """Test that chunked CSV parsing reports snapshots with a row estimate"""
+        from django.test import override_settings
+        from .parsers import parse_file
+        
+        reports = []
+        with override_settings(CSV_READ_CHUNK_SIZE=1, CSV_PARALLEL_WORKERS=1):
+            parsed = parse_file(self.file_obj.file_path.path, 'csv', on_progress=lambda *args: reports.append(args))
+        
+        self.assertEqual(parsed['rows'], 5000)
+        self.assertEqual(len(reports), 5)
+        first_fraction, first = reports[0]
+        self.assertEqual(first['column_names'], ['id', 'group'])
+        self.assertEqual(first['rows'], 1000)
+        self.assertEqual(len(first['data']), 100)
+        self.assertAlmostEqual(first['summary']['estimated_total_rows'], 5000, delta=500)
+        self.assertEqual([snapshot['rows'] for _, snapshot in reports], [1000, 2000, 3000, 4000, 5000])
+        self.assertNotIn('estimated_total_rows', parsed['summary'])
+    
+    def test_detail_serves_partial_result_with_monotonic_progress(self):
+        """Test that published snapshots show up on the detail endpoint flagged as partial"""
+        from .tasks import PartialResultPublisher
+        
+        detail_url = reverse('files:file-detail', kwargs={'file_id': self.file_obj.id})
+        self.assertNotIn('partial', self.client.get(detail_url).json())
+        
+        publisher = PartialResultPublisher(str(self.file_obj.id), interval=0)
+        publisher(0.4, {'type': 'csv', 'rows': 1000})
+        publisher(0.2)
+        publisher(1.0)
+        
+        response = self.client.get(detail_url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response.json()['partial'])
+        self.assertEqual(response.json()['parsed_content']['rows'], 1000)
+        self.assertEqual(response.json()['progress'], 99)
+
+
+class CompressedContentTest(TestCase):
+    """Test cases for compressed parsed_content storage"""
+    
+    def setUp(self):
+        """Set up a file with records-style parsed content"""
+        self.content = {
+            'type': 'csv',
+            'rows': 300,
+            'column_names': ['name', 'score'],
+            'data': [{'name': f'row {i}', 'score': i / 2 if i % 3 else None} for i in range(300)],
+            'summary': {'total_rows': 300},
+        }
+        self.file_obj = File.objects.create(
+            filename="data.csv",
+            original_filename="data.csv",
+            file_path="uploads/data.csv",
+            file_size=100,
+            file_type="csv",
+            status="ready",
+        )
+    
+    def test_bulky_keys_are_compressed_and_decoded_lazily(self):
+        """Test that previews move to the blob while light keys stay queryable"""
+        self.file_obj.content = self.content
+        self.file_obj.save()
+        
+        self.assertEqual(File.objects.filter(parsed_content__rows=300).count(), 1)
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertNotIn('data', file_obj.parsed_content)
+        self.assertIsNone(file_obj.__dict__.get('_decoded_content'))
+        self.assertEqual(file_obj.content, self.content)
+        self.assertEqual(list(file_obj.content), list(self.content))
+    
+    def test_recompress_command_rewrites_legacy_rows(self):
+        """Test that the command compresses uncompressed rows and reports savings"""
+        from io import StringIO
+        from django.core.management import call_command
+        
+        File.objects.filter(id=self.file_obj.id).update(parsed_content=self.content)
+        output = StringIO()
+        call_command('recompress_parsed_content', batch_size=1, stdout=output)
+        
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertIsNotNone(file_obj.parsed_content_blob)
+        self.assertEqual(file_obj.content, self.content)
+        self.assertIn('Rewrote 1 of 1 rows', output.getvalue())
+        self.assertIn('% saved', output.getvalue())
+
+
+class LayoutNegotiationTest(APITestCase):
+    """Test cases for split/columnar layouts, the rows endpoint and Arrow output"""
+    
+    def setUp(self):
+        """Set up a ready CSV file with parsed content"""
+        from .parsers import parse_file
+        self.file_obj = File.objects.create(
+            filename="wide.csv",
+            original_filename="wide.csv",
+            file_path=SimpleUploadedFile("wide.csv", b'name,score,city\na,1,"Berlin, DE"\nb,,Paris\nc,3.5,Tokyo\n'),
+            file_size=60,
+            file_type="csv",
+            status="ready",
+            progress=100
+        )
+        self.file_obj.content = parse_file(self.file_obj.file_path.path, 'csv')
+        self.file_obj.save()
+        self.detail_url = reverse('files:file-detail', kwargs={'file_id': self.file_obj.id})
+        self.rows_url = reverse('files:file-rows', kwargs={'file_id': self.file_obj.id})
+    
+    def tearDown(self):
+        self.file_obj.delete_file_from_storage()
+    
+    def test_detail_layouts_match_records(self):
+        """Test that split and columnar layouts carry the same values, compressed or not"""
+        records = self.client.get(self.detail_url).json()['parsed_content']['data']
+        columns = ['name', 'score', 'city']
+        expected_rows = [[record[column] for column in columns] for record in records]
+        
+        for compression in ('zstd', 'none'):
+            with self.settings(PARSED_CONTENT_COMPRESSION=compression):
+                File.objects.filter(id=self.file_obj.id).update(**File.content_fields(self.file_obj.content))
+                split = self.client.get(self.detail_url, {'layout': 'split'}).json()['parsed_content']['data']
+                columnar = self.client.get(
+                    self.detail_url, HTTP_ACCEPT='application/json; layout=columnar'
+                ).json()['parsed_content']['data']
+            self.assertEqual(split, {'columns': columns, 'data': expected_rows})
+            self.assertEqual(columnar, {'columns': columns, 'data': [list(col) for col in zip(*expected_rows)]})
+        
+        self.assertEqual(self.client.get(self.detail_url, {'layout': 'rows'}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_rows_endpoint_pages_through_file(self):
+        """Test that the rows endpoint reads pages straight from the file"""
+        response = self.client.get(self.rows_url, {'offset': 1, 'limit': 5, 'layout': 'split'})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response.json()['data'], {
+            'columns': ['name', 'score', 'city'],
+            'data': [['b', None, 'Paris'], ['c', 3.5, 'Tokyo']],
+        })
+        self.assertEqual(self.client.get(self.rows_url, {'limit': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_arrow_stream_output(self):
+        """Test that ?format=arrow returns an Arrow IPC stream of the preview"""
+        from .layouts import arrow_available
+        if not arrow_available():
+            self.skipTest('pyarrow is not installed')
+        import pyarrow as pa
+        
+        response = self.client.get(self.detail_url, {'format': 'arrow'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.apache.arrow.stream')
+        table = pa.ipc.open_stream(response.content).read_all()
+        self.assertEqual(table.column_names, ['name', 'score', 'city'])
+        self.assertEqual(table.column('score').to_pylist(), [1.0, None, 3.5])
+        
+        response = self.client.get(self.rows_url, {'format': 'arrow', 'offset': 2})
+        self.assertEqual(pa.ipc.open_stream(response.content).read_all().column('city').to_pylist(), ['Tokyo'])
+
+
+class SparseFieldsTest(APITestCase):
+    """Test cases for ?fields= and ?content_paths= on the detail endpoint"""
+    
+    def setUp(self):
+        """Set up a ready file with compressed parsed content"""
+        self.file_obj = File.objects.create(
+            filename="data.csv",
+            original_filename="data.csv",
+            file_path="uploads/data.csv",
+            file_size=100,
+            file_type="csv",
+            status="ready",
+            progress=100
+        )
+        self.file_obj.content = {
+            'type': 'csv',
+            'rows': 2,
+            'column_names': ['a'],
+            'data': [{'a': 1}, {'a': 2}],
+            'summary': {'total_rows': 2, 'total_columns': 1},
+        }
+        self.file_obj.save()
+        self.detail_url = reverse('files:file-detail', kwargs={'file_id': self.file_obj.id})
+    
+    def test_content_paths_are_extracted_by_the_database(self):
+        """Test that only requested fields and JSON paths are loaded and returned"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.detail_url, {
+                'fields': 'id,status', 'content_paths': 'summary.total_rows,column_names'
+            })
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.json()), {'id', 'status', 'parsed_content'})
+        self.assertEqual(response.json()['parsed_content'], {'summary': {'total_rows': 2}, 'column_names': ['a']})
+        # The blob is only tested for NULL, never selected
+        sql = queries[0]['sql']
+        self.assertEqual(sql.count('parsed_content_blob'), sql.count('parsed_content_blob" IS NOT NULL'))
+        self.assertNotIn('original_filename', sql)
+    
+    def test_bulky_paths_and_validation(self):
+        """Test that paths into compressed previews still resolve and bad fields are rejected"""
+        response = self.client.get(self.detail_url, {'content_paths': 'data', 'layout': 'split'})
+        self.assertEqual(response.json()['parsed_content'], {'data': {'columns': ['a'], 'data': [[1], [2]]}})
+        self.assertIn('original_filename', response.json())
+        
+        response = self.client.get(self.detail_url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StatusTransitionTest(TransactionTestCase):
+    """Test cases for compare-and-set status transitions under concurrency"""
+    
+    def setUp(self):
+        """Set up an uploaded file"""
+        self.file_obj = File.objects.create(
+            filename="race.csv",
+            original_filename="race.csv",
+            file_path="uploads/race.csv",
+            file_size=100,
+            file_type="csv",
+        )
+    
+    def race(self, action, workers=12):
+        """Run action(worker_index) in many threads released at the same moment"""
+        import threading
+        from django.db import connection
+        
+        barrier = threading.Barrier(workers)
+        results = [None] * workers
+        
+        def run(index):
+            try:
+                barrier.wait()
+                results[index] = action(index)
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    def test_only_one_worker_claims_the_file(self):
+        """Test that racing workers claim, then finish, the file exactly once"""
+        claims = self.race(lambda index: File.objects.get(id=self.file_obj.id).mark_as_processing())
+        self.assertEqual(claims.count(True), 1)
+        
+        finishes = self.race(lambda index: File.transition_id(self.file_obj.id, 'ready', progress=100))
+        self.assertEqual(finishes.count(True), 1)
+        
+        # A stale worker retrying afterwards cannot move the file back
+        self.assertFalse(self.file_obj.mark_as_processing())
+        self.assertEqual(File.objects.get(id=self.file_obj.id).status, 'ready')
+    
+    def test_progress_is_monotonic(self):
+        """Test that concurrent progress updates never lower progress"""
+        self.file_obj.mark_as_processing()
+        self.race(lambda index: File(id=self.file_obj.id).update_progress(index * 8))
+        
+        self.assertEqual(File.objects.get(id=self.file_obj.id).progress, 88)
+        self.assertFalse(File(id=self.file_obj.id).update_progress(40))
+
+
+class CancellationTest(APITestCase):
+    """Test cases for cancelling files and time-budgeted parsing"""
+    
+    def setUp(self):
+        """Set up an uploaded CSV file that has not been processed yet"""
+        rows = ''.join(f'{i},{i % 5}\n' for i in range(5000))
+        self.file_obj = File.objects.create(
+            filename="slow.csv",
+            original_filename="slow.csv",
+            file_path=SimpleUploadedFile("slow.csv", f"id,group\n{rows}".encode()),
+            file_size=len(rows) + 9,
+            file_type="csv",
+            task_id="queued-task",
+        )
+    
+    def tearDown(self):
+        self.file_obj.delete_file_from_storage()
+    
+    def test_cancel_revokes_queued_task(self):
+        """Test that cancelling revokes the task, which then leaves the file alone"""
+        from unittest import mock
+        from .tasks import process_file_upload
+        
+        cancel_url = reverse('files:file-cancel', kwargs={'file_id': self.file_obj.id})
+        with mock.patch.object(process_file_upload.app.control, 'revoke') as revoke:
+            response = self.client.post(cancel_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['status'], 'cancelled')
+        revoke.assert_called_once_with('queued-task')
+        
+        # A delivery that slipped through the revoke cannot claim the file
+        process_file_upload(str(self.file_obj.id))
+        self.assertEqual(File.objects.get(id=self.file_obj.id).status, 'cancelled')
+        self.assertEqual(self.client.post(cancel_url).status_code, status.HTTP_409_CONFLICT)
+    
+    def test_parse_stops_at_checkpoint_with_partial_result(self):
+        """Test that a cancelled parse stops between chunks, keeping the snapshot it got to"""
+        from django.test import override_settings
+        from .parsers import CancellationToken, ParseCancelled, parse_file
+        
+        token = CancellationToken(is_cancelled=lambda: True, check_interval=0)
+        with override_settings(CSV_READ_CHUNK_SIZE=1, CSV_PARALLEL_WORKERS=1):
+            with self.assertRaises(ParseCancelled) as raised:
+                parse_file(self.file_obj.file_path.path, 'csv', token=token)
+        self.assertEqual(raised.exception.snapshot['rows'], 1000)
+    
+    def test_time_budget_marks_file_timed_out(self):
+        """Test that running past the budget stores the partial result with status timed_out"""
+        from django.test import override_settings
+        from .tasks import process_file_upload
+        
+        with override_settings(CSV_READ_CHUNK_SIZE=1, CSV_PARALLEL_WORKERS=1, PARSE_TIME_BUDGETS={'csv': 1e-6}):
+            process_file_upload(str(self.file_obj.id))
+        
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual(file_obj.status, 'timed_out')
+        self.assertIn('time budget', file_obj.error_message)
+        self.assertEqual(file_obj.content['rows'], 1000)
+        
+        response = self.client.get(reverse('files:file-detail', kwargs={'file_id': self.file_obj.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()['partial'])
+        self.assertEqual(response.json()['parsed_content']['rows'], 1000)
+    
+    def test_soft_time_limit_marks_file_timed_out(self):
+        """Test that Celery's soft time limit, the backstop for parses stuck between checkpoints, times the file out"""
+        from unittest import mock
+        from celery.exceptions import SoftTimeLimitExceeded
+        from django.conf import settings
+        from .tasks import process_file_upload
+        
+        self.assertEqual(
+            process_file_upload.soft_time_limit,
+            max(settings.PARSE_TIME_BUDGETS.values()) + settings.PARSE_SOFT_TIME_LIMIT_GRACE
+        )
+        with mock.patch('files.tasks.parse_file', side_effect=SoftTimeLimitExceeded()):
+            process_file_upload(str(self.file_obj.id))
+        
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual(file_obj.status, 'timed_out')
+        self.assertIn('time budget', file_obj.error_message)
+
+
+class MemoryPlanTest(TestCase):
+    """Test cases for memory-aware parse planning and admission"""
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        import shutil
+        shutil.rmtree(self.tmp_dir)
+    
+    def test_large_workbook_is_parsed_through_a_sidecar_csv(self):
+        """Test that an xlsx over budget is streamed via a CSV and summarized like a full load"""
+        import pandas as pd
+        from .memory import plan_parse
+        from .parsers import parse_file
+        
+        path = os.path.join(self.tmp_dir, 'book.xlsx')
+        with pd.ExcelWriter(path) as writer:
+            people = pd.DataFrame({'id': range(300), 'name': [f'n{i}' for i in range(300)]})
+            people.to_excel(writer, sheet_name='A', index=False)
+            pd.DataFrame({'score': [1.5, None, 3.0]}).to_excel(writer, sheet_name='B', index=False)
+        size = os.path.getsize(path)
+        
+        self.assertEqual(plan_parse(path, 'xlsx', size, budget=size * 100).strategy, 'full')
+        plan = plan_parse(path, 'xlsx', size, budget=size)
+        self.assertEqual(plan.strategy, 'sidecar')
+        
+        streamed = parse_file(path, 'xlsx', plan=plan)
+        self.assertEqual(streamed, parse_file(path, 'xlsx'))
+        self.assertEqual(streamed['summary']['total_rows'], 303)
+        self.assertEqual(os.listdir(self.tmp_dir), ['book.xlsx'])
+    
+    def test_huge_sheet_is_streamed_and_can_be_cancelled_within_it(self):
+        """Test that an xlsx with a sheet over the size threshold is streamed, checking the token between row batches"""
+        import pandas as pd
+        from django.test import override_settings
+        from .memory import plan_parse
+        from .parsers import CancellationToken, ParseCancelled, parse_file
+        
+        path = os.path.join(self.tmp_dir, 'book.xlsx')
+        pd.DataFrame({'id': range(300)}).to_excel(path, sheet_name='A', index=False)
+        size = os.path.getsize(path)
+        with override_settings(EXCEL_STREAM_SHEET_SIZE=1):
+            plan = plan_parse(path, 'xlsx', size, budget=size * 100)
+        self.assertEqual(plan.strategy, 'sidecar')
+        
+        polls = []
+        token = CancellationToken(is_cancelled=lambda: polls.append(1) or len(polls) >= 2, check_interval=0)
+        with override_settings(EXCEL_STREAM_BATCH_ROWS=100):
+            with self.assertRaises(ParseCancelled):
+                parse_file(path, 'xlsx', token=token, plan=plan)
+        # Stopped after the second of four batches, before the sheet was finished
+        self.assertEqual(len(polls), 2)
+        self.assertEqual(os.listdir(self.tmp_dir), ['book.xlsx'])
+    
+    def test_csv_plan_and_admission_fit_the_budget(self):
+        """Test that CSV chunks shrink to the budget and reservations beyond it are deferred"""
+        from django.test import override_settings
+        from .memory import MIN_CHUNK_SIZE, MemoryReservation, plan_parse
+        
+        path = os.path.join(self.tmp_dir, 'data.csv')
+        with open(path, 'w') as file:
+            file.write('id,name\n' + ''.join(f'{i},name{i}\n' for i in range(2000)))
+        
+        with override_settings(CSV_READ_CHUNK_SIZE=64 * 1024 * 1024, CSV_PARALLEL_THRESHOLD=0,
+                               CSV_PARALLEL_WORKERS=4):
+            plan = plan_parse(path, 'csv', 10 ** 9, budget=4 * MIN_CHUNK_SIZE)
+        self.assertEqual(plan.strategy, 'chunked')
+        self.assertFalse(plan.parallel)
+        self.assertLess(plan.chunk_size, 4 * MIN_CHUNK_SIZE)
+        
+        host = f'test-{os.getpid()}'
+        with override_settings(PARSE_MEMORY_BUDGET=100):
+            first, second = MemoryReservation('a', 60, ttl=60, host=host), MemoryReservation('b', 60, ttl=60, host=host)
+            try:
+                self.assertTrue(first.acquire())
+                self.assertFalse(second.acquire())
+                first.release()
+                self.assertTrue(second.acquire())
+            finally:
+                first.release()
+                second.release()
+
+
+class LeaseRecoveryTest(TestCase):
+    """Test cases for processing leases, the reaper and retries"""
+    
+    def setUp(self):
+        """Set up an uploaded CSV file"""
+        self.file_obj = File.objects.create(
+            filename="lease.csv",
+            original_filename="lease.csv",
+            file_path=SimpleUploadedFile("lease.csv", b"id,name\n1,a\n2,b\n"),
+            file_size=16,
+            file_type="csv",
+        )
+    
+    def tearDown(self):
+        self.file_obj.delete_file_from_storage()
+    
+    def expire_lease(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        File.objects.filter(id=self.file_obj.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+    
+    def test_queue_recovers_after_worker_crash(self):
+        """Test that a file whose worker died is requeued by the reaper and then processed"""
+        from .tasks import process_file_upload, reap_expired_leases
+        
+        # A worker claims the file and dies without a heartbeat
+        self.assertTrue(self.file_obj.mark_as_processing(task_id='lost-task'))
+        self.assertEqual(reap_expired_leases(), 'Requeued 0 and failed 0 files with expired leases')
+        self.expire_lease()
+        
+        conf = process_file_upload.app.conf
+        always_eager, conf.task_always_eager = conf.task_always_eager, True
+        try:
+            self.assertEqual(reap_expired_leases(), 'Requeued 1 and failed 0 files with expired leases')
+        finally:
+            conf.task_always_eager = always_eager
+        
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual(file_obj.status, 'ready')
+        self.assertEqual(file_obj.attempts, 2)
+        self.assertNotEqual(file_obj.task_id, 'lost-task')
+        self.assertEqual(file_obj.content['rows'], 2)
+    
+    def test_repeatedly_lost_file_is_failed(self):
+        """Test that the reaper gives up on a file after FILE_MAX_ATTEMPTS claims"""
+        from django.test import override_settings
+        from .tasks import reap_expired_leases
+        
+        with override_settings(FILE_MAX_ATTEMPTS=1):
+            self.file_obj.mark_as_processing()
+            self.expire_lease()
+            self.assertEqual(reap_expired_leases(), 'Requeued 0 and failed 1 files with expired leases')
+        
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual(file_obj.status, 'failed')
+        self.assertIn('interrupted 1 times', file_obj.error_message)
+    
+    def test_transient_error_releases_lease_for_retry(self):
+        """Test that a database error is retried and the retry can reclaim the file at once"""
+        from unittest import mock
+        from django.db import OperationalError
+        from .tasks import process_file_upload
+        
+        with mock.patch('files.tasks.parse_file', side_effect=OperationalError('connection lost')):
+            # Called directly, retry() re-raises the error instead of scheduling the retry
+            with self.assertRaises(OperationalError):
+                process_file_upload(str(self.file_obj.id))
+        self.assertEqual(File.objects.get(id=self.file_obj.id).status, 'processing')
+        
+        process_file_upload(str(self.file_obj.id))
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual((file_obj.status, file_obj.attempts), ('ready', 2))
+    
+    def test_superseded_worker_writes_nothing(self):
+        """Test that once a file is reclaimed, the old task's lease, progress and status writes are no-ops"""
+        from unittest import mock
+        from django.db import OperationalError
+        from .tasks import PartialResultPublisher, process_file_upload
+        
+        old = File.objects.get(id=self.file_obj.id)
+        self.assertTrue(old.mark_as_processing(task_id='old-task'))
+        self.expire_lease()
+        new = File.objects.get(id=self.file_obj.id)
+        self.assertTrue(new.mark_as_processing(task_id='new-task'))
+        lease = new.lease_expires_at
+        
+        self.assertFalse(old.renew_lease())
+        PartialResultPublisher(str(old.id), 0, old.claim_filter())(0.5, {'rows': 1})
+        self.assertFalse(old.mark_as_ready({'rows': 1}))
+        self.assertFalse(old.mark_as_timed_out('late'))
+        self.assertFalse(old.mark_as_failed('late'))
+        
+        # Duplicate deliveries that fail before claiming leave the live lease and status alone
+        with mock.patch.object(File.objects, 'only', side_effect=OperationalError('connection lost')):
+            with self.assertRaises(OperationalError):
+                process_file_upload(str(self.file_obj.id))
+        with mock.patch('files.tasks.plan_parse', side_effect=ValueError('unreadable')):
+            process_file_upload(str(self.file_obj.id))
+        
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual(
+            (file_obj.status, file_obj.progress, file_obj.lease_expires_at, file_obj.parsed_content, file_obj.task_id),
+            ('processing', 0, lease, None, 'new-task')
+        )
+        self.assertTrue(new.renew_lease())
+        self.assertTrue(new.mark_as_ready({'rows': 2}))
+
+
+class AdmissionControlTest(APITestCase):
+    """Test cases for upload admission control"""
+    
+    def setUp(self):
+        self.upload_url = reverse('files:file-upload')
+        for index in range(30):
+            File.objects.create(
+                filename=f"done{index}.csv", original_filename=f"done{index}.csv",
+                file_path=f"uploads/done{index}.csv", file_size=1000, file_type="csv", status="ready",
+            )
+        File.objects.create(
+            filename="busy.csv", original_filename="busy.csv", file_path="uploads/busy.csv",
+            file_size=1000, file_type="csv", status="uploading", client_id="busy-client",
+        )
+    
+    def upload(self, client_id):
+        return self.client.post(
+            self.upload_url, {'file': SimpleUploadedFile("new.csv", b"a,b\n1,2\n")},
+            format='multipart', HTTP_X_CLIENT_ID=client_id,
+        )
+    
+    def test_per_client_limit_returns_429_with_drain_based_retry_after(self):
+        """Test that a client at its limit gets 429 while other clients are admitted"""
+        from unittest import mock
+        from django.test import override_settings
+        from .tasks import process_file_upload
+        
+        with override_settings(UPLOAD_MAX_PER_CLIENT=1, UPLOAD_DRAIN_WINDOW=300), \
+                mock.patch.object(process_file_upload, 'apply_async'):
+            response = self.upload('busy-client')
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            # 30 files finished in the 300s window: one more finishes every 10s
+            self.assertEqual(response['Retry-After'], '10')
+            self.assertEqual(response.json()['reason'], 'client_limit')
+            
+            response = self.upload('other-client')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(File.objects.get(id=response.json()['id']).client_id, 'other-client')
+    
+    def test_backlog_and_disk_limits_return_503(self):
+        """Test that a full queue, too many bytes in flight or a full disk refuse uploads"""
+        import math
+        from django.test import override_settings
+        
+        with override_settings(UPLOAD_MAX_QUEUED_FILES=1):
+            response = self.upload('client')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual(response.json()['reason'], 'queue_depth')
+        with override_settings(UPLOAD_MAX_INFLIGHT_BYTES=1000, UPLOAD_DRAIN_WINDOW=300):
+            response = self.upload('client')
+            self.assertEqual(response.json()['reason'], 'in_flight_bytes')
+            # The upload's own bytes are the excess; 30 KB finished in 300s drains 100 bytes/s
+            excess = int(response.request['CONTENT_LENGTH'])
+            self.assertEqual(response['Retry-After'], str(math.ceil(excess / 100)))
+        with override_settings(UPLOAD_MIN_FREE_DISK=2 ** 62, UPLOAD_RETRY_AFTER_DEFAULT=45):
+            response = self.upload('client')
+            self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+            self.assertEqual((response.json()['reason'], response['Retry-After']), ('disk_space', '45'))
+
+
+class LineIndexTest(APITestCase):
+    """Test cases for the TXT line-offset index and the lines endpoint"""
+    
+    def setUp(self):
+        """Set up a ready TXT file of numbered lines"""
+        self.lines = [f'line {i} ' + 'x' * (i % 7) for i in range(1000)]
+        self.file_obj = File.objects.create(
+            filename="log.txt",
+            original_filename="log.txt",
+            file_path=SimpleUploadedFile("log.txt", ('\n'.join(self.lines) + '\n').encode()),
+            file_size=0,
+            file_type="txt",
+            status="ready",
+        )
+        self.path = self.file_obj.file_path.path
+    
+    def tearDown(self):
+        self.file_obj.delete_file_from_storage()
+        self.assertFalse(os.path.exists(self.path + '.lines.idx'))
+    
+    def test_index_serves_any_line_range(self):
+        """Test that ranges across index strides, and past the end, match split('\\n')"""
+        from .line_index import build_line_index, read_lines
+        
+        expected = self.lines + ['']
+        self.assertEqual(build_line_index(self.path, stride=16), len(expected))
+        for start, count in [(0, 1), (15, 3), (16, 16), (517, 40), (990, 50), (1000, 5), (2000, 1)]:
+            lines, total = read_lines(self.path, start, count)
+            self.assertEqual(lines, expected[start:start + count], (start, count))
+            self.assertEqual(total, 1001)
+    
+    def test_lines_endpoint_builds_missing_index(self):
+        """Test that the endpoint serves lines, (re)building the index when it is missing or stale"""
+        from .parsers import parse_file
+        
+        url = reverse('files:file-lines', kwargs={'file_id': self.file_obj.id})
+        response = self.client.get(url, {'start': 998, 'count': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['lines'], self.lines[998:] + [''])
+        self.assertEqual(response.json()['total_lines'], 1001)
+        
+        with open(self.path, 'a') as file:
+            file.write('appended')
+        self.assertEqual(self.client.get(url, {'start': 1000, 'count': 1}).json()['lines'], ['appended'])
+        
+        self.assertEqual(parse_file(self.path, 'txt')['total_lines'], 1001)
+        self.assertTrue(os.path.exists(self.path + '.lines.idx'))
+        self.assertEqual(self.client.get(url, {'count': 0}).status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_lines_end_at_universal_newlines_like_the_parser(self):
+        """Test that \\r\\n and lone \\r end lines in the index as in the parsed content, across block edges"""
+        from unittest import mock
+        from .line_index import build_line_index, read_lines
+        from .parsers import parse_file
+        
+        content = b"a\r\nb\rc\n\r\rd\r\n\r"
+        with open(self.path, 'wb') as file:
+            file.write(content)
+        expected = content.decode().replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        self.assertEqual(parse_file(self.path, 'txt')['total_lines'], len(expected))
+        for block_size in (1, 2, 3, 64):
+            with mock.patch.multiple('files.line_index', BLOCK_SIZE=block_size, READ_SIZE=block_size):
+                self.assertEqual(build_line_index(self.path, stride=2), len(expected), block_size)
+                for start in range(len(expected)):
+                    self.assertEqual(read_lines(self.path, start, 3), (expected[start:start + 3], len(expected)))
+
+
+class TextStreamTest(TestCase):
+    """Test the streaming TXT scan against whole-file reading"""
+    
+    def write(self, data):
+        handle, path = tempfile.mkstemp(suffix='.txt')
+        with os.fdopen(handle, 'wb') as file:
+            file.write(data)
+        self.addCleanup(os.remove, path)
+        return path
+    
+    def test_block_boundaries_do_not_change_result(self):
+        """Test that tiny blocks, multi-byte characters and CRLF give the whole-file counts"""
+        from .text_stream import scan_text
+        
+        text = 'first line\r\nsecond – ünïcödé line\r\n\r\n' + 'x' * 50 + '\nlast'
+        path = self.write(text.encode('utf-8'))
+        with open(path, encoding='utf-8') as file:
+            content = file.read()
+        lines = content.split('\n')
+        
+        for block_size in (1, 3, 7, 1024):
+            result = scan_text(path, block_size, preview_chars=20, preview_lines=3)
+            self.assertEqual(result['encoding'], 'utf-8')
+            self.assertEqual(result['total_lines'], len(lines), block_size)
+            self.assertEqual(result['total_characters'], len(content), block_size)
+            self.assertEqual(result['content_preview'], content[:20])
+            self.assertEqual(result['lines_preview'], lines[:3])
+            self.assertEqual(result['summary']['max_line_length'], 50)
+    
+    def test_non_utf8_files_are_decoded(self):
+        """Test that cp1252 and UTF-16 files parse instead of failing as they did with utf-8 only"""
+        from .parsers import parse_file
+        
+        result = parse_file(self.write('café\nnaïve – résumé\n'.encode('cp1252')), 'txt')
+        self.assertEqual(result['encoding'], 'cp1252')
+        self.assertEqual(result['lines_preview'], ['café', 'naïve – résumé', ''])
+        
+        result = parse_file(self.write('one\ntwo'.encode('utf-16')), 'txt')
+        self.assertEqual(result['encoding'], 'utf-16')
+        self.assertEqual(result['lines_preview'], ['one', 'two'])
+        self.assertEqual(result['summary']['max_line_length'], 3)
+
+
+class NodeAffinityTest(LiveServerTestCase):
+    """Test routing parses to the storage node and streaming uploads between nodes"""
+    
+    def setUp(self):
+        self.file_obj = File.objects.create(
+            filename="log.txt_12",
+            original_filename="log.txt",
+            file_path=SimpleUploadedFile("log.txt", b"a\nb\nc\n" * 2),
+            file_size=12,
+            file_type="txt",
+            status="uploading",
+            storage_node="node-a",
+        )
+        self.transfer_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        import shutil
+        self.file_obj.delete_file_from_storage()
+        shutil.rmtree(self.transfer_dir)
+    
+    def test_upload_is_routed_to_its_node_queue(self):
+        """Test that an upload records the node holding it and goes to that node's queue"""
+        from unittest import mock
+        from django.test import override_settings
+        from .tasks import process_file_upload
+        
+        upload = SimpleUploadedFile("data.csv", b"a,b\n1,2\n", content_type="text/csv")
+        with override_settings(NODE_NAME='node-b'), mock.patch.object(process_file_upload, 'apply_async') as enqueue:
+            response = self.client.post(reverse('files:file-upload'), {'file': upload})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        uploaded = File.objects.get(id=response.json()['id'])
+        self.assertEqual(uploaded.storage_node, 'node-b')
+        self.assertEqual(enqueue.call_args.kwargs['queue'], 'files.node.node-b')
+        uploaded.delete_file_from_storage()
+    
+    def test_deletes_are_reclaimed_on_the_storage_node(self):
+        """Test that a delete and the failed-file cleanup leave the stored file to the storage node's queue"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.test import override_settings
+        from django.utils import timezone
+        from .tasks import cleanup_failed_files, reclaim_deleted_files
+        
+        failed = File.objects.create(
+            filename="old.txt_2", original_filename="old.txt", file_path=SimpleUploadedFile("old.txt", b"x\n"),
+            file_size=2, file_type="txt", status="failed", storage_node="node-a",
+        )
+        File.objects.filter(id=failed.id).update(created_at=timezone.now() - timedelta(days=2))
+        
+        with override_settings(NODE_NAME='node-b'), mock.patch.object(reclaim_deleted_files, 'apply_async') as reclaim:
+            response = self.client.delete(reverse('files:file-delete', kwargs={'file_id': self.file_obj.id}))
+            self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+            self.assertEqual(cleanup_failed_files(), "Cleaned up 1 failed files")
+        self.assertEqual([call.kwargs['queue'] for call in reclaim.call_args_list], ['files.node.node-a'] * 2)
+        
+        # Hidden at once; the stored files stay until node-a's worker reclaims them
+        self.assertFalse(File.objects.filter(id__in=[self.file_obj.id, failed.id]).exists())
+        self.assertTrue(os.path.exists(self.file_obj.file_path.path))
+        for call in reclaim.call_args_list:
+            reclaim_deleted_files(*call.kwargs['args'])
+        self.assertFalse(File.all_objects.filter(id__in=[self.file_obj.id, failed.id]).exists())
+        self.assertFalse(os.path.exists(self.file_obj.file_path.path))
+        self.assertFalse(os.path.exists(failed.file_path.path))
+    
+    def test_worker_streams_file_from_storage_node(self):
+        """Test that a worker without the file fetches it over the raw endpoint, which requires the token"""
+        import uuid
+        from django.test import override_settings
+        from .nodes import LocalFile, NodeTransferError, NodeUnavailable
+        
+        raw_url = reverse('files:file-raw', kwargs={'file_id': self.file_obj.id})
+        # As seen from node-b, where the upload path does not exist
+        remote = File.objects.get(id=self.file_obj.id)
+        remote.file_path.name = 'uploads/elsewhere/log.txt'
+        
+        with override_settings(NODE_NAME='node-b', NODE_TRANSFER_URL=self.live_server_url,
+                               NODE_TRANSFER_TOKEN='secret', NODE_TRANSFER_DIR=self.transfer_dir):
+            self.assertEqual(self.client.get(raw_url).status_code, status.HTTP_403_FORBIDDEN)
+            
+            local_file = LocalFile(remote)
+            path = local_file.acquire()
+            with open(path, 'rb') as copy:
+                self.assertEqual(copy.read(), b"a\nb\nc\n" * 2)
+            local_file.release()
+            self.assertEqual(os.listdir(self.transfer_dir), [])
+            
+            # A file the storage node no longer has is not worth retrying
+            remote.id = uuid.uuid4()
+            with self.assertRaises(NodeTransferError) as raised:
+                LocalFile(remote).acquire()
+            self.assertNotIsInstance(raised.exception, NodeUnavailable)
+            self.assertEqual(os.listdir(self.transfer_dir), [])
+        
+        # Files stored on this node are used in place
+        self.assertEqual(LocalFile(self.file_obj).acquire(), self.file_obj.file_path.path)
+    
+    def test_file_readers_run_against_the_storage_node(self):
+        """Test that rows, lines and appends are forwarded to the storage node, and diffs copy the file over"""
+        import threading
+        import urllib.request
+        from unittest import mock
+        from .connections import connection_manager
+        from .parsers import parse_file
+        
+        remote, local = (
+            File.objects.create(
+                filename="data.csv", original_filename="data.csv",
+                file_path=SimpleUploadedFile("data.csv", b"name,score\na,1\nb,2\n"), file_size=19,
+                file_type="csv", status="ready", storage_node=node,
+            )
+            for node in ('node-a', 'node-b')
+        )
+        for file_obj in (remote, local):
+            self.addCleanup(file_obj.delete_file_from_storage)
+            file_obj.content = parse_file(file_obj.file_path.path, 'csv')
+            file_obj.save()
+        File.objects.filter(id=self.file_obj.id).update(status='ready')
+        
+        # The files sit on one disk here: the live server's threads play node-a, and this test node-b
+        def stored_here(file_obj):
+            return file_obj.storage_node == 'node-b' or threading.current_thread() is not threading.main_thread()
+        
+        urlopen = urllib.request.urlopen
+        with override_settings(NODE_NAME='node-b', NODE_TRANSFER_URL=self.live_server_url,
+                               NODE_TRANSFER_TOKEN='secret', NODE_TRANSFER_DIR=self.transfer_dir), \
+                mock.patch('files.nodes.stored_here', side_effect=stored_here), \
+                mock.patch('files.nodes.urllib.request.urlopen', side_effect=urlopen) as requests, \
+                mock.patch.object(connection_manager, 'redis', side_effect=ConnectionError):
+            rows = self.client.get(reverse('files:file-rows', kwargs={'file_id': remote.id}), {'offset': 1})
+            self.assertEqual(rows.json()['data'], [{'name': 'b', 'score': 2}])
+            lines = self.client.get(reverse('files:file-lines', kwargs={'file_id': self.file_obj.id}), {'start': 4})
+            self.assertEqual(lines.json()['lines'], ['b', 'c', ''])
+            append = self.client.post(
+                reverse('files:file-append', kwargs={'file_id': remote.id}), '{"rows": [["c", 3]]}',
+                content_type='application/json'
+            )
+            self.assertEqual(append.json()['total_rows'], 3)
+            diff = self.client.get(reverse('files:file-diff', kwargs={'file_id': remote.id}), {'base': local.id})
+            self.assertEqual(diff.json()['added']['preview'], [{'name': 'c', 'score': '3'}])
+        
+        forwarded = [call.args[0].full_url.replace(self.live_server_url, '') for call in requests.call_args_list]
+        self.assertEqual(forwarded, [
+            reverse('files:file-rows', kwargs={'file_id': remote.id}) + '?offset=1',
+            reverse('files:file-lines', kwargs={'file_id': self.file_obj.id}) + '?start=4',
+            reverse('files:file-append', kwargs={'file_id': remote.id}),
+            reverse('files:file-raw', kwargs={'file_id': remote.id}),
+        ])
+        self.assertEqual(os.listdir(self.transfer_dir), [])
+
+
+class AdminChangelistTest(TestCase):
+    """Test the File admin changelist on estimated counts, deferred content and background actions"""
+    
+    def setUp(self):
+        from django.contrib.auth.models import User
+        
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.files = [
+            File.objects.create(
+                filename=f"{name}_8", original_filename=name, file_path=SimpleUploadedFile(name, b"a,b\n1,2\n"),
+                file_size=8, file_type="csv", status="ready", parsed_content={'rows': 1},
+            )
+            for name in ("report-2024.csv", "report-2025.csv", "other.csv")
+        ]
+        self.url = reverse('admin:files_file_changelist')
+    
+    def tearDown(self):
+        for file_obj in self.files:
+            file_obj.delete_file_from_storage()
+    
+    def test_changelist_uses_estimates_and_defers_content(self):
+        """Test that the changelist skips COUNT(*) past the threshold and never selects parsed content"""
+        from django.db import connection
+        from django.test import override_settings
+        from django.test.utils import CaptureQueriesContext
+        
+        with override_settings(ADMIN_EXACT_COUNT_THRESHOLD=0), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'q': 'REPORT'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+        sql = [query['sql'] for query in queries.captured_queries]
+        self.assertFalse([query for query in sql if 'COUNT(' in query])
+        self.assertTrue([query for query in sql if query.startswith('EXPLAIN')])
+        self.assertFalse([query for query in sql if query.startswith('SELECT') and 'parsed_content' in query])
+        
+        # Small tables are counted exactly
+        self.assertEqual(self.client.get(self.url).context['cl'].result_count, 3)
+    
+    def test_search_is_by_prefix_unless_trigram_search_is_enabled(self):
+        """Test that search only matches substrings once ADMIN_TRIGRAM_SEARCH says the trigram index exists"""
+        from django.test import override_settings
+        
+        self.assertEqual(len(self.client.get(self.url, {'q': 'report'}).context['cl'].result_list), 2)
+        self.assertEqual(len(self.client.get(self.url, {'q': '2024'}).context['cl'].result_list), 0)
+        with override_settings(ADMIN_TRIGRAM_SEARCH=True):
+            self.assertEqual(len(self.client.get(self.url, {'q': '2024'}).context['cl'].result_list), 1)
+    
+    def test_bulk_actions_run_in_background(self):
+        """Test that reprocess and delete actions only enqueue tasks, which then do the work"""
+        from unittest import mock
+        from .tasks import process_file_upload, reclaim_deleted_files, reprocess_files
+        
+        selected = [str(file_obj.id) for file_obj in self.files[:2]]
+        with mock.patch.object(reprocess_files, 'delay') as reprocess:
+            self.client.post(self.url, {'action': 'reprocess_selected', '_selected_action': selected})
+        self.assertEqual(sorted(reprocess.call_args.args[0]), sorted(selected))
+        self.assertEqual(File.objects.filter(status='ready').count(), 3)
+        
+        with mock.patch.object(process_file_upload, 'apply_async') as enqueue:
+            reprocess_files(selected)
+        self.assertEqual(enqueue.call_count, 2)
+        self.assertEqual(File.objects.filter(status='uploading', parsed_content__isnull=True).count(), 2)
+        
+        with mock.patch.object(reclaim_deleted_files, 'apply_async') as reclaim:
+            self.client.post(self.url, {'action': 'delete_selected_in_background', '_selected_action': selected})
+        self.assertEqual(list(File.objects.values_list('original_filename', flat=True)), ['other.csv'])
+        self.assertEqual(File.all_objects.count(), 3)
+        reclaim_deleted_files(*reclaim.call_args.kwargs['args'])
+        self.assertEqual(File.all_objects.count(), 1)
+        self.assertFalse(os.path.exists(self.files[0].file_path.path))
+
+
+class BulkDeleteTest(APITestCase):
+    """Test cases for bulk deletes and background storage reclamation"""
+    
+    def setUp(self):
+        self.files = [
+            File.objects.create(
+                filename=f"{name}_8", original_filename=name, file_path=SimpleUploadedFile(name, b"a,b\n1,2\n"),
+                file_size=8, file_type="csv", status="ready", client_id=client_id,
+            )
+            for name, client_id in (("a.csv", "tenant-a"), ("b.csv", "tenant-a"), ("c.csv", "tenant-b"))
+        ]
+        self.url = reverse('files:file-bulk-delete')
+    
+    def tearDown(self):
+        for file_obj in self.files:
+            file_obj.delete_file_from_storage()
+    
+    def test_filter_delete_hides_files_and_reclaims_in_background(self):
+        """Test that a filtered delete returns at once and a batched task then removes storage and rows"""
+        from unittest import mock
+        from django.test import override_settings
+        from .tasks import reclaim_deleted_files
+        
+        with mock.patch.object(reclaim_deleted_files, 'apply_async') as reclaim:
+            response = self.client.post(self.url, {'filter': {'client_id': 'tenant-a'}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        job = response.json()
+        self.assertEqual((job['status'], job['total'], job['reclaimed']), ('pending', 2, 0))
+        reclaim.assert_called_once_with(args=[job['id'], None], queue=None)
+        
+        # Gone from the API straight away, still on disk until reclaimed
+        self.assertFalse(File.objects.filter(id=self.files[0].id).exists())
+        self.assertEqual([f['original_filename'] for f in self.client.get(reverse('files:file-list')).json()], ['c.csv'])
+        self.assertTrue(os.path.exists(self.files[0].file_path.path))
+        
+        with override_settings(RECLAIM_BATCH_SIZE=1):
+            reclaim_deleted_files(job['id'], None)
+        self.assertFalse(os.path.exists(self.files[0].file_path.path))
+        self.assertEqual(list(File.all_objects.values_list('original_filename', flat=True)), ['c.csv'])
+        
+        job = self.client.get(reverse('files:deletion-job', kwargs={'job_id': job['id']})).json()
+        self.assertEqual((job['status'], job['reclaimed'], job['reclaimed_bytes'], job['progress']), ('done', 2, 16, 100))
+    
+    def test_selection_is_validated(self):
+        """Test that a bulk delete needs either ids or a non-empty filter of known criteria"""
+        for body in ({}, {'filter': {}}, {'filter': {'owner': 'x'}}, {'filter': {'status': 'gone'}},
+                     {'ids': [str(self.files[0].id)], 'filter': {'status': 'ready'}}, {'ids': ['not-a-uuid']}):
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, body)
+        self.assertEqual(File.objects.count(), 3)
+
+
+
+class BatchProgressTest(APITestCase):
+    """Test cases for the batch progress endpoint"""
+    
+    def setUp(self):
+        self.files = [
+            File.objects.create(
+                filename=name, original_filename=name, file_path=f"uploads/{name}",
+                file_size=8, file_type="csv", status="processing", progress=10,
+            )
+            for name in ("a.csv", "b.csv")
+        ]
+        self.url = reverse('files:file-progress-batch')
+    
+    @override_settings(PROGRESS_BATCH_SINCE_SLACK=0)
+    def test_one_query_and_since(self):
+        """Test that all statuses come from one query and unchanged files are left out after ``since``"""
+        import uuid
+        from datetime import timedelta
+        from django.utils import timezone
+        
+        unknown = str(uuid.uuid4())
+        ids = [str(file_obj.id) for file_obj in self.files] + [unknown]
+        with self.assertNumQueries(1):
+            body = self.client.post(self.url, {'ids': ids}, format='json').json()
+        self.assertEqual({item['id']: item['progress'] for item in body['files']}, {ids[0]: 10, ids[1]: 10})
+        self.assertEqual(set(body['files'][0]), {'id', 'status', 'progress', 'updated_at'})
+        self.assertEqual(body['missing'], [unknown])
+        
+        # Nothing changed since the poll, except b.csv
+        File.objects.filter(id=self.files[1].id).update(progress=60, updated_at=timezone.now() + timedelta(seconds=5))
+        body = self.client.post(self.url, {'ids': ids, 'since': body['as_of']}, format='json').json()
+        self.assertEqual([(item['id'], item['progress']) for item in body['files']], [(ids[1], 60)])
+        self.assertEqual(body['missing'], [unknown])
+    
+    def test_async_view_matches(self):
+        """Test that the async view returns the same payload"""
+        import json
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncRequestFactory
+        from . import async_views
+        
+        request = AsyncRequestFactory().post(
+            '/', json.dumps({'ids': [str(self.files[0].id)]}), content_type='application/json'
+        )
+        body = json.loads(async_to_sync(async_views.file_progress_batch)(request).content)
+        self.assertEqual([item['id'] for item in body['files']], [str(self.files[0].id)])
+        self.assertEqual(body['missing'], [])
+    
+    def test_request_is_validated(self):
+        """Test that ids are required, must be UUIDs and are capped"""
+        from django.test import override_settings
+        
+        for body in ({}, {'ids': []}, {'ids': ['not-a-uuid']}, {'ids': [str(self.files[0].id)], 'since': 'yesterday'}):
+            self.assertEqual(self.client.post(self.url, body, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(PROGRESS_BATCH_MAX_IDS=1):
+            response = self.client.post(self.url, {'ids': [str(f.id) for f in self.files]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class WebhookReceiver:
+    """Local HTTP stand-in for a client's webhook endpoint, recording each request it gets"""
+    
+    def __init__(self, status_code=200):
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        receiver = self
+        self.status_code = status_code
+        self.headers = {}
+        self.requests = []
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                receiver.requests.append((self.path, dict(self.headers), body))
+                self.send_response(receiver.status_code)
+                for name, value in receiver.headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+            
+            def log_message(self, *args):
+                pass
+        
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+    
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(WEBHOOK_SECRET='test-secret', WEBHOOK_ALLOWED_HOSTS=['127.0.0.1'])
+class WebhookTest(APITestCase):
+    """Test cases for completion webhooks"""
+    
+    def setUp(self):
+        self.receiver = WebhookReceiver()
+        self.files = [
+            File.objects.create(
+                filename=name, original_filename=name, file_path=f"uploads/{name}", file_size=8,
+                file_type="csv", status="processing", callback_url=f"{self.receiver.url}/hooks",
+            )
+            for name in ("a.csv", "b.csv")
+        ]
+    
+    def tearDown(self):
+        self.receiver.close()
+    
+    def test_finished_files_are_delivered_in_one_signed_batch(self):
+        """Test that ready and failed files queue a webhook on commit and share a signed request"""
+        import json
+        from .models import WebhookDelivery
+        from .tasks import deliver_webhooks
+        from .webhooks import SIGNATURE_HEADER, verify
+        
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.files[0].mark_as_ready({'type': 'csv'})
+            self.files[1].mark_as_failed('bad row')
+            File.objects.create(filename="c.csv", original_filename="c.csv", file_path="uploads/c.csv",
+                                file_size=8, file_type="csv", status="processing").mark_as_ready({})
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(WebhookDelivery.objects.count(), 2)  # c.csv has no callback_url
+        
+        self.assertEqual(deliver_webhooks(), "Delivered 2 webhooks; 0 will be retried and 0 gave up")
+        [(path, headers, body)] = self.receiver.requests
+        self.assertEqual(path, '/hooks')
+        self.assertTrue(verify(body, headers[SIGNATURE_HEADER], 'test-secret'))
+        self.assertFalse(verify(body, headers[SIGNATURE_HEADER], 'another-secret'))
+        events = {event['type']: event for event in json.loads(body)['events']}
+        self.assertEqual(events['file.ready']['data']['id'], str(self.files[0].id))
+        self.assertEqual(events['file.failed']['data']['error_message'], 'bad row')
+        self.assertEqual(set(WebhookDelivery.objects.values_list('status', flat=True)), {'delivered'})
+        
+        # Nothing is sent twice
+        deliver_webhooks()
+        self.assertEqual(len(self.receiver.requests), 1)
+    
+    @override_settings(WEBHOOK_MAX_ATTEMPTS=2)
+    def test_failed_requests_back_off_then_give_up(self):
+        """Test that a failed request is retried after a backoff until WEBHOOK_MAX_ATTEMPTS"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from .models import WebhookDelivery
+        from .tasks import deliver_webhooks
+        
+        self.receiver.status_code = 500
+        self.files[0].mark_as_ready({})
+        deliver_webhooks()
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual((delivery.status, delivery.attempts, delivery.last_error), ('pending', 1, 'HTTP 500'))
+        
+        # Not due again until its backoff has passed
+        WebhookDelivery.objects.update(next_attempt_at=timezone.now() + timedelta(minutes=1))
+        deliver_webhooks()
+        self.assertEqual(len(self.receiver.requests), 1)
+        
+        WebhookDelivery.objects.update(next_attempt_at=timezone.now())
+        deliver_webhooks()
+        delivery.refresh_from_db()
+        self.assertEqual((delivery.status, delivery.attempts, len(self.receiver.requests)), ('failed', 2, 2))
+    
+    def test_upload_validates_callback_url(self):
+        """Test that uploads refuse a callback_url that is not http(s), or when webhooks are disabled"""
+        upload = SimpleUploadedFile("test.csv", b"a,b\n1,2\n", content_type="text/csv")
+        response = self.client.post(reverse('files:file-upload'), {'file': upload, 'callback_url': 'ftp://x/y'},
+                                    format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with override_settings(WEBHOOK_SECRET=''):
+            upload.seek(0)
+            response = self.client.post(reverse('files:file-upload'),
+                                        {'file': upload, 'callback_url': self.receiver.url}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(File.objects.count(), 2)
+    
+    def test_internal_callback_urls_are_refused(self):
+        """Test that callback URLs resolving inside the cluster are refused at upload and again at delivery"""
+        from .models import WebhookDelivery
+        from .tasks import deliver_webhooks
+        
+        for url in ('http://169.254.169.254/latest/meta-data', 'http://localhost:8000/hooks', 'https://10.0.0.5/'):
+            upload = SimpleUploadedFile("test.csv", b"a,b\n1,2\n", content_type="text/csv")
+            response = self.client.post(reverse('files:file-upload'), {'file': upload, 'callback_url': url},
+                                        format='multipart')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, url)
+            self.assertIn('internal address', response.json()['error'])
+        self.assertEqual(File.objects.count(), 2)
+        
+        # A host that stopped being allowed after registration is not sent to, nor retried
+        self.files[0].mark_as_ready({})
+        with override_settings(WEBHOOK_ALLOWED_HOSTS=[]):
+            self.assertEqual(deliver_webhooks(), "Delivered 0 webhooks; 0 will be retried and 1 gave up")
+        delivery = WebhookDelivery.objects.get()
+        self.assertEqual(delivery.status, 'failed')
+        self.assertIn('internal address (127.0.0.1)', delivery.last_error)
+        self.assertEqual(self.receiver.requests, [])
+    
+    def test_redirects_are_not_followed(self):
+        """Test that a receiver answering with a redirect does not get the request re-sent elsewhere"""
+        from .models import WebhookDelivery
+        from .tasks import deliver_webhooks
+        
+        target = WebhookReceiver()
+        try:
+            self.receiver.status_code = 307
+            self.receiver.headers = {'Location': f"{target.url}/stolen"}
+            self.files[0].mark_as_ready({})
+            self.assertEqual(deliver_webhooks(), "Delivered 0 webhooks; 1 will be retried and 0 gave up")
+        finally:
+            target.close()
+        self.assertEqual(len(self.receiver.requests), 1)
+        self.assertEqual(target.requests, [])
+        self.assertEqual(WebhookDelivery.objects.get().last_error, 'HTTP 307')
+
+
+class FileDiffTest(APITestCase):
+    """Test cases for the row-level diff between two tabular files"""
+    
+    BASE = b"id,name,qty\n1,a,1\n2,b,2\n3,c,3\n3,c,3\n"
+    NEW = b"id,name,qty,note\n1,a,1,x\n2,b,5,x\n4,d,4,x\n3,c,3,x\n"
+    
+    class FakeRedis(dict):
+        def get(self, key):
+            return dict.get(self, key)
+        
+        def set(self, key, value, ex=None):
+            self[key] = value
+    
+    def create(self, name, content, **fields):
+        file_obj = File.objects.create(
+            filename=name, original_filename=name, file_path=SimpleUploadedFile(name, content),
+            file_size=len(content), file_type=name.rsplit('.', 1)[1], status="ready", **fields
+        )
+        self.files.append(file_obj)
+        return file_obj
+    
+    def setUp(self):
+        from unittest import mock
+        from .connections import connection_manager
+        self.files = []
+        self.base = self.create("base.csv", self.BASE)
+        self.new = self.create("new.csv", self.NEW)
+        self.redis = self.FakeRedis()
+        patcher = mock.patch.object(connection_manager, 'redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        for file_obj in self.files:
+            file_obj.delete_file_from_storage()
+    
+    def diff(self, file_obj, **params):
+        return self.client.get(reverse('files:file-diff', kwargs={'file_id': file_obj.id}), params)
+    
+    @override_settings(DIFF_CHUNK_ROWS=2, DIFF_PARTITIONS=3)
+    def test_diff_by_keys_and_cache(self):
+        """Test added, removed and changed rows matched on a key column, then served from the cache"""
+        response = self.diff(self.new, base=self.base.id, keys='id')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.json()
+        self.assertEqual(body['summary'], {
+            'base_rows': 4, 'rows': 4, 'added': 1, 'removed': 1, 'changed': 1, 'unchanged': 2
+        })
+        self.assertEqual(body['columns'], {'compared': ['id', 'name', 'qty'], 'added': ['note'], 'removed': []})
+        self.assertEqual(body['added']['preview'], [{'id': '4', 'name': 'd', 'qty': '4', 'note': 'x'}])
+        self.assertEqual(body['removed']['rows'], [3])  # the second id 3 has no counterpart
+        self.assertEqual(body['changed']['preview'], [
+            {'base_row': 1, 'row': 1, 'key': {'id': '2'}, 'changes': {'qty': ['2', '5']}}
+        ])
+        self.assertFalse(body['cached'])
+        self.assertTrue(self.diff(self.new, base=self.base.id, keys='id').json()['cached'])
+    
+    def test_diff_by_row_content_across_formats(self):
+        """Test that without keys rows match on content, and an Excel export hashes like the same CSV"""
+        import openpyxl
+        workbook = openpyxl.Workbook()
+        for row in self.BASE.decode().splitlines():
+            workbook.active.append([int(cell) if cell.isdigit() else cell for cell in row.split(',')])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        excel_base = self.create("base.xlsx", buffer.getvalue())
+        
+        for base in (self.base, excel_base):
+            body = self.diff(self.new, base=base.id).json()
+            self.assertEqual((body['match'], body['added']['rows'], body['removed']['rows']), ('rows', [1, 2], [1, 3]))
+            self.assertEqual(body['summary']['unchanged'], 2)
+    
+    def test_diff_is_validated(self):
+        """Test missing or unknown bases and keys, non-tabular files and files still processing"""
+        import uuid
+        text = self.create("notes.txt", b"hello\n")
+        processing = self.create("later.csv", self.BASE)
+        File.objects.filter(id=processing.id).update(status='processing')
+        
+        self.assertEqual(self.diff(self.new).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.diff(self.new, base=self.base.id, keys='sku').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.diff(self.new, base=text.id).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.diff(self.new, base=processing.id).status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.diff(self.new, base=uuid.uuid4()).status_code, status.HTTP_404_NOT_FOUND)
+
+class StorageTierTest(APITestCase):
+    """Test cases for compressed and cold storage tiers and transparent rehydration"""
+    
+    def setUp(self):
+        import shutil
+        from django.test import override_settings
+        
+        self.rows = ''.join(f"{index},name-{index}\n" for index in range(2000))
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.settings_override = override_settings(
+            STORAGE_COMPRESS_AFTER_DAYS=7, STORAGE_COLD_AFTER_DAYS=0, STORAGE_FRAME_SIZE=4096,
+            COLD_STORAGE_DIR=os.path.join(self.temp_dir, 'cold'),
+            REHYDRATION_CACHE_DIR=os.path.join(self.temp_dir, 'cache'),
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.file_obj = File.objects.create(
+            filename="data.csv", original_filename="data.csv",
+            file_path=SimpleUploadedFile("data.csv", f"id,name\n{self.rows}".encode()),
+            file_size=len(self.rows) + 8, file_type="csv", status="ready",
+            parsed_content={'rows': 2000, 'column_names': ['id', 'name']},
+        )
+        self.addCleanup(self.file_obj.delete_file_from_storage)
+    
+    def age(self, days):
+        from datetime import timedelta
+        from django.utils import timezone
+        File.objects.filter(id=self.file_obj.id).update(updated_at=timezone.now() - timedelta(days=days))
+    
+    def test_seekable_format_reads_any_range(self):
+        """Test that seekable zstd reads match the original at any offset and stay readable by plain zstd"""
+        import zstandard
+        from .storage import SeekableZstdReader, compress_seekable
+        
+        source = self.file_obj.file_path.path
+        compressed = os.path.join(self.temp_dir, 'data.csv.zst')
+        compress_seekable(source, compressed, frame_size=1000)
+        with open(source, 'rb') as file:
+            original = file.read()
+        
+        with SeekableZstdReader(compressed) as reader:
+            self.assertEqual(reader.size, len(original))
+            self.assertEqual(len(reader.starts), len(original) // 1000 + 2)
+            for offset, length in [(0, 10), (995, 10), (12345, 3000), (len(original) - 5, 100)]:
+                reader.seek(offset)
+                self.assertEqual(reader.read(length), original[offset:offset + length])
+        with open(compressed, 'rb') as file:
+            self.assertEqual(zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True).read(), original)
+    
+    def test_lifecycle_tiers_aged_files_and_reads_rehydrate(self):
+        """Test that aged files are compressed then moved cold, and rows, raw reads and appends still work"""
+        from django.test import override_settings
+        from .storage import stored_path
+        from .tasks import tier_aged_files
+        
+        hot_path = self.file_obj.file_path.path
+        self.age(3)
+        tier_aged_files(None)
+        self.assertEqual(File.objects.get(id=self.file_obj.id).storage_tier, 'hot')
+        
+        self.age(10)
+        tier_aged_files(None)
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual(file_obj.storage_tier, 'compressed')
+        self.assertFalse(os.path.exists(hot_path))
+        self.assertLess(os.path.getsize(stored_path(file_obj)), file_obj.file_size / 2)
+        
+        response = self.client.get(reverse('files:file-rows', kwargs={'file_id': file_obj.id}), {'offset': 1500, 'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['data'], [{'id': 1500, 'name': 'name-1500'}, {'id': 1501, 'name': 'name-1501'}])
+        # CSV rows are read from the compressed file itself, not a decompressed copy
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'cache')))
+        
+        with override_settings(STORAGE_COLD_AFTER_DAYS=9):
+            tier_aged_files(None)
+        file_obj = File.objects.get(id=self.file_obj.id)
+        self.assertEqual(file_obj.storage_tier, 'cold')
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, 'cold')), [os.path.basename(stored_path(file_obj))])
+        
+        with override_settings(NODE_TRANSFER_TOKEN='secret'):
+            raw = self.client.get(reverse('files:file-raw', kwargs={'file_id': file_obj.id}), HTTP_X_NODE_TOKEN='secret')
+        self.assertEqual(b''.join(raw.streaming_content), f"id,name\n{self.rows}".encode())
+        
+        # Appending restores the hot copy it writes to
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse('files:file-append', kwargs={'file_id': file_obj.id}), {'rows': [[2000, 'new']]}, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(File.objects.get(id=self.file_obj.id).storage_tier, 'hot')
+        self.assertEqual(os.listdir(os.path.join(self.temp_dir, 'cold')), [])
+        with open(hot_path) as file:
+            self.assertTrue(file.read().endswith('1999,name-1999\n2000,new\n'))
+    
+    def test_rehydration_cache_evicts_least_recently_used(self):
+        """Test that the cache keeps the copy just used and evicts older ones past its size limit"""
+        from django.test import override_settings
+        from .storage import local_path
+        from .tasks import tier_aged_files
+        
+        other = File.objects.create(
+            filename="other.csv", original_filename="other.csv",
+            file_path=SimpleUploadedFile("other.csv", b"a,b\n1,2\n"), file_size=8, file_type="csv", status="ready",
+        )
+        self.addCleanup(other.delete_file_from_storage)
+        self.age(10)
+        File.objects.filter(id=other.id).update(updated_at=self.file_obj.updated_at.replace(year=2000))
+        tier_aged_files(None)
+        
+        cache = os.path.join(self.temp_dir, 'cache')
+        first = local_path(File.objects.get(id=self.file_obj.id))
+        self.assertEqual(os.path.getsize(first), self.file_obj.file_size)
+        with override_settings(REHYDRATION_CACHE_BYTES=100):
+            second = local_path(File.objects.get(id=other.id))
+        self.assertEqual(os.listdir(cache), [os.path.basename(second)])
+
+
+class CompressedUploadTest(APITestCase):
+    """Test cases for gzip/zstd uploads, stored compressed and parsed as a stream"""
+    
+    def setUp(self):
+        import shutil
+        
+        self.csv = 'id,name\n' + ''.join(f"{index},name-{index}\n" for index in range(3000))
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.settings_override = override_settings(
+            STORAGE_FRAME_SIZE=4096, REHYDRATION_CACHE_DIR=os.path.join(self.temp_dir, 'cache'),
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+    
+    def upload(self, *args, **kwargs):
+        from unittest import mock
+        from .tasks import process_file_upload
+        
+        with mock.patch.object(process_file_upload, 'apply_async'):
+            response = self.client.post(reverse('files:file-upload'), *args, **kwargs)
+        if response.status_code == status.HTTP_201_CREATED:
+            file_obj = File.objects.get(id=response.json()['id'])
+            self.addCleanup(file_obj.delete_file_from_storage)
+        return response
+    
+    def test_gzip_csv_is_stored_compressed_and_parsed_as_a_stream(self):
+        """Test that a .csv.gz upload is kept compressed and parsed and paged without a decompressed copy"""
+        import gzip
+        from .storage import stored_path
+        from .tasks import process_file_upload
+        
+        response = self.upload({'file': SimpleUploadedFile('data.csv.gz', gzip.compress(self.csv.encode()))})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        file_obj = File.objects.get(id=response.json()['id'])
+        self.assertEqual((file_obj.original_filename, file_obj.file_type), ('data.csv', 'csv'))
+        self.assertEqual((file_obj.storage_tier, file_obj.file_size), ('compressed', len(self.csv)))
+        self.assertFalse(os.path.exists(file_obj.file_path.path))
+        self.assertLess(os.path.getsize(stored_path(file_obj)), len(self.csv) / 2)
+        
+        process_file_upload(str(file_obj.id))
+        file_obj = File.objects.get(id=file_obj.id)
+        self.assertEqual(file_obj.status, 'ready', file_obj.error_message)
+        self.assertEqual(file_obj.content['rows'], 3000)
+        response = self.client.get(reverse('files:file-rows', kwargs={'file_id': file_obj.id}), {'offset': 2998})
+        self.assertEqual(response.json()['data'], [{'id': 2998, 'name': 'name-2998'}, {'id': 2999, 'name': 'name-2999'}])
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'cache')))
+    
+    def test_raw_zstd_body_is_decoded(self):
+        """Test that a raw TXT body sent with Content-Encoding: zstd is parsed and its lines read"""
+        import zstandard
+        from .tasks import process_file_upload
+        
+        text = '\n'.join(f'line {index}' for index in range(5000))
+        # Two frames, as concatenating compressed files gives
+        body = b''.join(zstandard.ZstdCompressor().compress(part.encode()) for part in (text[:20000], text[20000:]))
+        response = self.upload(
+            body, content_type='text/plain', HTTP_CONTENT_ENCODING='zstd',
+            HTTP_CONTENT_DISPOSITION='attachment; filename=log.txt',
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        file_obj = File.objects.get(id=response.json()['id'])
+        self.assertEqual((file_obj.file_type, file_obj.file_size), ('txt', len(text)))
+        
+        process_file_upload(str(file_obj.id))
+        self.assertEqual(File.objects.get(id=file_obj.id).content['total_lines'], 5000)
+        response = self.client.get(reverse('files:file-lines', kwargs={'file_id': file_obj.id}), {'start': 4998})
+        self.assertEqual(response.json()['lines'], ['line 4998', 'line 4999'])
+    
+    def test_bad_and_oversized_uploads_are_rejected(self):
+        """Test that bombs, truncated data and unsupported encodings are refused and leave nothing stored"""
+        import gzip
+        from django.conf import settings
+        
+        def uploads():
+            directory = os.path.join(settings.MEDIA_ROOT, 'uploads')
+            return set(os.listdir(directory)) if os.path.isdir(directory) else set()
+        stored = uploads()
+        bomb = gzip.compress(b'0' * 200000)
+        with override_settings(MAX_FILE_SIZE=100000, UPLOAD_MAX_COMPRESSION_RATIO=100):
+            response = self.upload({'file': SimpleUploadedFile('bomb.csv.gz', bomb)})
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        with override_settings(UPLOAD_MAX_DECOMPRESSED_SIZE=len(self.csv) - 1):
+            response = self.upload({'file': SimpleUploadedFile('data.csv.gz', gzip.compress(self.csv.encode()))})
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        
+        truncated = gzip.compress(self.csv.encode())[:-100]
+        self.assertEqual(self.upload({'file': SimpleUploadedFile('data.csv.gz', truncated)}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.upload({'file': SimpleUploadedFile('book.xlsx.gz', bomb)}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        response = self.upload(b'a,b', content_type='text/csv', HTTP_CONTENT_ENCODING='br',
+                               HTTP_CONTENT_DISPOSITION='attachment; filename=data.csv')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+        
+        self.assertFalse(File.objects.exists())
+        self.assertEqual(uploads(), stored)
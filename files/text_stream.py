@@ -0,0 +1,143 @@
+"""
+Streaming scan of text files.
+
+The file is read in fixed-size binary blocks and decoded incrementally in the
+encoding detected from its first bytes. Line and character counts, line-length
+statistics and the previews are all computed in one pass, holding one block at
+a time, so memory does not grow with the file.
+"""
+
+import codecs
+import importlib.util
+import io
+from typing import Any, Callable, Dict, Optional
+
+from .storage import open_source
+
+ENCODING_SAMPLE_SIZE = 64 * 1024
+MAX_PREVIEW_LINE = 1024 * 1024  # characters kept of each line in lines_preview
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def _decodes(sample: bytes, encoding: str) -> bool:
+    """Whether ``sample`` is valid in ``encoding``, allowing a character cut off at the end"""
+    try:
+        codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Best guess at the encoding of a text sample
+
+    A BOM wins, then UTF-8, then charset_normalizer's guess if it is installed,
+    then cp1252 and finally latin-1, which decodes any byte sequence.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if _decodes(sample, 'utf-8'):
+        return 'utf-8'
+    # UTF-16 without a BOM: mostly-ASCII text has a NUL in every other byte
+    if sample[1::2].count(0) > len(sample) * 0.4:
+        return 'utf-16-le'
+    if sample[0::2].count(0) > len(sample) * 0.4:
+        return 'utf-16-be'
+    if importlib.util.find_spec('charset_normalizer') is not None:
+        from charset_normalizer import from_bytes
+        match = from_bytes(sample).best()
+        if match is not None:
+            return match.encoding
+    return 'cp1252' if _decodes(sample, 'cp1252') else 'latin-1'
+
+
+def scan_text(file_path: str, block_size: int, preview_chars: int = 2000, preview_lines: int = 100,
+              encoding: Optional[str] = None,
+              on_block: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """Counts, line-length statistics and previews of a text file, in one streaming pass
+
+    Lines are counted like ``content.split('\\n')`` on universal-newline text (\\n,
+    \\r\\n and \\r all end a line), as the whole-file parser did and as the line
+    index (files.line_index) numbers them. ``on_block(bytes_read, partial_result)``
+    is called after every block.
+    """
+    with open_source(file_path) as raw:
+        if encoding is None:
+            encoding = detect_encoding(raw.read(ENCODING_SAMPLE_SIZE))
+            raw.seek(0)
+        # Undecodable bytes become U+FFFD instead of failing the whole file; \r\n and \r become \n
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(encoding)(errors='replace'), translate=True
+        )
+        characters = newlines = max_line = current_line = 0
+        content_preview, lines_preview, partial_line = [], [], ''
+        preview_length = 0
+
+        while True:
+            data = raw.read(block_size)
+            block = decoder.decode(data, final=not data)
+            if not block:
+                if not data:
+                    break
+                continue
+            characters += len(block)
+            newlines += block.count('\n')
+
+            # Longest line: the block's complete lines, plus the line carried over between blocks
+            first_newline = block.find('\n')
+            if first_newline == -1:
+                current_line += len(block)
+            else:
+                last_newline = block.rfind('\n')
+                max_line = max(max_line, current_line + first_newline)
+                if last_newline > first_newline:
+                    max_line = max(max_line, max(map(len, block[first_newline + 1:last_newline].split('\n'))))
+                current_line = len(block) - last_newline - 1
+
+            if preview_length < preview_chars:
+                content_preview.append(block[:preview_chars - preview_length])
+                preview_length += len(content_preview[-1])
+            if len(lines_preview) < preview_lines:
+                pieces = (partial_line + block).split('\n', preview_lines - len(lines_preview))
+                lines_preview.extend(piece[:MAX_PREVIEW_LINE] for piece in pieces[:-1])
+                partial_line = pieces[-1][:MAX_PREVIEW_LINE] if len(lines_preview) < preview_lines else ''
+
+            if on_block is not None:
+                on_block(raw.tell(), text_result(
+                    encoding, characters, newlines, max(max_line, current_line),
+                    ''.join(content_preview), lines_preview,
+                ))
+
+        if len(lines_preview) < preview_lines:
+            lines_preview.append(partial_line)
+        return text_result(
+            encoding, characters, newlines, max(max_line, current_line), ''.join(content_preview), lines_preview
+        )
+
+
+def text_result(encoding: str, characters: int, newlines: int, max_line_length: int,
+                content_preview: str, lines_preview: list) -> Dict[str, Any]:
+    """The TXT parser's result; a file has one more line than it has newlines"""
+    total_lines = newlines + 1
+    return {
+        'type': 'txt',
+        'encoding': encoding,
+        'total_lines': total_lines,
+        'total_characters': characters,
+        'content_preview': content_preview,
+        'lines_preview': list(lines_preview),
+        'summary': {
+            'total_lines': total_lines,
+            'total_characters': characters,
+            'average_line_length': characters / total_lines,
+            'max_line_length': max_line_length,
+        }
+    }
@@ -0,0 +1,165 @@
+"""
+Compressed uploads.
+
+CSV and TXT files can be sent compressed, either as a file named like
+``data.csv.gz`` or ``log.txt.zst``, or as a raw request body (the file itself,
+named in Content-Disposition) with ``Content-Encoding: gzip`` or ``zstd``.
+
+The upload is decompressed as it is read and recompressed straight into the
+seekable zstd of the ``compressed`` storage tier (files.storage), so the
+expanded file is never written to disk; the parsers then read it back frame by
+frame. File.file_size is the expanded size.
+
+Decompression stops with DecompressionLimitExceeded once the output passes
+UPLOAD_MAX_DECOMPRESSED_SIZE, or UPLOAD_MAX_COMPRESSION_RATIO times the
+compressed size (an upload may always expand to MAX_FILE_SIZE, as much as it
+could have sent uncompressed). Each read expands a bounded amount of input, so
+a bomb is stopped after at most a few MB of output too many.
+"""
+
+import gzip
+import io
+import os
+import zlib
+from typing import BinaryIO, Optional, Tuple
+
+from django.conf import settings
+
+from .models import File
+from .storage import tier_path, write_seekable
+
+ENCODINGS = {
+    'gzip': ('.gz', '.gzip'),
+    'zstd': ('.zst', '.zstd'),
+}
+COMPRESSIBLE_TYPES = ('csv', 'txt')
+
+# zstd input fed to the decompressor per step; zstd expands at most ~32,000 times, so a step yields at most ~8 MB
+ZSTD_INPUT_SIZE = 256
+
+
+class UnsupportedEncoding(ValueError):
+    """The upload names a compression this server does not decode"""
+
+
+class DecompressionError(ValueError):
+    """The upload is not valid gzip/zstd, or is truncated"""
+
+
+class DecompressionLimitExceeded(DecompressionError):
+    """The upload expands to more than it is allowed to"""
+
+
+def split_encoding(name: str, content_encoding: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """The encoding an upload is compressed with (None if it is not), and the name of the file it expands to"""
+    header = (content_encoding or '').strip().lower()
+    if header in ('', 'identity'):
+        header = None
+    elif header not in ENCODINGS:
+        raise UnsupportedEncoding(
+            f"Content-Encoding {content_encoding} is not supported. Supported encodings: {', '.join(ENCODINGS)}"
+        )
+    stem, suffix = os.path.splitext(name)
+    for encoding, suffixes in ENCODINGS.items():
+        if suffix.lower() in suffixes:
+            if header is not None:
+                raise UnsupportedEncoding(f"{name} is already compressed; send it without a Content-Encoding")
+            return encoding, stem
+    return header, name
+
+
+def expansion_limit(compressed_size: int) -> int:
+    """Most bytes an upload of ``compressed_size`` compressed bytes may expand to"""
+    limit = settings.UPLOAD_MAX_DECOMPRESSED_SIZE
+    if settings.UPLOAD_MAX_COMPRESSION_RATIO:
+        limit = min(limit, max(settings.MAX_FILE_SIZE, int(compressed_size * settings.UPLOAD_MAX_COMPRESSION_RATIO)))
+    return limit
+
+
+class ZstdFrames(io.RawIOBase):
+    """Every zstd frame in ``stream``, decompressed a little input at a time
+
+    zstandard's stream_reader ends quietly at input that stops mid-frame; this raises EOFError.
+    """
+
+    def __init__(self, stream: BinaryIO):
+        import zstandard
+        self.stream = stream
+        self.decompressor = zstandard.ZstdDecompressor()
+        self.frame = None  # decompressobj of the frame being read
+        self.pending = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.pending:
+            data = b''
+            if self.frame is not None and self.frame.eof:
+                # Whatever followed the finished frame starts the next one
+                data, self.frame = self.frame.unused_data, None
+            if not data:
+                data = self.stream.read(ZSTD_INPUT_SIZE)
+            if not data:
+                if self.frame is not None:
+                    raise EOFError("Compressed file ended before the end of its last zstd frame")
+                return 0
+            if self.frame is None:
+                self.frame = self.decompressor.decompressobj()
+            self.pending = memoryview(self.frame.decompress(data))
+        count = min(len(buffer), len(self.pending))
+        buffer[:count] = self.pending[:count]
+        self.pending = self.pending[count:]
+        return count
+
+
+class LimitedReader(io.RawIOBase):
+    """Decompressed bytes of an upload, failing with DecompressionLimitExceeded past ``limit``"""
+
+    def __init__(self, stream: BinaryIO, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.total = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        import zstandard
+        try:
+            data = self.stream.read(min(len(buffer), self.limit - self.total + 1))
+        except (OSError, EOFError, zlib.error, zstandard.ZstdError) as e:
+            raise DecompressionError(f"The upload could not be decompressed: {e}") from e
+        self.total += len(data)
+        if self.total > self.limit:
+            raise DecompressionLimitExceeded(f"The upload expands to more than {self.limit:,} bytes")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def decompressed(stream: BinaryIO, encoding: str) -> BinaryIO:
+    if encoding == 'gzip':
+        # Concatenated members are read as one file; a bad CRC or a truncated member raises
+        return gzip.GzipFile(fileobj=stream, mode='rb')
+    return io.BufferedReader(ZstdFrames(stream))
+
+
+def store_compressed_upload(upload, encoding: str, **fields) -> File:
+    """Create the File for a compressed upload, stored in the ``compressed`` tier without being expanded on disk
+
+    ``fields`` are the File's other fields; file_path, file_size and storage_tier are set here.
+    Raises DecompressionError (or DecompressionLimitExceeded) and stores nothing if the upload is rejected.
+    """
+    file_obj = File(storage_tier='compressed', file_size=0, **fields)
+    # Named by id: the hot path is not written now, and must not collide with one that is if the file is moved there
+    file_obj.file_path = file_obj.file_path.field.generate_filename(file_obj, f"{file_obj.id}.{file_obj.file_type}")
+    destination = tier_path(file_obj, 'compressed')
+    upload.seek(0)
+    reader = io.BufferedReader(LimitedReader(decompressed(upload, encoding), expansion_limit(upload.size)))
+    file_obj.file_size = write_seekable(reader, destination, level=settings.UPLOAD_ZSTD_LEVEL)
+    try:
+        file_obj.save(force_insert=True)
+    except BaseException:
+        os.remove(destination)
+        raise
+    return file_obj
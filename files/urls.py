@@ -1,16 +1,42 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import (
     FileUploadView, FileProgressView, FileListView, 
-    FileDetailView, FileDeleteView, health_check
+    FileDetailView, FileCancelView, FileDeleteView, FileAppendView, FileRowsView, FileLinesView, FileRawView,
+    FileDiffView, FileBulkDeleteView, DeletionJobView, FileProgressBatchView, health_check
 )
 
 app_name = 'files'
 
+# Under ASGI the read-only endpoints are served by native async views
+if settings.ASYNC_VIEWS:
+    list_view = async_views.file_list
+    detail_view = async_views.file_detail
+    progress_view = async_views.file_progress
+    progress_batch_view = async_views.file_progress_batch
+    health_view = async_views.health_check
+else:
+    list_view = FileListView.as_view()
+    detail_view = FileDetailView.as_view()
+    progress_view = FileProgressView.as_view()
+    progress_batch_view = FileProgressBatchView.as_view()
+    health_view = health_check
+
 urlpatterns = [
-    path('', FileListView.as_view(), name='file-list'),
+    path('', list_view, name='file-list'),
     path('upload/', FileUploadView.as_view(), name='file-upload'),
-    path('<uuid:file_id>/', FileDetailView.as_view(), name='file-detail'),
-    path('<uuid:file_id>/progress/', FileProgressView.as_view(), name='file-progress'),
+    path('progress/batch/', progress_batch_view, name='file-progress-batch'),
+    path('bulk-delete/', FileBulkDeleteView.as_view(), name='file-bulk-delete'),
+    path('bulk-delete/<uuid:job_id>/', DeletionJobView.as_view(), name='deletion-job'),
+    path('<uuid:file_id>/', detail_view, name='file-detail'),
+    path('<uuid:file_id>/progress/', progress_view, name='file-progress'),
+    path('<uuid:file_id>/cancel/', FileCancelView.as_view(), name='file-cancel'),
     path('<uuid:file_id>/delete/', FileDeleteView.as_view(), name='file-delete'),
-    path('health/', health_check, name='health-check'),
+    path('<uuid:file_id>/append/', FileAppendView.as_view(), name='file-append'),
+    path('<uuid:file_id>/rows/', FileRowsView.as_view(), name='file-rows'),
+    path('<uuid:file_id>/lines/', FileLinesView.as_view(), name='file-lines'),
+    path('<uuid:file_id>/diff/', FileDiffView.as_view(), name='file-diff'),
+    path('<uuid:file_id>/raw/', FileRawView.as_view(), name='file-raw'),
+    path('health/', health_view, name='health-check'),
 ]
@@ -1,28 +1,90 @@
+import logging
 import os
+import time
+import uuid
 from rest_framework import status, generics
-from rest_framework.decorators import api_view, parser_classes
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.decorators import api_view
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import MultiPartParser, FormParser, FileUploadParser, JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-from django.http import JsonResponse
-from .models import File
+from django.core.exceptions import ValidationError
+from django.core.validators import URLValidator
+from django.db import transaction
+from django.utils import timezone
+from django.http import FileResponse, JsonResponse, HttpResponse
+from .admission import check_admission, client_id_for
+from .connections import connection_manager
+from .diff import TABULAR_TYPES, cached_diff
+from .layouts import ColumnarTable, arrow_available, content_table, frame_in_layout, requested_layout
+from .line_index import indexable, read_lines
+from .metrics import UPLOAD_REJECTIONS, observe_stage, time_stage, render_metrics
+from .models import DeletionJob, File
+from .nodes import TOKEN_HEADER, forward_to_storage_node, parse_queue, valid_transfer_token
+from .parsers import registry, get_parser, CSVParser
+from .renderers import ArrowStreamRenderer
 from .serializers import (
     FileUploadSerializer, FileProgressSerializer, FileListSerializer,
-    FileDetailSerializer, FileUploadResponseSerializer
+    FileDetailSerializer, FileUploadResponseSerializer, FileAppendSerializer, BulkDeleteSerializer,
+    DeletionJobSerializer, ProgressBatchSerializer
 )
-from .tasks import process_file_upload
+from .storage import open_stored, source_path, stored_path
+from .tasks import delete_in_background, process_file_upload
+from .transport import (
+    COMPRESSIBLE_TYPES, DecompressionError, DecompressionLimitExceeded, UnsupportedEncoding, split_encoding,
+    store_compressed_upload
+)
+from .webhooks import WebhookError, check_url
+
+logger = logging.getLogger(__name__)
+
+
+def admission_rejected_response(rejection):
+    response = Response(
+        {'error': rejection.message, 'reason': rejection.reason, 'retry_after': rejection.retry_after},
+        status=rejection.status
+    )
+    response['Retry-After'] = str(rejection.retry_after)
+    return response
 
 
 class FileUploadView(APIView):
-    """Handle file uploads with progress tracking"""
-    parser_classes = (MultiPartParser, FormParser)
+    """Handle file uploads with progress tracking
+    
+    Uploads are refused with 429/503 and Retry-After while the processing backlog,
+    bytes in flight, free disk or the client's own in-flight files are over their limits.
+    
+    The file is the multipart ``file`` field, or the whole body of any other request, named in
+    its Content-Disposition header. CSV and TXT files may be sent compressed (see files.transport).
+    """
+    parser_classes = (MultiPartParser, FormParser, FileUploadParser)
     
     def post(self, request, *args, **kwargs):
         try:
-            # Get the uploaded file
+            # Decide before the body is read, sizing the upload by its Content-Length
+            client_id = client_id_for(request)
+            rejection = check_admission(client_id, int(request.META.get('CONTENT_LENGTH') or 0))
+            if rejection is not None:
+                UPLOAD_REJECTIONS.labels(rejection.reason).inc()
+                return admission_rejected_response(rejection)
+            
+            # Content-Encoding covers the whole body, so only a raw upload can be decoded
+            content_encoding = request.headers.get('Content-Encoding')
+            form_body = request.content_type.startswith(('multipart/', 'application/x-www-form-urlencoded'))
+            if content_encoding and form_body:
+                return Response(
+                    {'error': 'Content-Encoding is only supported on raw uploads; '
+                              'send a compressed file (e.g. data.csv.gz) in a form instead'},
+                    status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+                )
+            
+            # Get the uploaded file (parses the multipart body)
+            receive_start = time.perf_counter()
             uploaded_file = request.FILES.get('file')
+            receive_time = time.perf_counter() - receive_start
             
             if not uploaded_file:
                 return Response(
@@ -30,41 +92,90 @@ class FileUploadView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Validate file size
+            # Validate file size; a compressed upload is limited again as it expands
             if uploaded_file.size > settings.MAX_FILE_SIZE:
                 return Response(
                     {'error': f'File size exceeds maximum limit of {settings.MAX_FILE_SIZE} bytes'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Get file extension
-            file_extension = os.path.splitext(uploaded_file.name)[1].lower().lstrip('.')
+            # Get the compression, if any, and the extension of the file it expands to
+            try:
+                encoding, file_name = split_encoding(uploaded_file.name, content_encoding)
+            except UnsupportedEncoding as e:
+                return Response({'error': str(e)}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+            file_extension = os.path.splitext(file_name)[1].lower().lstrip('.')
             
             # Validate file type
-            allowed_extensions = ['csv', 'xlsx', 'xls', 'pdf', 'txt']
+            allowed_extensions = registry.extensions()
             if file_extension not in allowed_extensions:
                 return Response(
                     {'error': f'File type {file_extension} is not supported. Allowed types: {", ".join(allowed_extensions)}'}, 
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            if encoding and file_extension not in COMPRESSIBLE_TYPES:
+                return Response(
+                    {'error': f'Only {", ".join(COMPRESSIBLE_TYPES)} files can be uploaded compressed'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Create file record
-            file_obj = File.objects.create(
-                filename=f"{uploaded_file.name}_{uploaded_file.size}",
-                original_filename=uploaded_file.name,
-                file_path=uploaded_file,
-                file_size=uploaded_file.size,
-                file_type=file_extension,
-                status='uploading'
-            )
+            # Optional webhook, sent once the file is ready or failed
+            callback_url = request.data.get('callback_url', '')
+            if callback_url:
+                if not settings.WEBHOOK_SECRET:
+                    return Response(
+                        {'error': 'Webhooks are not enabled on this server (WEBHOOK_SECRET is not set)'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                try:
+                    URLValidator(schemes=['http', 'https'])(callback_url)
+                except ValidationError:
+                    return Response(
+                        {'error': 'callback_url must be an http(s) URL'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                try:
+                    check_url(callback_url)
+                except WebhookError as e:
+                    return Response({'error': f'callback_url is not allowed: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+            
+            observe_stage('receive', file_extension, uploaded_file.size, receive_time)
+            
+            # Create file record; the task id is fixed up front so the file can be cancelled at once
+            task_id = str(uuid.uuid4())
+            with time_stage('store', file_extension, uploaded_file.size):
+                fields = dict(
+                    filename=f"{uploaded_file.name}_{uploaded_file.size}",
+                    original_filename=file_name,
+                    file_type=file_extension,
+                    status='uploading',
+                    task_id=task_id,
+                    client_id=client_id,
+                    callback_url=callback_url,
+                    storage_node=settings.NODE_NAME
+                )
+                if encoding:
+                    # Decompressed as it is read and stored recompressed; never expanded on disk
+                    file_obj = store_compressed_upload(uploaded_file, encoding, **fields)
+                else:
+                    file_obj = File.objects.create(file_path=uploaded_file, file_size=uploaded_file.size, **fields)
             
-            # Start background processing
-            process_file_upload.delay(str(file_obj.id))
+            # Start background processing on a worker of the node that now holds the file
+            with time_stage('enqueue', file_extension, uploaded_file.size):
+                process_file_upload.apply_async(
+                    args=[str(file_obj.id)], kwargs={'enqueued_at': time.time()}, task_id=task_id,
+                    queue=parse_queue(file_obj.storage_node)
+                )
             
             # Return response
             serializer = FileUploadResponseSerializer(file_obj)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
+        except DecompressionLimitExceeded as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except (DecompressionError, ParseError) as e:
+            # ParseError: a raw upload without a file name
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {'error': f'Upload failed: {str(e)}'}, 
@@ -87,6 +198,23 @@ class FileProgressView(APIView):
             )
 
 
+class FileProgressBatchView(APIView):
+    """Progress of many files in one request and one query, leaving out files unchanged since ``since``"""
+    parser_classes = (JSONParser,)
+    
+    def post(self, request, *args, **kwargs):
+        serializer = ProgressBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(serializer.response(list(serializer.queryset())))
+        except Exception as e:
+            return Response(
+                {'error': f'Error retrieving progress: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class FileListView(generics.ListAPIView):
     """List all uploaded files with metadata"""
     queryset = File.objects.all()
@@ -94,12 +222,44 @@ class FileListView(generics.ListAPIView):
     pagination_class = None  # Disable pagination for this endpoint
 
 
+def arrow_unavailable_response():
+    return Response(
+        {'error': 'Arrow output requires pyarrow to be installed on the server'},
+        status=status.HTTP_406_NOT_ACCEPTABLE
+    )
+
+
 class FileDetailView(APIView):
-    """Get file details and parsed content"""
+    """Get file details and parsed content
+    
+    Previews come back as records by default; ?layout=split|columnar (or an Accept
+    header layout parameter) changes that, and ?format=arrow streams the preview
+    table (?sheet= for Excel) as Arrow IPC. ?fields=id,status and
+    ?content_paths=summary,column_names limit what is loaded and returned.
+    """
+    renderer_classes = (JSONRenderer, ArrowStreamRenderer)
     
     def get(self, request, file_id, *args, **kwargs):
+        arrow = request.accepted_renderer.format == 'arrow'
         try:
-            file_obj = get_object_or_404(File, id=file_id)
+            layout = requested_layout(request)
+            fields, content_paths = (
+                (None, None) if arrow else FileDetailSerializer.parse_sparse_params(request.query_params)
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        context = {'layout': layout, 'fields': fields, 'content_paths': content_paths}
+        
+        try:
+            file_obj = get_object_or_404(FileDetailSerializer.sparse_queryset(fields, content_paths), id=file_id)
+            
+            # While parsing, serve the latest partial result if one has been published;
+            # cancelled and timed-out files keep the partial result they stopped at
+            stopped = file_obj.status in File.STOPPED_STATUSES
+            if stopped or (file_obj.status == 'processing' and file_obj.content_available):
+                data = FileDetailSerializer(file_obj, context=context).data
+                data['partial'] = True
+                return Response(data, status=status.HTTP_200_OK if stopped else status.HTTP_202_ACCEPTED)
             
             # Check if file is ready
             if file_obj.status != 'ready':
@@ -109,10 +269,19 @@ class FileDetailView(APIView):
                     'progress': file_obj.progress
                 }, status=status.HTTP_202_ACCEPTED)
             
+            if arrow:
+                if not arrow_available():
+                    return arrow_unavailable_response()
+                table = content_table(file_obj.content_as('columnar'), request.query_params.get('sheet'))
+                table['metadata'].update(id=file_obj.id, file_type=file_obj.file_type)
+                return Response(table)
+            
             # Return parsed content
-            serializer = FileDetailSerializer(file_obj)
+            serializer = FileDetailSerializer(file_obj, context=context)
             return Response(serializer.data)
             
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {'error': f'Error retrieving file: {str(e)}'}, 
@@ -120,18 +289,52 @@ class FileDetailView(APIView):
             )
 
 
+class FileCancelView(APIView):
+    """Cancel an upload's processing
+    
+    Queued tasks are revoked; a running parse stops at its next chunk/page
+    checkpoint, keeping the partial result it had published.
+    """
+    
+    def post(self, request, file_id, *args, **kwargs):
+        file_obj = get_object_or_404(File.objects.only('id', 'status', 'task_id'), id=file_id)
+        try:
+            if not file_obj.mark_as_cancelled():
+                file_obj.refresh_from_db(fields=['status'])
+                return Response(
+                    {'error': f'File is {file_obj.status} and can no longer be cancelled', 'status': file_obj.status},
+                    status=status.HTTP_409_CONFLICT
+                )
+            
+            if file_obj.task_id:
+                try:
+                    process_file_upload.app.control.revoke(file_obj.task_id)
+                except Exception as e:
+                    # The status change alone stops the task: it can no longer claim or keep the file
+                    logger.warning("Could not revoke task %s of file %s: %s", file_obj.task_id, file_id, e)
+            
+            return Response({'id': file_obj.id, 'status': file_obj.status, 'message': 'File processing cancelled'})
+            
+        except Exception as e:
+            return Response(
+                {'error': f'Error cancelling file: {str(e)}'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 class FileDeleteView(APIView):
-    """Delete a file and its parsed content"""
+    """Delete a file and its parsed content
+    
+    The file is marked deleted at once; its storage and row are reclaimed in the
+    background on its storage node, as for a bulk delete.
+    """
     
     def delete(self, request, file_id, *args, **kwargs):
         try:
-            file_obj = get_object_or_404(File, id=file_id)
-            
-            # Delete file from storage
-            file_obj.delete_file_from_storage()
+            file_obj = get_object_or_404(File.objects.only('id'), id=file_id)
             
-            # Delete database record
-            file_obj.delete()
+            # The stored file may be on another node, so only its workers can remove it
+            delete_in_background(File.objects.filter(id=file_obj.id))
             
             return Response(
                 {'message': 'File deleted successfully'}, 
@@ -145,10 +348,298 @@ class FileDeleteView(APIView):
             )
 
 
+class FileBulkDeleteView(APIView):
+    """Delete many files in one request, by id list or filter
+    
+    The files are marked deleted with one UPDATE and disappear from the API at
+    once; their storage is reclaimed by a background job whose progress is at
+    bulk-delete/<job_id>/.
+    """
+    parser_classes = (JSONParser,)
+    
+    def post(self, request, *args, **kwargs):
+        serializer = BulkDeleteSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = delete_in_background(serializer.queryset())
+        except Exception as e:
+            return Response(
+                {'error': f'Bulk delete failed: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response(DeletionJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class DeletionJobView(APIView):
+    """Progress of the storage reclamation after a bulk delete"""
+    
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(DeletionJob, id=job_id)
+        return Response(DeletionJobSerializer(job).data)
+
+
+class FileAppendView(APIView):
+    """Append rows to a parsed CSV file, parsing only the new rows"""
+    parser_classes = (JSONParser, MultiPartParser, FormParser)
+    
+    def post(self, request, file_id, *args, **kwargs):
+        file_obj = get_object_or_404(
+            File.objects.only('id', 'file_type', 'status', 'file_path', 'storage_tier', 'storage_node'), id=file_id
+        )
+        if file_obj.file_type != 'csv':
+            return Response(
+                {'error': f'Append is only supported for CSV files, not {file_obj.file_type}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # Appends write to the stored file, so they run on the node that has it
+        forwarded = forward_to_storage_node(request, file_obj)
+        if forwarded is not None:
+            return forwarded
+        
+        try:
+            # Lock the row so concurrent appends to the same file are serialized
+            with transaction.atomic():
+                file_obj = File.objects.select_for_update().get(id=file_id)
+                if file_obj.status != 'ready':
+                    return Response(
+                        {'error': 'File must be ready before rows can be appended', 'status': file_obj.status},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                
+                serializer = FileAppendSerializer(
+                    data=request.data, context={'columns': file_obj.content['column_names']}
+                )
+                if not serializer.is_valid():
+                    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                
+                # Appends write to the raw file, so a compressed or cold upload is restored first
+                file_obj.move_to_hot_tier()
+                file_path = file_obj.file_path.path
+                original_size = os.path.getsize(file_path)
+                try:
+                    parsed_content, appended = CSVParser(file_path).append(
+                        file_obj.content, serializer.validated_data['rows_csv']
+                    )
+                    file_size = os.path.getsize(file_path)
+                    File.objects.filter(id=file_id).update(
+                        **File.content_fields(parsed_content), file_size=file_size, updated_at=timezone.now()
+                    )
+                except Exception:
+                    # Keep the file and its metadata in step if anything failed
+                    with open(file_path, 'rb+') as f:
+                        f.truncate(original_size)
+                    raise
+            
+            return Response({
+                'id': str(file_obj.id),
+                'rows_appended': appended,
+                'total_rows': parsed_content['rows'],
+                'file_size': file_size,
+            })
+            
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {'error': f'Append failed: {str(e)}'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class FileRowsView(APIView):
+    """Page through the rows of a CSV or Excel file, read from the stored file
+    
+    Supports the same ?layout= and ?format=arrow negotiation as the detail view.
+    Requests for a file stored on another node are forwarded to that node.
+    """
+    renderer_classes = (JSONRenderer, ArrowStreamRenderer)
+    
+    def get(self, request, file_id, *args, **kwargs):
+        try:
+            layout = requested_layout(request)
+            offset = int(request.query_params.get('offset', 0))
+            limit = int(request.query_params.get('limit', 100))
+            if offset < 0 or not 0 < limit <= settings.ROWS_PAGE_MAX_LIMIT:
+                raise ValueError(f'offset must be >= 0 and limit between 1 and {settings.ROWS_PAGE_MAX_LIMIT}')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        file_obj = get_object_or_404(
+            File.objects.only(
+                'id', 'original_filename', 'file_path', 'file_type', 'status', 'storage_tier', 'storage_node'
+            ),
+            id=file_id
+        )
+        if file_obj.status != 'ready':
+            return Response(
+                {'error': 'File must be ready before its rows can be read', 'status': file_obj.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        forwarded = forward_to_storage_node(request, file_obj)
+        if forwarded is not None:
+            return forwarded
+        arrow = request.accepted_renderer.format == 'arrow'
+        if arrow and not arrow_available():
+            return arrow_unavailable_response()
+        
+        try:
+            file_type = file_obj.get_file_extension().lstrip('.')
+            parser = get_parser(source_path(file_obj, registry.reads_compressed(file_type)), file_type)
+            df = parser.read_rows(offset, limit, sheet=request.query_params.get('sheet'))
+            if arrow:
+                columnar = frame_in_layout(df, 'columnar')
+                return Response(ColumnarTable(
+                    columnar['columns'], columnar['data'], {'id': file_obj.id, 'offset': offset}
+                ))
+            return Response({
+                'id': str(file_obj.id),
+                'offset': offset,
+                'count': len(df),
+                'data': frame_in_layout(df, layout),
+            })
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {'error': f'Error reading rows: {str(e)}'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class FileDiffView(APIView):
+    """Rows added, removed and changed in a CSV or Excel file since another version of it (?base=<file id>)
+    
+    Rows are matched on the ?keys= columns (comma-separated), or else on their whole
+    content. ?sheet= picks the sheet of Excel files. Results are cached per pair of file versions.
+    """
+    
+    def get(self, request, file_id, *args, **kwargs):
+        base_id = request.query_params.get('base')
+        try:
+            base_id = uuid.UUID(base_id or '')
+        except ValueError:
+            return Response({'error': 'base must be the id of the file to compare with'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        keys = [key.strip() for key in request.query_params.get('keys', '').split(',') if key.strip()]
+        
+        fields = (
+            'id', 'original_filename', 'file_path', 'file_type', 'file_size', 'status', 'storage_tier', 'storage_node',
+            'updated_at'
+        )
+        file_obj = get_object_or_404(File.objects.only(*fields), id=file_id)
+        base = get_object_or_404(File.objects.only(*fields), id=base_id)
+        for compared in (base, file_obj):
+            if compared.file_type not in TABULAR_TYPES:
+                return Response({'error': 'Only CSV and Excel files can be diffed'}, status=status.HTTP_400_BAD_REQUEST)
+            if compared.status != 'ready':
+                return Response(
+                    {'error': 'Both files must be ready before they can be diffed', 'id': str(compared.id),
+                     'status': compared.status},
+                    status=status.HTTP_409_CONFLICT
+                )
+        
+        try:
+            result, cached = cached_diff(base, file_obj, keys, request.query_params.get('sheet'))
+            return Response({**result, 'cached': cached})
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return Response(
+                {'error': f'Error diffing files: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class FileLinesView(APIView):
+    """Read any range of lines of a TXT file through its line-offset index (on the node storing it)"""
+    
+    def get(self, request, file_id, *args, **kwargs):
+        try:
+            start = int(request.query_params.get('start', 0))
+            count = int(request.query_params.get('count', 100))
+            if start < 0 or not 0 < count <= settings.LINES_PAGE_MAX_COUNT:
+                raise ValueError(f'start must be >= 0 and count between 1 and {settings.LINES_PAGE_MAX_COUNT}')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        file_obj = get_object_or_404(
+            File.objects.only(
+                'id', 'original_filename', 'file_path', 'file_type', 'status', 'parsed_content', 'storage_tier',
+                'storage_node'
+            ),
+            id=file_id
+        )
+        if file_obj.get_file_extension() != '.txt':
+            return Response({'error': 'Lines can only be read from TXT files'}, status=status.HTTP_400_BAD_REQUEST)
+        if file_obj.status != 'ready':
+            return Response(
+                {'error': 'File must be ready before its lines can be read', 'status': file_obj.status},
+                status=status.HTTP_409_CONFLICT
+            )
+        forwarded = forward_to_storage_node(request, file_obj)
+        if forwarded is not None:
+            return forwarded
+        
+        # The encoding detected while parsing is kept in the (uncompressed) JSON part of the content
+        encoding = (file_obj.parsed_content or {}).get('encoding', 'utf-8')
+        if not indexable(encoding):
+            return Response(
+                {'error': f'Lines cannot be read from {encoding} files'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            lines, total_lines = read_lines(source_path(file_obj, streamed=True), start, count, encoding)
+            return Response({
+                'id': str(file_obj.id),
+                'start': start,
+                'count': len(lines),
+                'total_lines': total_lines,
+                'lines': lines,
+            })
+        except Exception as e:
+            return Response(
+                {'error': f'Error reading lines: {str(e)}'}, 
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class FileRawView(APIView):
+    """Internal: stream an upload's bytes to a worker on another node
+    
+    Requires the shared NODE_TRANSFER_TOKEN in the X-Node-Token header and is
+    refused outright while no token is configured.
+    """
+    
+    def get(self, request, file_id, *args, **kwargs):
+        if not valid_transfer_token(request.headers.get(TOKEN_HEADER)):
+            return Response({'error': 'Invalid or missing node token'}, status=status.HTTP_403_FORBIDDEN)
+        file_obj = get_object_or_404(File.objects.only('id', 'file_path', 'storage_tier'), id=file_id)
+        if not os.path.exists(stored_path(file_obj)):
+            return Response(
+                {'error': f'File is not stored on node {settings.NODE_NAME}'}, status=status.HTTP_404_NOT_FOUND
+            )
+        # Streamed from disk (sendfile where the server supports it), never read into memory;
+        # compressed and cold files are decompressed frame by frame on the way out
+        return FileResponse(open_stored(file_obj), content_type='application/octet-stream')
+
+
 @api_view(['GET'])
 def health_check(request):
-    """Health check endpoint"""
-    return Response({
+    """Health check endpoint; ?deep=1 also pings Postgres, MongoDB and Redis"""
+    payload = {
         'status': 'healthy',
         'message': 'File Parser API is running'
-    })
+    }
+    if request.query_params.get('deep'):
+        payload['connections'] = connection_manager.check()
+        if not all(result['healthy'] for result in payload['connections'].values()):
+            payload['status'] = 'degraded'
+            return Response(payload, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return Response(payload)
+
+
+def metrics(request):
+    """Prometheus metrics endpoint"""
+    payload, content_type = render_metrics()
+    return HttpResponse(payload, content_type=content_type)
@@ -0,0 +1,119 @@
+"""
+Completion webhooks.
+
+An upload may give a ``callback_url``. When the file reaches ready or failed,
+the status change writes a WebhookDelivery row in the same transaction (an
+outbox), so an event is neither lost to a crash between the two nor sent for
+a change that rolled back. deliver_webhooks, on the WEBHOOK_QUEUE queue,
+claims due deliveries and POSTs them in batches, one request per URL with up
+to WEBHOOK_BATCH_SIZE events:
+
+    {"events": [{"id": "...", "type": "file.ready", "created_at": "...", "data": {...}}]}
+
+Failed requests are retried with exponential backoff up to WEBHOOK_MAX_ATTEMPTS.
+Delivery is at least once, so receivers should ignore event ids they have seen.
+Each request is signed with WEBHOOK_SECRET in the X-Webhook-Signature header,
+``t=<unix time>,v1=<hex HMAC-SHA256 of "<t>.<body>">``; see verify().
+
+Callback URLs are checked when they are registered and again before every
+request: a host that resolves to a loopback, private, link-local or reserved
+address (other services and nodes inside the cluster, cloud metadata) is
+refused unless it is in WEBHOOK_ALLOWED_HOSTS. Redirects are not followed.
+"""
+
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+SIGNATURE_HEADER = 'X-Webhook-Signature'
+
+
+class WebhookError(Exception):
+    """The receiver could not be reached or did not accept the request"""
+
+
+class UnsafeWebhookURL(WebhookError):
+    """The callback URL points inside the cluster, so no request is sent to it"""
+
+
+class NoRedirects(urllib.request.HTTPRedirectHandler):
+    """Leave 30x responses as errors rather than re-sending the request to wherever they point"""
+    
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+opener = urllib.request.build_opener(NoRedirects)
+
+
+def internal_address(address: str) -> bool:
+    """Whether an IP address is loopback, private, link-local, reserved, multicast or unspecified"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])  # without an IPv6 zone index
+    if getattr(ip, 'ipv4_mapped', None):
+        ip = ip.ipv4_mapped
+    return any((ip.is_private, ip.is_loopback, ip.is_link_local, ip.is_reserved, ip.is_multicast, ip.is_unspecified))
+
+
+def check_url(url: str):
+    """Raise UnsafeWebhookURL if ``url``'s host resolves to an internal address (and is not allowed),
+    or WebhookError if it cannot be resolved"""
+    parts = urllib.parse.urlsplit(url)
+    host = parts.hostname
+    if not host:
+        raise UnsafeWebhookURL(f"{url} has no host")
+    if host in settings.WEBHOOK_ALLOWED_HOSTS:
+        return
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError) as e:
+        raise WebhookError(f"{host} could not be resolved: {e}") from e
+    internal = sorted(address for address in addresses if internal_address(address))
+    if internal:
+        raise UnsafeWebhookURL(f"{host} resolves to an internal address ({', '.join(internal)})")
+
+
+def sign(body: bytes, timestamp: int, secret: str = None) -> str:
+    secret = secret if secret is not None else settings.WEBHOOK_SECRET
+    digest = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify(body: bytes, header: Optional[str], secret: str = None, tolerance: float = None) -> bool:
+    """Whether ``header`` is a valid signature of ``body`` made within ``tolerance`` seconds, as a receiver checks it"""
+    try:
+        parts = dict(part.split('=', 1) for part in (header or '').split(','))
+        timestamp = int(parts['t'])
+    except (KeyError, ValueError):
+        return False
+    tolerance = tolerance if tolerance is not None else settings.WEBHOOK_SIGNATURE_TOLERANCE
+    if abs(time.time() - timestamp) > tolerance:
+        return False
+    return hmac.compare_digest(sign(body, timestamp, secret), header)
+
+
+def post(url: str, events: List[dict]):
+    """POST ``events`` to ``url`` as one signed request; any 2xx response counts as delivered"""
+    check_url(url)
+    body = json.dumps({'events': events}, cls=DjangoJSONEncoder).encode()
+    request = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'User-Agent': 'file-parser-webhooks',
+        SIGNATURE_HEADER: sign(body, int(time.time())),
+    })
+    try:
+        with opener.open(request, timeout=settings.WEBHOOK_TIMEOUT) as response:
+            response.read(1024)
+    except urllib.error.HTTPError as e:
+        raise WebhookError(f"HTTP {e.code}") from e
+    except (urllib.error.URLError, OSError) as e:
+        raise WebhookError(str(getattr(e, 'reason', e))) from e